@@ -18,7 +18,8 @@ from .models import (
     Estimation,
     EstimationItem,
     EstimationSettings,
-    GSTSettings
+    GSTSettings,
+    DocumentSequence,
 )
 
 # Estimation inline for EstimationItem
@@ -39,6 +40,12 @@ admin.site.register(TermsAndConditions)
 # Settings
 admin.site.register(EstimationSettings)
 admin.site.register(GSTSettings)
+
+
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'period', 'next_value')
+    list_filter = ('kind',)
    
 class InvoiceAdmin(admin.ModelAdmin):
     list_display = ('invoice_no', 'estimation', 'created_at', 'payment_status')
@@ -60,3 +67,11 @@ from .models import UserProfile, UserPermission
 
 admin.site.register(UserProfile)
 admin.site.register(UserPermission)
+
+
+from .models import ReportJob
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
@@ -0,0 +1,147 @@
+import csv
+import hashlib
+import os
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Estimation
+from .utils import update_rows
+
+ATTACHMENT_DIR = Estimation._meta.get_field('po_attachment').upload_to.strip('/')
+HASH_WORKERS = 8
+HASH_BLOCK_SIZE = 1 << 20
+
+
+class Issue(NamedTuple):
+    estimation_id: Optional[int]   # None for files no estimation points at
+    quote_no: str
+    stored: str                    # name in the database, or the file for 'unreferenced'
+    problem: str                   # moved, missing, empty, corrupt, duplicate, unreferenced
+    fix: Optional[str] = None      # new po_attachment name ('' clears it); None leaves the row alone
+    detail: str = ''
+
+
+class ScanResult(NamedTuple):
+    scanned: int
+    issues: list
+    fixed: int
+
+    def counts(self):
+        return Counter(issue.problem for issue in self.issues)
+
+
+# ---------- Listing ----------
+def _listing(path):
+    """{file name: size} for the regular files directly in `path`, from one scandir pass."""
+    try:
+        with os.scandir(path) as entries:
+            return {entry.name: entry.stat().st_size for entry in entries if entry.is_file()}
+    except FileNotFoundError:
+        return {}
+
+
+def _locate(name, attachments, media_files):
+    """Storage name where the file for a stored `name` actually is, or None."""
+    base = os.path.basename(name)
+    if name == f"{ATTACHMENT_DIR}/{base}" and base in attachments:
+        return name
+    if base in attachments:
+        return f"{ATTACHMENT_DIR}/{base}"
+    if base in media_files:
+        return base  # saved at the MEDIA_ROOT top level by an older upload path
+    return None
+
+
+# ---------- Content checks ----------
+def _inspect(path):
+    """(sha256 hex digest, problem or '') for one file, read in blocks."""
+    digest, head, tail = hashlib.sha256(), b'', b''
+    with open(path, 'rb') as fh:
+        while block := fh.read(HASH_BLOCK_SIZE):
+            if not head:
+                head = block[:8]
+            tail = (tail + block)[-1024:]
+            digest.update(block)
+    if path.lower().endswith('.pdf') and not (head.startswith(b'%PDF-') and b'%%EOF' in tail):
+        return digest.hexdigest(), 'not a complete PDF'
+    return digest.hexdigest(), ''
+
+
+def _content_issues(located, workers):
+    """Corrupt and duplicate files among `located` ({storage name: [(id, quote_no, stored)]})."""
+    names = sorted(located)
+    paths = [os.path.join(settings.MEDIA_ROOT, name) for name in names]
+    issues, by_digest = [], defaultdict(list)
+    with ThreadPoolExecutor(max_workers=workers) as pool:  # hashlib releases the GIL
+        for name, (digest, problem) in zip(names, pool.map(_inspect, paths)):
+            by_digest[digest].append(name)
+            if problem:
+                issues.extend(Issue(pk, quote_no, stored, 'corrupt', detail=problem)
+                              for pk, quote_no, stored in located[name])
+    for copies in by_digest.values():
+        for name in copies[1:]:
+            issues.extend(Issue(pk, quote_no, stored, 'duplicate', detail=f"same content as {copies[0]}")
+                          for pk, quote_no, stored in located[name])
+    return issues
+
+
+# ---------- Scan ----------
+def scan(fix=False, clear_missing=False, hash_files=False, workers=HASH_WORKERS):
+    """
+    Check every estimation's PO attachment against the files on disk.
+    MEDIA_ROOT/po_attachments (and MEDIA_ROOT itself, for old uploads) is
+    listed once and the estimations are streamed as tuples, so the scan
+    costs two directory reads and one query, not a stat per row.
+
+    Files that exist under another path are repointed; references to
+    files found nowhere are cleared only with clear_missing. Fixes are
+    written in one batched UPDATE when `fix` is set. With hash_files, the
+    referenced files are read in a thread pool to find corrupt PDFs and
+    duplicate uploads; those are reported, never changed.
+    """
+    media_root = str(settings.MEDIA_ROOT)
+    attachments = _listing(os.path.join(media_root, ATTACHMENT_DIR))
+    media_files = _listing(media_root)
+    sizes = {**media_files, **{f"{ATTACHMENT_DIR}/{name}": size for name, size in attachments.items()}}
+
+    issues, located, referenced, scanned = [], defaultdict(list), set(), 0
+    rows = (Estimation.objects.exclude(po_attachment='').exclude(po_attachment__isnull=True)
+            .order_by('pk').values_list('pk', 'quote_no', 'po_attachment'))
+    for pk, quote_no, stored in rows.iterator(chunk_size=5000):
+        scanned += 1
+        found = _locate(stored, attachments, media_files)
+        if found is None:
+            issues.append(Issue(pk, quote_no, stored, 'missing', '' if clear_missing else None))
+            continue
+        referenced.add(found)
+        if found != stored:
+            issues.append(Issue(pk, quote_no, stored, 'moved', found))
+        if sizes[found] == 0:
+            issues.append(Issue(pk, quote_no, stored, 'empty'))
+        else:
+            located[found].append((pk, quote_no, stored))
+
+    if hash_files:
+        issues.extend(_content_issues(located, workers))
+    for name in sorted(attachments):
+        if f"{ATTACHMENT_DIR}/{name}" not in referenced:
+            issues.append(Issue(None, '', f"{ATTACHMENT_DIR}/{name}", 'unreferenced'))
+
+    fixes = [(issue.fix, issue.estimation_id) for issue in issues if issue.fix is not None]
+    if fix and fixes:
+        with transaction.atomic():
+            update_rows(Estimation, ('po_attachment',), fixes)
+    return ScanResult(scanned, issues, len(fixes) if fix else 0)
+
+
+def write_report(result, fileobj):
+    """CSV of every issue found, one row each."""
+    writer = csv.writer(fileobj)
+    writer.writerow(['Estimation', 'Quote No', 'Stored', 'Problem', 'Fix', 'Detail'])
+    for issue in result.issues:
+        fix = '' if issue.fix is None else (issue.fix or '(cleared)')
+        writer.writerow([issue.estimation_id or '', issue.quote_no, issue.stored, issue.problem, fix, issue.detail])
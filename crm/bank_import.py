@@ -0,0 +1,240 @@
+import csv
+import re
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple, Optional
+
+from django.db import transaction
+from django.db.models import F
+
+from . import payments
+from .models import Invoice, PaymentLog
+from .spreadsheets import iter_records
+
+IMPORT_BATCH_SIZE = 200
+LOOKUP_CHUNK = 500
+
+# Accepted header spellings per column, compared lower-cased and stripped.
+STATEMENT_COLUMNS = {
+    'date': ('date', 'txn date', 'transaction date', 'value date', 'tran date', 'posting date'),
+    'description': ('description', 'narration', 'particulars', 'remarks', 'details', 'transaction details'),
+    'credit': ('credit', 'credit amount', 'deposit', 'deposits', 'deposit amt', 'deposit amount', 'cr amount', 'amount'),
+    'reference': ('utr', 'utr no', 'utr number', 'reference', 'reference no', 'ref no', 'ref no./cheque no.',
+                  'chq/ref no', 'cheque/ref no', 'chq./ref.no.'),
+}
+DATE_FORMATS = ('%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%d/%m/%y', '%d-%m-%y', '%d-%b-%Y', '%d %b %Y', '%d-%b-%y')
+
+# NEFT/RTGS references (IFSC-style bank code + digits) and 12-digit IMPS/UPI RRNs.
+UTR_PATTERN = re.compile(r'\b(?:[A-Z]{4}[A-Z0-9]\d{10,17}|\d{12})\b')
+# Narrations are split on '/' and whitespace ('NEFT/UTR/ACME/INV-20250101-001'); '-' stays inside a token.
+TOKEN_PATTERN = re.compile(r'[A-Z0-9](?:[A-Z0-9-]*[A-Z0-9])?')
+
+
+class StatementLine(NamedTuple):
+    line: int
+    date: Optional[date]
+    description: str
+    credit: Optional[Decimal]
+    utr: str
+
+
+class Match(NamedTuple):
+    line: StatementLine
+    invoice_id: int
+    invoice_no: str
+    rule: str  # 'invoice number', 'invoice number + client', 'amount' or 'amount + client'
+
+
+class Unmatched(NamedTuple):
+    line: StatementLine
+    reason: str
+
+
+class ImportResult(NamedTuple):
+    matched: list
+    unmatched: list
+    duplicates: list   # lines whose UTR is already recorded
+    skipped: int       # debits and blank lines
+    posted: int
+
+
+# ---------- Reading ----------
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value or '').strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_amount(value):
+    if isinstance(value, (int, float, Decimal)):
+        amount = Decimal(str(value))
+    else:
+        text = str(value or '').upper().replace(',', '').replace('₹', '').replace('CR', '').strip()
+        if not text:
+            return None
+        try:
+            amount = Decimal(text)
+        except InvalidOperation:
+            return None
+    return amount.quantize(Decimal("0.01")) if amount > 0 else None
+
+
+def read_statement(fileobj, filename):
+    """
+    Stream StatementLines from a bank statement (CSV, or XLSX in openpyxl's
+    read-only mode). The header row is found by its column names; rows
+    before it are ignored. The UTR comes from a reference column when there
+    is one, otherwise it is picked out of the narration.
+    """
+    for number, record in iter_records(fileobj, filename, STATEMENT_COLUMNS, ('date', 'credit')):
+        description = str(record.get('description') or '').strip()
+        reference = str(record.get('reference') or '').strip().upper()
+        if not UTR_PATTERN.fullmatch(reference):
+            found = UTR_PATTERN.search(description.upper())
+            reference = found.group(0) if found else reference
+        yield StatementLine(number, _parse_date(record['date']), description, _parse_amount(record['credit']), reference)
+
+
+# ---------- Matching ----------
+def _normalise(text):
+    return ' '.join(re.findall(r'[A-Z0-9]+', (text or '').upper()))
+
+
+class Reconciler:
+    """
+    Matches statement credits to open invoices in memory. The indexes
+    (invoice number, outstanding balance, recorded UTRs) are built with a
+    few queries up front, so matching costs no queries per line.
+    """
+
+    def __init__(self, lines):
+        self.open = {
+            row['id']: row for row in Invoice.objects.filter(balance_due__gt=0).values(
+                'id', 'invoice_no', 'balance_due', client=F('estimation__company_name__company_name'))
+        }
+        self.by_number = {row['invoice_no'].upper(): row for row in self.open.values()}
+        self.by_balance = defaultdict(set)
+        for row in self.open.values():
+            row['client_key'] = _normalise(row['client'])
+            self.by_balance[row['balance_due']].add(row['id'])
+        self.recorded = self._recorded_utrs({line.utr for line in lines if line.utr})
+
+    @staticmethod
+    def _recorded_utrs(utrs):
+        utrs, recorded = sorted(utrs), set()
+        for start in range(0, len(utrs), LOOKUP_CHUNK):
+            chunk = utrs[start:start + LOOKUP_CHUNK]
+            recorded.update(PaymentLog.objects.filter(utr_number__in=chunk).values_list('utr_number', flat=True))
+        return recorded
+
+    def _apply(self, row, amount):
+        # Later lines see what earlier lines in the same statement have paid.
+        self.by_balance[row['balance_due']].discard(row['id'])
+        row['balance_due'] -= amount
+        if row['balance_due'] > 0:
+            self.by_balance[row['balance_due']].add(row['id'])
+
+    def _by_number(self, line):
+        # An invoice number alone is not enough: the credit must clear the
+        # balance exactly, or be a part payment from the named client.
+        # Overpayments are reported rather than clamped when posted.
+        row = next((self.by_number[token] for token in TOKEN_PATTERN.findall(line.description.upper())
+                    if token in self.by_number), None)
+        if row is None:
+            return None, None
+        if line.credit > row['balance_due']:
+            return None, f"overpays {row['invoice_no']} (balance {row['balance_due']})"
+        if line.credit == row['balance_due']:
+            return row, 'invoice number'
+        if row['client_key'] and row['client_key'] in _normalise(line.description):
+            return row, 'invoice number + client'
+        return None, f"part payment of {row['invoice_no']} without the client's name"
+
+    def _by_amount(self, line):
+        candidates = [self.open[pk] for pk in self.by_balance.get(line.credit, ())]
+        if len(candidates) == 1:
+            return candidates[0], 'amount'
+        description = _normalise(line.description)
+        named = [row for row in candidates if row['client_key'] and row['client_key'] in description]
+        if len(named) == 1:
+            return named[0], 'amount + client'
+        return None, 'several open invoices for this amount' if candidates else 'no open invoice for this amount'
+
+    def match(self, line):
+        """A Match, an Unmatched, or None when the UTR is already recorded."""
+        if not line.utr:
+            return Unmatched(line, 'no UTR in the line')
+        if line.date is None:
+            return Unmatched(line, 'unreadable date')
+        if line.utr in self.recorded:
+            return None
+        row, rule = self._by_number(line)
+        if row is None:
+            if rule is not None:
+                return Unmatched(line, rule)
+            row, rule = self._by_amount(line)
+            if row is None:
+                return Unmatched(line, rule)
+        self.recorded.add(line.utr)
+        self._apply(row, line.credit)
+        return Match(line, row['id'], row['invoice_no'], rule)
+
+
+# ---------- Import ----------
+def import_statement(fileobj, filename, dry_run=False, batch_size=IMPORT_BATCH_SIZE):
+    """Match a statement's credits to invoices and post them in batched transactions."""
+    lines, skipped = [], 0
+    for line in read_statement(fileobj, filename):
+        if line.credit is None:
+            skipped += 1
+        else:
+            lines.append(line)
+
+    reconciler = Reconciler(lines)
+    matched, unmatched, duplicates = [], [], []
+    for line in lines:
+        outcome = reconciler.match(line)
+        if outcome is None:
+            duplicates.append(line)
+        elif isinstance(outcome, Match):
+            matched.append(outcome)
+        else:
+            unmatched.append(outcome)
+
+    posted = 0
+    if not dry_run:
+        for start in range(0, len(matched), batch_size):
+            batch = matched[start:start + batch_size]
+            with transaction.atomic():
+                posted += len(payments.record_payments([
+                    payments.PaymentEntry(m.invoice_id, m.line.credit, m.line.utr, m.line.date,
+                                          f"Bank import, line {m.line.line}")
+                    for m in batch
+                ]))
+    return ImportResult(matched, unmatched, duplicates, skipped, posted)
+
+
+def write_report(result, fileobj):
+    """CSV of every credit line and what happened to it; unmatched lines first."""
+    writer = csv.writer(fileobj)
+    writer.writerow(['Line', 'Date', 'Credit', 'UTR', 'Description', 'Outcome', 'Invoice', 'Detail'])
+    for item in result.unmatched:
+        writer.writerow(_report_row(item.line, 'Unmatched', '', item.reason))
+    for line in result.duplicates:
+        writer.writerow(_report_row(line, 'Already recorded', '', ''))
+    for item in result.matched:
+        writer.writerow(_report_row(item.line, 'Matched', item.invoice_no, item.rule))
+
+
+def _report_row(line, outcome, invoice_no, detail):
+    return [line.line, line.date.isoformat() if line.date else '', line.credit, line.utr,
+            line.description, outcome, invoice_no, detail]
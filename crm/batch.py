@@ -0,0 +1,135 @@
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from django.conf import settings
+from django.db import connections
+
+from . import pdf_cache, reports
+from .jobs import init_worker_process
+
+DOCUMENT_KINDS = {
+    'invoice': (reports.filter_invoices, pdf_cache.invoice_pdf),
+    'quotation': (reports.filter_estimations, pdf_cache.quotation_pdf),
+}
+
+# Only one export per web process gets a render pool; the rest render serially.
+_request_pool = threading.BoundedSemaphore(1)
+
+
+def document_ids(kind, params):
+    filter_documents, _render = DOCUMENT_KINDS[kind]
+    return list(filter_documents(params).order_by('pk').values_list('pk', flat=True))
+
+
+def render_document(kind, pk):
+    """(filename, bytes) for one document. Top-level so worker processes can pickle it."""
+    _filter, render = DOCUMENT_KINDS[kind]
+    return render(pk)
+
+
+def iter_rendered(kind, ids, processes=1):
+    """
+    Yield (filename, bytes) for each id as soon as it is rendered.
+
+    With more than one process the renders run in a process pool; at most
+    two per process are in flight, so finished PDFs never pile up in memory
+    faster than the consumer writes them out.
+    """
+    if processes <= 1:
+        for pk in ids:
+            yield render_document(kind, pk)
+        return
+
+    connections.close_all()  # children must not inherit open DB sockets
+    pool = ProcessPoolExecutor(max_workers=processes, initializer=init_worker_process)
+    pending = iter(ids)
+    in_flight = set()
+    try:
+        while True:
+            for pk in pending:
+                in_flight.add(pool.submit(render_document, kind, pk))
+                if len(in_flight) >= processes * 2:
+                    break
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_rendered_for_request(kind, ids):
+    """
+    iter_rendered for a web request. The pool is capped at
+    PDF_EXPORT_REQUEST_PROCESSES (default 1: render in the request's own
+    process), and a second concurrent export in the same web process renders
+    serially rather than forking a pool of its own.
+    """
+    processes = settings.PDF_EXPORT_REQUEST_PROCESSES
+    if processes <= 1 or not _request_pool.acquire(blocking=False):
+        yield from iter_rendered(kind, ids)
+        return
+    try:
+        yield from iter_rendered(kind, ids, processes=processes)
+    finally:
+        _request_pool.release()
+
+
+def _unique_name(filename, seen):
+    name = filename
+    n = 1
+    while name in seen:
+        n += 1
+        stem, dot, ext = filename.rpartition('.')
+        name = f"{stem} ({n}).{ext}" if dot else f"{filename} ({n})"
+    seen.add(name)
+    return name
+
+
+def write_zip(documents, fileobj):
+    """
+    Write (filename, bytes) pairs into a zip on `fileobj`, yielding the running
+    count after each file. The zip is only complete once this is exhausted.
+    """
+    seen = set()
+    count = 0
+    # PDFs are already compressed; storing them keeps the zip step cheap.
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for filename, pdf_bytes in documents:
+            zf.writestr(_unique_name(filename, seen), pdf_bytes)
+            count += 1
+            yield count
+
+
+class _ZipSink:
+    """Write-only, unseekable sink; zipfile falls back to streaming mode for it."""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(documents):
+    """Yield zip bytes incrementally: each file is sent as soon as it is added."""
+    sink = _ZipSink()
+    for _count in write_zip(documents, sink):
+        yield sink.drain()
+    yield sink.drain()  # central directory
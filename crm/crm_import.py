@@ -0,0 +1,206 @@
+import re
+from collections import Counter, defaultdict
+from decimal import Decimal
+from itertools import islice
+from typing import NamedTuple
+
+from django.db import transaction
+
+from . import dashboard, search, sequences
+from .models import Client, Lead
+from .spreadsheets import iter_records
+
+IMPORT_CHUNK_SIZE = 1000
+INSERT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 200
+
+# Accepted header spellings per column, compared lower-cased and stripped.
+CRM_COLUMNS = {
+    'company_name': ('company_name', 'company name', 'company', 'client', 'client name', 'customer',
+                     'customer name'),
+    'type_of_company': ('type_of_company', 'type of company', 'company type', 'type', 'constitution'),
+    'gst_no': ('gst_no', 'gst no', 'gst', 'gstin', 'gst number', 'gstin/uin'),
+    'contact_person': ('contact_person', 'contact person', 'contact', 'contact name'),
+    'email': ('email', 'e-mail', 'email id', 'email address'),
+    'mobile': ('mobile', 'mobile no', 'mobile number', 'phone', 'phone no', 'contact no'),
+    'address': ('address', 'billing address'),
+    'requirement': ('requirement', 'lead requirement', 'enquiry', 'requirement details'),
+}
+
+GSTIN = re.compile(r'\d{2}[A-Z]{5}\d{4}[A-Z][1-9A-Z]Z[0-9A-Z]')
+LEGAL_WORDS = {'M', 'S', 'MS', 'PVT', 'PRIVATE', 'LTD', 'LIMITED', 'LLP', 'THE'}
+
+
+class ImportResult(NamedTuple):
+    stats: Counter   # rows, clients_created, clients_matched, leads_created, skipped
+    errors: list     # (row number, message) for skipped rows and warnings, capped
+
+
+# ---------- Normalisation ----------
+def _text(value, limit=None):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # numbers typed into Excel cells come back as floats
+    text = ' '.join(str(value).split())
+    return text[:limit] if limit else text
+
+
+def normalise_gst(value):
+    text = re.sub(r'[^0-9A-Z]', '', _text(value).upper())
+    return text if GSTIN.fullmatch(text) else None
+
+
+def name_key(value):
+    """'M/s. Acme Steels Pvt. Ltd.' and 'ACME STEELS PRIVATE LIMITED' share a key."""
+    words = re.findall(r'[A-Z0-9]+', _text(value).upper())
+    return ' '.join(word for word in words if word not in LEGAL_WORDS)
+
+
+def _mobile(value):
+    digits = re.sub(r'\D', '', _text(value))
+    return digits[-10:] if len(digits) >= 10 else digits
+
+
+# ---------- Client index ----------
+class ClientIndex:
+    """
+    Existing clients keyed by GSTIN and by normalised name, loaded once;
+    clients created during the import are added as they are inserted.
+    A GSTIN match wins; a name match is only used when the row has no
+    GSTIN or the matched client has none on file.
+    """
+
+    def __init__(self):
+        self.by_gst, self.by_name, self.gst_of = {}, {}, {}
+        rows = Client.objects.order_by('id').values_list('id', 'company_name', 'gst_no')
+        for pk, company_name, gst_no in rows.iterator(chunk_size=5000):
+            self.add(pk, normalise_gst(gst_no), name_key(company_name))
+
+    def add(self, pk, gst, key):
+        if gst:
+            self.by_gst.setdefault(gst, pk)
+        if key:
+            self.by_name.setdefault(key, pk)
+        self.gst_of.setdefault(pk, gst)
+
+    def find(self, gst, key):
+        if gst and gst in self.by_gst:
+            return self.by_gst[gst]
+        pk = self.by_name.get(key)
+        if pk is not None and (not gst or not self.gst_of.get(pk)):
+            return pk
+        return None
+
+
+# ---------- Import ----------
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def import_crm(fileobj, filename, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    Stream clients (and, where a row has a requirement, a lead for that
+    client) from a CSV/XLSX export. Clients are deduplicated on GSTIN,
+    then company name, against an in-memory index of existing rows.
+    Each chunk is one transaction of bulk INSERTs, with lead numbers
+    reserved as a block. `progress(stats)` is called after every chunk.
+    """
+    index = ClientIndex()
+    stats, errors = Counter(), []
+    records = iter_records(fileobj, filename, CRM_COLUMNS, ('company_name',))
+    for chunk in _chunks(records, chunk_size):
+        _import_chunk(chunk, index, stats, errors)
+        if progress:
+            progress(stats)
+    return ImportResult(stats, errors)
+
+
+def _import_chunk(chunk, index, stats, errors):
+    def note(number, message):
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append((number, message))
+
+    new_clients = {}   # dedupe key -> unsaved Client, shared by rows in this chunk
+    lead_rows = []     # (record, existing client pk or unsaved Client)
+    for number, record in chunk:
+        stats['rows'] += 1
+        company_name = _text(record.get('company_name'), 255)
+        if not company_name:
+            stats['skipped'] += 1
+            note(number, "missing company name; row skipped")
+            continue
+        raw_gst = _text(record.get('gst_no'))
+        gst = normalise_gst(raw_gst)
+        if raw_gst and not gst:
+            note(number, f"invalid GSTIN {raw_gst!r}; matched and imported by name only")
+        key = name_key(company_name)
+
+        client = index.find(gst, key)
+        if client is not None:
+            stats['clients_matched'] += 1
+        else:
+            client = new_clients.get(('gst', gst)) if gst else None
+            if client is None:
+                # Same rule as ClientIndex.find: a name match never merges two GSTINs.
+                pending = new_clients.get(('name', key))
+                if pending is not None and (not gst or not pending.gst_no):
+                    client = pending
+                    if gst:
+                        client.gst_no = gst
+                        new_clients[('gst', gst)] = client
+            if client is None:
+                client = Client(
+                    company_name=company_name,
+                    type_of_company=_text(record.get('type_of_company'), 100),
+                    gst_no=gst,
+                    contact_person=_text(record.get('contact_person'), 100) or None,
+                    email=_text(record.get('email'), 254).lower() or None,
+                    mobile=_mobile(record.get('mobile')) or None,
+                    address=_text(record.get('address')) or None,
+                )
+                if gst:
+                    new_clients[('gst', gst)] = client
+                new_clients.setdefault(('name', key), client)
+            else:
+                stats['clients_matched'] += 1
+
+        if _text(record.get('requirement')):
+            lead_rows.append((record, client))
+
+    created = list({id(client): client for client in new_clients.values()}.values())
+    with transaction.atomic():
+        Client.objects.bulk_create(created, batch_size=INSERT_BATCH_SIZE)
+        for client in created:
+            index.add(client.pk, client.gst_no, name_key(client.company_name))
+        existing = Client.objects.in_bulk({c for _record, c in lead_rows if isinstance(c, int)})
+
+        numbers = sequences.reserve('lead', len(lead_rows))
+        leads = [
+            Lead(
+                lead_no=lead_no,
+                company_name=existing[client] if isinstance(client, int) else client,
+                contact_person=_text(record.get('contact_person'), 100),
+                email=_text(record.get('email'), 254).lower() or None,
+                mobile=_mobile(record.get('mobile')),
+                address=_text(record.get('address')),
+                requirement=_text(record.get('requirement')),
+            )
+            for lead_no, (record, client) in zip(numbers, lead_rows)
+        ]
+        Lead.objects.bulk_create(leads, batch_size=INSERT_BATCH_SIZE)
+
+        # bulk_create skips the signals: index the new rows and roll the
+        # leads into the dashboard snapshot here.
+        search.index_objects('client', created)
+        search.index_objects('lead', leads)
+        cells = defaultdict(Decimal)
+        for lead in leads:
+            for cell, amount in dashboard.contribution(lead).items():
+                cells[cell] += amount
+        dashboard.apply_change({}, cells)
+
+    stats['clients_created'] += len(created)
+    stats['leads_created'] += len(leads)
@@ -0,0 +1,298 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.apps import apps as global_apps
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Client, DashboardSnapshot, Estimation, Invoice, Lead, PaymentLog
+
+# PaymentLog statuses that count towards "Paid" (Paid + Partial Paid together).
+PAID_STATUSES = ("Paid", "Partial Paid")
+CLIENT_LEADS = "client_leads:"
+# Above this many changed cells apply_change switches to set-based writes.
+BULK_CELLS = 50
+LOOKUP_CHUNK = 500
+
+
+# ---------- Contributions ----------
+# Each tracked model maps a row to the snapshot cells it adds to:
+# {(metric, day): amount}, where day None is the all-time cell.
+def _day(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def _cells(day, **metrics):
+    cells = {}
+    for metric, amount in metrics.items():
+        metric = metric.replace("__", ":")
+        cells[(metric, None)] = Decimal(amount or 0)
+        if day:
+            cells[(metric, day)] = Decimal(amount or 0)
+    return cells
+
+
+def _invoice(row):
+    return _cells(_day(row["created_at"]), **{
+        "invoiced": row["total_value"],
+        "balance_due": row["balance_due"],
+        "invoices": 1,
+        f"invoice_status__{row['status']}": 1,
+    })
+
+
+def _payment(row):
+    if row["status"] not in PAID_STATUSES:
+        return {}
+    return _cells(_day(row["payment_date"]), paid=row["amount_paid"])
+
+
+def _lead(row):
+    cells = _cells(_day(row["date"]), leads=1)
+    cells[(f"{CLIENT_LEADS}{row['company_name_id']}", None)] = Decimal(1)
+    return cells
+
+
+def _estimation(row):
+    return _cells(_day(row["quote_date"]), **{
+        "quotations": 1,
+        f"quotation_status__{row['status']}": 1,
+    })
+
+
+TRACKED = {
+    Invoice: (("created_at", "total_value", "balance_due", "status"), _invoice),
+    PaymentLog: (("payment_date", "amount_paid", "status"), _payment),
+    Lead: (("date", "company_name_id"), _lead),
+    Estimation: (("quote_date", "status"), _estimation),
+}
+
+
+def contribution(instance):
+    fields, contrib = TRACKED[type(instance)]
+    return contrib({field: getattr(instance, field) for field in fields})
+
+
+def stored_contribution(model, pk):
+    """Contribution of the row as currently stored, before a save changes it."""
+    fields, contrib = TRACKED[model]
+    row = model.objects.filter(pk=pk).values(*fields).first()
+    return contrib(row) if row else {}
+
+
+# ---------- Incremental updates ----------
+def _bump(metric, day, delta):
+    cell = DashboardSnapshot.objects.filter(metric=metric, day=day)
+    if cell.update(value=F("value") + delta):
+        return
+    try:
+        with transaction.atomic():
+            DashboardSnapshot.objects.create(metric=metric, day=day, value=delta)
+    except IntegrityError:  # another request created the cell first
+        cell.update(value=F("value") + delta)
+
+
+def _bump_many(deltas):
+    # Existing cells are looked up by metric in chunks and moved with one
+    # prepared UPDATE; the rest are bulk-inserted. Used for bulk imports,
+    # where per-client cells run into the thousands.
+    metrics, ids = sorted({metric for metric, _day in deltas}), {}
+    for start in range(0, len(metrics), LOOKUP_CHUNK):
+        rows = DashboardSnapshot.objects.filter(metric__in=metrics[start:start + LOOKUP_CHUNK])
+        ids.update(((metric, day), pk) for pk, metric, day in rows.values_list("id", "metric", "day"))
+
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {quote(DashboardSnapshot._meta.db_table)} SET {quote('value')} = {quote('value')} + %s "
+            f"WHERE {quote('id')} = %s",
+            [(delta, ids[key]) for key, delta in deltas.items() if key in ids],
+        )
+    missing = [DashboardSnapshot(metric=metric, day=day, value=delta)
+               for (metric, day), delta in deltas.items() if (metric, day) not in ids]
+    try:
+        with transaction.atomic():
+            DashboardSnapshot.objects.bulk_create(missing, batch_size=LOOKUP_CHUNK)
+    except IntegrityError:  # a concurrent writer created some of them first
+        for cell in missing:
+            _bump(cell.metric, cell.day, cell.value)
+
+
+def apply_change(old, new):
+    """Add `new - old` to the snapshot, one F() update per changed cell."""
+    deltas = {}
+    for key in old.keys() | new.keys():
+        delta = new.get(key, Decimal(0)) - old.get(key, Decimal(0))
+        if delta:
+            deltas[key] = delta
+    if len(deltas) > BULK_CELLS:
+        _bump_many(deltas)
+        return
+    for (metric, day), delta in deltas.items():
+        _bump(metric, day, delta)
+
+
+# ---------- Reconcile ----------
+def compute_snapshot(apps=global_apps):
+    """
+    Rebuild every cell from the fact tables with GROUP BY queries.
+    Migrations pass their historical `apps` to backfill the snapshot.
+    """
+    Invoice, PaymentLog, Lead, Estimation = (
+        apps.get_model("crm", name) for name in ("Invoice", "PaymentLog", "Lead", "Estimation")
+    )
+    cells = defaultdict(Decimal)
+
+    def add(day, **metrics):
+        for key, amount in _cells(day, **metrics).items():
+            cells[key] += amount
+
+    created = TruncDate("created_at")  # local date, matching _day()
+    for row in Invoice.objects.values(d=created).annotate(
+        invoiced=Sum("total_value"), balance_due=Sum("balance_due"), invoices=Count("id")
+    ).order_by():
+        add(row["d"], invoiced=row["invoiced"], balance_due=row["balance_due"], invoices=row["invoices"])
+    for row in Invoice.objects.values("status", d=created).annotate(n=Count("id")).order_by():
+        add(row["d"], **{f"invoice_status__{row['status']}": row["n"]})
+
+    for row in PaymentLog.objects.filter(status__in=PAID_STATUSES).values(
+        d=F("payment_date")
+    ).annotate(paid=Sum("amount_paid")).order_by():
+        add(row["d"], paid=row["paid"])
+
+    for row in Lead.objects.values(d=F("date")).annotate(n=Count("id")).order_by():
+        add(row["d"], leads=row["n"])
+    for row in Lead.objects.values("company_name_id").annotate(n=Count("id")).order_by():
+        cells[(f"{CLIENT_LEADS}{row['company_name_id']}", None)] += row["n"]
+
+    for row in Estimation.objects.values("status", d=F("quote_date")).annotate(
+        n=Count("id")
+    ).order_by():
+        add(row["d"], quotations=row["n"], **{f"quotation_status__{row['status']}": row["n"]})
+
+    return dict(cells)
+
+
+def reconcile(dry_run=False, apps=global_apps):
+    """
+    Compare the stored snapshot with a fresh rebuild and fix any drift
+    (e.g. from queryset.update() calls, which bypass signals).
+    Also backfills: on an empty table it writes every daily rollup.
+    Returns {(metric, day): (stored, expected)} for every cell that differed.
+    """
+    Snapshot = apps.get_model("crm", "DashboardSnapshot")
+    expected = compute_snapshot(apps)
+    stored = {
+        (row.metric, row.day): row.value for row in Snapshot.objects.all()
+    }
+    drift = {
+        key: (stored.get(key, Decimal(0)), expected.get(key, Decimal(0)))
+        for key in stored.keys() | expected.keys()
+        if stored.get(key, Decimal(0)) != expected.get(key, Decimal(0))
+    }
+    if drift and not dry_run:
+        with transaction.atomic():
+            Snapshot.objects.all().delete()
+            Snapshot.objects.bulk_create(
+                [Snapshot(metric=m, day=day, value=v)
+                 for (m, day), v in expected.items() if v],
+                batch_size=1000,
+            )
+    return drift
+
+
+# ---------- Reads ----------
+def _add_months(month, n):
+    total = month.year * 12 + month.month - 1 + n
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def period_range(selected, today=None, start=None, end=None):
+    """
+    (first_day, last_day) for a dashboard `date_filter` period, inclusive,
+    or None for all-time (unknown filter, or custom without both dates).
+    """
+    today = today or timezone.localdate()
+    this_month = today.replace(day=1)
+    quarter_start = this_month.replace(month=(this_month.month - 1) // 3 * 3 + 1)
+
+    if selected == "this_month":
+        return this_month, today
+    if selected == "this_quarter":
+        return quarter_start, today
+    if selected == "this_year":
+        return this_month.replace(month=1), today
+    if selected == "previous_month":
+        return _add_months(this_month, -1), this_month - timedelta(days=1)
+    if selected == "previous_quarter":
+        return _add_months(quarter_start, -3), quarter_start - timedelta(days=1)
+    if selected == "previous_year":
+        return date(today.year - 1, 1, 1), date(today.year - 1, 12, 31)
+    if selected == "custom":
+        try:
+            first, last = _day(start), _day(end)
+        except ValueError:
+            return None
+        if first and last:
+            return min(first, last), max(first, last)
+    return None
+
+
+def figures(period=None):
+    """
+    Dashboard numbers for a (first_day, last_day) period, or all-time when
+    None. One grouped query over at most one rollup row per metric per day.
+    """
+    cells = DashboardSnapshot.objects.exclude(metric__startswith=CLIENT_LEADS)
+    if period is None:
+        cells = cells.filter(day__isnull=True)
+    else:
+        cells = cells.filter(day__range=period)
+    totals = dict(cells.values("metric").annotate(total=Sum("value")).values_list("metric", "total"))
+
+    def statuses(prefix):
+        return [
+            {"status": metric[len(prefix):], "count": int(total)}
+            for metric, total in sorted(totals.items())
+            if metric.startswith(prefix) and total
+        ]
+
+    def number(metric):
+        return int(totals.get(metric) or 0)
+
+    return {
+        "total_invoiced": totals.get("invoiced") or 0,
+        "paid": totals.get("paid") or 0,
+        "balance_due": totals.get("balance_due") or 0,
+        "total_leads": number("leads"),
+        "total_quotations": number("quotations"),
+        "total_invoices": number("invoices"),
+        "quotation_status": statuses("quotation_status:"),
+        "invoice_status": statuses("invoice_status:"),
+    }
+
+
+def top_clients(limit=4):
+    cells = (
+        DashboardSnapshot.objects.filter(day__isnull=True, metric__startswith=CLIENT_LEADS)
+        .exclude(value=0)
+        .order_by("-value")[:limit]
+    )
+    counts = {int(c.metric[len(CLIENT_LEADS):]): int(c.value) for c in cells}
+    clients = Client.objects.in_bulk(list(counts))
+    result = []
+    for client_id, total in counts.items():
+        if client_id in clients:
+            client = clients[client_id]
+            client.total_leads = total
+            result.append(client)
+    return result
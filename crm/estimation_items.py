@@ -0,0 +1,95 @@
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from .models import EstimationItem
+from .utils import safe_decimal
+
+# Rows per INSERT. Django lowers it further on SQLite to fit the bound-variable limit.
+ITEM_BATCH_SIZE = 500
+
+# Parallel POST lists the quotation forms submit, one entry per line.
+ITEM_POST_FIELDS = ('item_details[]', 'quantity[]', 'rate[]', 'tax[]', 'amount[]')
+ITEM_FIELDS = ('item_details', 'quantity', 'rate', 'tax', 'amount')
+
+
+class ItemRow(NamedTuple):
+    item_details: str
+    quantity: int
+    rate: Decimal
+    tax: Decimal
+    amount: Decimal
+    item_id: Optional[int] = None  # stored EstimationItem this line edits, if any
+
+    def values(self):
+        return {field: getattr(self, field) for field in ITEM_FIELDS}
+
+
+def parse_items(post):
+    """
+    Zip the parallel item lists from a quotation form into ItemRows.
+    Entirely blank lines are dropped; a bad quantity raises ValueError
+    naming the line, before anything is written. The edit form also posts
+    `item_id[]` (blank for new lines) so rows can be matched to stored items.
+    """
+    rows = []
+    columns = [post.getlist(field) for field in ITEM_POST_FIELDS]
+    item_ids = post.getlist('item_id[]')
+    for line, (detail, qty, rate, tax, amount) in enumerate(zip(*columns), start=1):
+        if not any(value.strip() for value in (detail, qty, rate, tax, amount)):
+            continue
+        try:
+            quantity = int(qty or 0)
+        except ValueError:
+            raise ValueError(f"Line {line}: invalid quantity {qty!r}")
+        rows.append(ItemRow(
+            item_details=detail,
+            quantity=quantity,
+            rate=safe_decimal(rate),
+            tax=safe_decimal(tax),
+            amount=safe_decimal(amount),
+            item_id=_item_id(item_ids, line),
+        ))
+    return rows
+
+
+def _item_id(item_ids, line):
+    value = item_ids[line - 1].strip() if line <= len(item_ids) else ''
+    return int(value) if value.isdigit() else None
+
+
+def create_items(estimation, rows):
+    """Insert all rows for `estimation` in batched INSERTs. Call inside transaction.atomic."""
+    return EstimationItem.objects.bulk_create(
+        [EstimationItem(estimation=estimation, **row.values()) for row in rows],
+        batch_size=ITEM_BATCH_SIZE,
+    )
+
+
+def sync_items(estimation, rows):
+    """
+    Make the stored items match `rows` with the fewest writes: changed lines
+    are bulk-updated in place (keeping their ids), new lines bulk-created,
+    and lines no longer posted deleted. Call inside transaction.atomic.
+    Returns (created, updated, deleted) counts.
+    """
+    stored = {item.pk: item for item in estimation.items.all()}
+    to_create, to_update = [], []
+    for row in rows:
+        # Ids that don't belong to this estimation are treated as new lines.
+        item = stored.pop(row.item_id, None) if row.item_id else None
+        if item is None:
+            to_create.append(EstimationItem(estimation=estimation, **row.values()))
+            continue
+        changed = {f: v for f, v in row.values().items() if getattr(item, f) != v}
+        if changed:
+            for field, value in changed.items():
+                setattr(item, field, value)
+            to_update.append(item)
+
+    if stored:
+        EstimationItem.objects.filter(pk__in=list(stored)).delete()
+    if to_update:
+        EstimationItem.objects.bulk_update(to_update, ITEM_FIELDS, batch_size=ITEM_BATCH_SIZE)
+    if to_create:
+        EstimationItem.objects.bulk_create(to_create, batch_size=ITEM_BATCH_SIZE)
+    return len(to_create), len(to_update), len(stored)
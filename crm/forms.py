@@ -19,13 +19,13 @@ class LeadForm(forms.ModelForm):
 
 
 from django import forms
+from django.db.models import Q
 from .models import Estimation, Lead
 
 class EstimationForm(forms.ModelForm):
     class Meta:
         model = Estimation
         fields = [
-<<<<<<< HEAD
             "quote_no", "quote_date", "lead_no", "company_name",
             "validity_days", "gst_no", "billing_address",
             "shipping_address", "terms_conditions", "bank_details",
@@ -33,14 +33,29 @@ class EstimationForm(forms.ModelForm):
             "status", "credit_days", "po_number", "po_date",
             "po_received_date", "po_attachment", "remarks",
             "follow_up_date", "follow_up_remarks"
-=======
-            'quote_date', 'lead_no', 'validity_days', 'billing_address', 
-            'shipping_address', 'discount', 'terms_conditions', 
-            'sub_total', 'gst_amount', 'total'
->>>>>>> 9a85476b80137d17312bc3d00a29ba847fb293b4
         ]
 
 
+class EstimationEditForm(forms.ModelForm):
+    """The fields edit_estimation.html actually posts; everything else is left untouched."""
+    class Meta:
+        model = Estimation
+        fields = [
+            "quote_date", "lead_no", "validity_days", "billing_address",
+            "shipping_address", "terms_conditions", "sub_total", "discount",
+            "gst_amount", "total",
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The client is fixed once quoted, so only its leads (and the one
+        # already linked) are offered; Lead.__str__ needs the client row.
+        estimation = self.instance
+        self.fields['lead_no'].queryset = Lead.objects.filter(
+            Q(company_name_id=estimation.company_name_id) | Q(pk=estimation.lead_no_id)
+        ).select_related('company_name')
+
+
 
 
 from django import forms
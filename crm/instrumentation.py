@@ -0,0 +1,172 @@
+import logging
+import os
+import sys
+from contextlib import ExitStack
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('crm.performance')
+
+_current = ContextVar('crm_request_stats', default=None)
+_THIS_FILE = os.path.abspath(__file__)
+_PROJECT_DIR = str(settings.BASE_DIR)
+
+
+# ---------- Call sites ----------
+def _call_site(frame):
+    """
+    'path:line in function' of the innermost project frame below `frame`,
+    plus the template tag being rendered when the query came from one.
+    Only called once per flagged fingerprint, so the stack walk is cheap.
+    """
+    site, template = None, None
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.abspath(code.co_filename)
+        if template is None and code.co_name == 'render_annotated' and 'django' in filename:
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                template = f"{origin.template_name}, line {token.lineno}"
+        if (site is None and filename != _THIS_FILE and filename.startswith(_PROJECT_DIR)
+                and 'site-packages' not in filename):
+            site = f"{os.path.relpath(filename, _PROJECT_DIR)}:{frame.f_lineno} in {code.co_name}"
+        if site and template:
+            break
+        frame = frame.f_back
+    site = site or 'unknown'
+    return f"{site} (template {template})" if template else site
+
+
+# ---------- Per-request stats ----------
+class RequestStats:
+    """
+    Query count, SQL time and per-statement repeat counts for one request,
+    collected as a connection execute_wrapper. Statements are fingerprinted
+    by their parameterised SQL, which the ORM already produces; the call
+    site is captured only when a fingerprint crosses the repeat threshold.
+    """
+
+    def __init__(self, repeat_threshold):
+        self.repeat_threshold = repeat_threshold
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.counts = {}
+        self.sites = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += perf_counter() - start
+            self.queries += 1
+            count = self.counts.get(sql, 0) + 1
+            self.counts[sql] = count
+            if count == self.repeat_threshold + 1:
+                self.sites[sql] = _call_site(sys._getframe(1))
+
+    def repeated(self):
+        """[(count, sql, call site)] for fingerprints over the threshold, worst first."""
+        return sorted(((self.counts[sql], sql, site) for sql, site in self.sites.items()), reverse=True)
+
+    def server_timing(self, elapsed):
+        return (
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries", '
+            f'tpl;dur={self.template_time * 1000:.1f};desc="templates", '
+            f'total;dur={elapsed * 1000:.1f}'
+        )
+
+
+# ---------- Middleware ----------
+def _shows_timing(request):
+    # Only the user the view already loaded: resolving request.user here
+    # would add the session and user queries to every anonymous page.
+    user = getattr(request, '_cached_user', None)
+    return settings.DEBUG or bool(user is not None and user.is_staff)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records queries, SQL time and template time per request and logs to
+    'crm.performance' when a request goes over REQUEST_TIME_BUDGET_MS or
+    REQUEST_QUERY_BUDGET, or runs one statement more than
+    REQUEST_REPEATED_QUERY_THRESHOLD times (a probable N+1). The figures
+    are also sent as a Server-Timing header, but only to staff users (once
+    the view has loaded request.user) or when DEBUG is on; the logging
+    applies to every request.
+
+    Streaming responses (the CSV/XLSX and zip exports) are measured up to
+    the first byte only: the body is generated after the middleware
+    returns, so its queries and time are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats(settings.REQUEST_REPEATED_QUERY_THRESHOLD)
+        token = _current.set(stats)
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = perf_counter() - start
+
+        if _shows_timing(request):
+            response['Server-Timing'] = stats.server_timing(elapsed)
+        self.log(request, stats, elapsed, response.streaming)
+        return response
+
+    def log(self, request, stats, elapsed, streaming=False):
+        label = f"{request.method} {request.path}"
+        if streaming:
+            label += " (streaming; measured to the first byte)"
+        if elapsed * 1000 > settings.REQUEST_TIME_BUDGET_MS or stats.queries > settings.REQUEST_QUERY_BUDGET:
+            logger.warning(
+                "Over budget: %s took %.0fms, %d queries (%d distinct), %.0fms SQL, %.0fms templates",
+                label, elapsed * 1000, stats.queries, len(stats.counts),
+                stats.sql_time * 1000, stats.template_time * 1000,
+            )
+        for count, sql, site in stats.repeated():
+            logger.warning("Probable N+1 on %s: %d× %s at %s", label, count, sql[:300], site)
+
+
+# ---------- Templates ----------
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+        stats.template_depth += 1
+        start = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:  # render_to_string inside a template counts once
+                stats.template_time += perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time added to the request's stats."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
@@ -0,0 +1,110 @@
+from collections import defaultdict
+from datetime import datetime, time
+from decimal import ROUND_HALF_UP, Decimal
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.utils import timezone
+
+from . import dashboard
+from .models import EstimationItem, Invoice
+from .utils import update_rows
+
+TOTALS_CHUNK_SIZE = 2000
+CENT = Decimal("0.01")
+
+# Exact in every backend: rate and tax have two decimal places each, so
+# quantity * rate * (100 + tax) has four; SQLite's float result is
+# quantized back to those four places by the DecimalField converter.
+GROSS_FIELD = DecimalField(max_digits=28, decimal_places=4)
+_FIELDS = ('id', 'invoice_no', 'estimation_id', 'created_at', 'total_value', 'balance_due', 'paid_amount', 'status')
+
+
+class TotalChange(NamedTuple):
+    invoice_no: str
+    old_total: Decimal
+    new_total: Decimal
+    old_balance: Decimal
+    new_balance: Decimal
+
+
+class TotalsChunk(NamedTuple):
+    scanned: int
+    skipped: int    # invoices whose estimation has no items; left alone
+    changes: list   # TotalChange for every invoice that was (or would be) rewritten
+
+
+def items_gross():
+    """
+    Subquery: 100 x the tax-inclusive total of the invoice's estimation
+    items, summed in the database. NULL when the estimation has no items.
+    """
+    line = ExpressionWrapper(F('quantity') * F('rate') * (Value(100) + F('tax')), output_field=GROSS_FIELD)
+    gross = (
+        EstimationItem.objects.filter(estimation=OuterRef('estimation_id'))
+        .order_by().values('estimation').annotate(gross=Sum(line)).values('gross')
+    )
+    return Subquery(gross, output_field=GROSS_FIELD)
+
+
+def _recomputed(invoice):
+    """(total, balance_due, status) implied by the items and the payments recorded so far."""
+    total = (invoice.items_gross / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+    balance = max(total - invoice.paid_amount, Decimal("0.00"))
+    status = invoice.status
+    if invoice.paid_amount > 0:  # same rule as payments.record_payment
+        status = 'Paid' if balance == 0 else 'Partial Paid'
+    return total, balance, status
+
+
+def recompute_totals(since=None, dry_run=False, chunk_size=TOTALS_CHUNK_SIZE):
+    """
+    Bring Invoice.total_value (and balance_due, net of paid_amount) in
+    line with the estimation items, walking the table in primary-key
+    chunks. Each chunk is one SELECT with the totals aggregated by
+    items_gross(), then one batched UPDATE of just the rows that changed,
+    plus the matching dashboard delta. Yields a TotalsChunk per chunk.
+
+    since: only invoices created on or after this date.
+    """
+    invoices = Invoice.objects.only(*_FIELDS).annotate(items_gross=items_gross()).order_by('pk')
+    if since:
+        invoices = invoices.filter(created_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+
+    last = 0
+    while True:
+        with transaction.atomic():
+            page = invoices.filter(pk__gt=last)
+            if not dry_run:
+                # Locked, so a payment can't land between the read and the write.
+                page = page.select_for_update()
+            chunk = list(page[:chunk_size])
+            if not chunk:
+                return
+            last = chunk[-1].pk
+
+            changes, rows, skipped = [], [], 0
+            old, new = defaultdict(Decimal), defaultdict(Decimal)
+            for invoice in chunk:
+                if invoice.items_gross is None:
+                    skipped += 1
+                    continue
+                total, balance, status = _recomputed(invoice)
+                if (total, balance, status) == (invoice.total_value, invoice.balance_due, invoice.status):
+                    continue
+                changes.append(TotalChange(invoice.invoice_no, invoice.total_value, total,
+                                           invoice.balance_due, balance))
+                for key, amount in dashboard.contribution(invoice).items():
+                    old[key] += amount
+                invoice.total_value, invoice.balance_due, invoice.status = total, balance, status
+                for key, amount in dashboard.contribution(invoice).items():
+                    new[key] += amount
+                rows.append((total, balance, status, invoice.pk))
+
+            if rows and not dry_run:
+                update_rows(Invoice, ('total_value', 'balance_due', 'status'), rows)
+                dashboard.apply_change(old, new)  # raw UPDATEs bypass the signals
+        yield TotalsChunk(len(chunk), skipped, changes)
+        if len(chunk) < chunk_size:
+            return
@@ -0,0 +1,174 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.db import connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ReportJob
+from . import pdf, pdf_cache, reports
+
+# Request parameters each job kind accepts; anything else is dropped.
+JOB_PARAMS = {
+    'quotation_pdf': ('pk',),
+    'invoice_pdf': ('invoice_id',),
+    'report_pdf': reports.INVOICE_FILTER_PARAMS,
+    'report_xlsx': ('from_date', 'to_date'),
+}
+
+
+# ---------- Queue ----------
+def enqueue(kind, params, user=None):
+    if kind not in JOB_PARAMS:
+        raise ValueError(f"Unknown report job kind: {kind}")
+    clean = {key: params[key] for key in JOB_PARAMS[kind] if params.get(key)}
+    return ReportJob.objects.create(kind=kind, params=clean, created_by=user)
+
+
+def claim_jobs(limit):
+    """
+    Move up to `limit` pending jobs to Running and return their ids.
+
+    Each claim is a conditional UPDATE on status, so concurrent workers never
+    take the same job, on SQLite or Postgres, without row locks or a broker.
+    """
+    if limit <= 0:
+        return []
+
+    claimed = []
+    candidates = list(
+        ReportJob.objects.filter(status='Pending').order_by('id').values_list('id', flat=True)[:limit]
+    )
+    for job_id in candidates:
+        now = timezone.now()
+        won = ReportJob.objects.filter(pk=job_id, status='Pending').update(
+            status='Running',
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if won:
+            claimed.append(job_id)
+    return claimed
+
+
+def heartbeat(job_ids):
+    """Mark jobs as still being worked on, so long renders are not taken for dead ones."""
+    job_ids = list(job_ids)
+    if not job_ids:
+        return 0
+    return ReportJob.objects.filter(pk__in=job_ids, status='Running').update(heartbeat_at=timezone.now())
+
+
+def requeue_stale_jobs(minutes=None, max_attempts=None):
+    """
+    Hand Running jobs whose worker stopped heartbeating back to the queue.
+    Jobs already claimed `max_attempts` times are failed instead, so a job
+    that keeps killing its worker does not loop forever.
+    Returns (requeued, failed).
+    """
+    minutes = minutes or settings.REPORT_JOB_STALE_MINUTES
+    cutoff = timezone.now() - timedelta(minutes=minutes)
+    stale = ReportJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status='Running',
+    )
+    return _requeue(stale, max_attempts)
+
+
+def requeue_jobs(job_ids, max_attempts=None):
+    """
+    Hand `job_ids` back to the queue at once, for a worker whose process
+    pool broke under them. Same attempt limit as requeue_stale_jobs;
+    returns (requeued, failed).
+    """
+    return _requeue(ReportJob.objects.filter(pk__in=list(job_ids), status='Running'), max_attempts)
+
+
+def _requeue(running, max_attempts):
+    max_attempts = max_attempts or settings.REPORT_JOB_MAX_ATTEMPTS
+    failed = running.filter(attempts__gte=max_attempts).update(
+        status='Failed',
+        error=f"Worker stopped {max_attempts} times while running this job.",
+        finished_at=timezone.now(),
+    )
+    requeued = running.filter(attempts__lt=max_attempts).update(status='Pending')
+    return requeued, failed
+
+
+def mark_failed(job_id, error):
+    ReportJob.objects.filter(pk=job_id).update(
+        status='Failed', error=error, finished_at=timezone.now()
+    )
+
+
+# ---------- Execution ----------
+def init_worker_process():
+    """ProcessPoolExecutor initializer shared by the report worker and batch exports."""
+    # Under "spawn" the child starts cold; under "fork" setup() is a no-op.
+    import django
+    django.setup()
+    # Never share the parent's DB connections across processes.
+    connections.close_all()
+    pdf.preload_assets()
+
+
+def _quotation_pdf(params):
+    filename, pdf_bytes = pdf_cache.quotation_pdf(params['pk'])
+    return ContentFile(pdf_bytes), filename
+
+
+def _invoice_pdf(params):
+    filename, pdf_bytes = pdf_cache.invoice_pdf(params['invoice_id'])
+    return ContentFile(pdf_bytes), filename
+
+
+def _report_pdf(params):
+    return ContentFile(pdf.render_report_pdf(reports.filter_invoices(params))), pdf.REPORT_PDF_FILENAME
+
+
+def _report_xlsx(params):
+    rows = reports.report_queryset(params.get('from_date'), params.get('to_date'))
+    return File(reports.write_report_xlsx(rows)), "CRM_Complete_Report.xlsx"
+
+
+RENDERERS = {
+    'quotation_pdf': _quotation_pdf,
+    'invoice_pdf': _invoice_pdf,
+    'report_pdf': _report_pdf,
+    'report_xlsx': _report_xlsx,
+}
+
+
+def run_job(job_id):
+    """
+    Render one claimed job and store its file. Runs inside a worker process.
+
+    The job is finished with a conditional UPDATE on the claim (status and
+    attempt), like claim_jobs: if a stale sweep requeued or failed the job
+    meanwhile, or another worker holds it now, this run's outcome is dropped
+    and its file deleted. Returns 'Done', 'Failed' or 'Superseded'.
+    """
+    job = ReportJob.objects.get(pk=job_id)
+    claim = ReportJob.objects.filter(pk=job.pk, status='Running', attempts=job.attempts)
+    try:
+        content, filename = RENDERERS[job.kind](job.params)
+        with content:
+            job.result.save(f"{job.pk}_{filename}", content, save=False)
+    except Exception:
+        failed = claim.update(status='Failed', error=traceback.format_exc(), finished_at=timezone.now())
+        return 'Failed' if failed else 'Superseded'
+
+    finished = claim.update(
+        result=job.result.name,
+        filename=filename,
+        status='Done',
+        error='',
+        finished_at=timezone.now(),
+    )
+    if not finished:
+        job.result.delete(save=False)
+        return 'Superseded'
+    return 'Done'
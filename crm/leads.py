@@ -0,0 +1,47 @@
+from django.db.models import Case, CharField, F, OuterRef, Subquery, Value, When
+
+from .models import Estimation, Lead
+
+# Lead status follows the status of its latest estimation (highest id).
+# No estimation, or any other estimation status, means "Pending".
+ESTIMATION_TO_LEAD_STATUS = {
+    'Approved': 'Won',
+    'Invoiced': 'Won',
+    'Pending': 'Quoted',
+    'Lost': 'Lost',
+}
+
+
+def with_status(queryset):
+    """
+    Annotate leads with `latest_estimation_status` and the derived
+    `current_status`. One correlated subquery per returned row, so apply it
+    to a page, not the whole table, on read paths.
+    """
+    latest = Estimation.objects.filter(lead_no=OuterRef('pk')).order_by('-id').values('status')[:1]
+    by_lead_status = {}
+    for estimation_status, lead_status in ESTIMATION_TO_LEAD_STATUS.items():
+        by_lead_status.setdefault(lead_status, []).append(estimation_status)
+    return queryset.annotate(latest_estimation_status=Subquery(latest)).annotate(
+        current_status=Case(
+            *[
+                When(latest_estimation_status__in=statuses, then=Value(lead_status))
+                for lead_status, statuses in by_lead_status.items()
+            ],
+            default=Value('Pending'),
+            output_field=CharField(),
+        )
+    )
+
+
+def refresh_computed_status(lead_ids=None):
+    """
+    Bring the persisted Lead.computed_status in line with the estimations in
+    one UPDATE, touching only stale rows. Returns the number of leads changed.
+    """
+    leads = Lead.objects.all() if lead_ids is None else Lead.objects.filter(pk__in=lead_ids)
+    return (
+        with_status(leads)
+        .exclude(computed_status=F('current_status'))
+        .update(computed_status=F('current_status'))
+    )
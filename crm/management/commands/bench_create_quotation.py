@@ -0,0 +1,68 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from crm.models import Client, Estimation
+from crm.views import create_quotation
+
+
+def quotation_post(client, lines):
+    """POST data for a quotation with `lines` item rows, as the form submits it."""
+    return {
+        'company_name': client.pk,
+        'validity_days': '30',
+        'billing_address': 'Bench',
+        'shipping_address': 'Bench',
+        'sub_total': f"{100 * lines}",
+        'discount': '0',
+        'gst_amount': f"{18 * lines}",
+        'total': f"{118 * lines}",
+        'item_details[]': [f"Item {i}" for i in range(lines)],
+        'quantity[]': ['1'] * lines,
+        'rate[]': ['100.00'] * lines,
+        'tax[]': ['18'] * lines,
+        'amount[]': ['118.00'] * lines,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Time create_quotation for quotations with 10, 100 and 1000 lines (nothing is kept)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[10, 100, 1000],
+                            help='Line counts to benchmark')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Runs per line count; the median is reported')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        self.stdout.write(f"[RUNNING] create_quotation, {options['repeat']} runs per size on {connection.vendor}")
+
+        # Everything runs in one transaction that is rolled back at the end.
+        with transaction.atomic():
+            client = Client.objects.create(company_name="Benchmark client", type_of_company="Pvt")
+            for lines in options['lines']:
+                data = quotation_post(client, lines)
+                timings = []
+                for _ in range(options['repeat']):
+                    request = factory.post('/create-quotation/', data)
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        response = create_quotation(request)
+                        timings.append(time.perf_counter() - started)
+                    if response.status_code != 302:
+                        self.stderr.write(f"[FAILED] {lines} lines: view did not redirect")
+                        break
+
+                saved = Estimation.objects.filter(company_name=client).order_by('-id').first()
+                self.stdout.write(
+                    f"[DONE] {lines:>5} lines: median {statistics.median(timings) * 1000:8.1f} ms, "
+                    f"{len(queries)} queries, {saved.items.count() if saved else 0} items saved"
+                )
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark finished (all data rolled back)."))
@@ -0,0 +1,184 @@
+import json
+import platform
+import time
+import tracemalloc
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client as TestClient
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from crm.instrumentation import RequestStats
+from crm.models import Client, Estimation, EstimationItem, Invoice, Lead, PaymentLog
+
+COUNTED_MODELS = (Client, Lead, Estimation, EstimationItem, Invoice, PaymentLog)
+
+
+def hot_views():
+    """(name, url) for the pages people wait on, with parameters picked from the current data."""
+    today = timezone.localdate()
+    quarter = f"from_date={today - timedelta(days=90)}&to_date={today}"
+    estimation = Estimation.objects.order_by('-id').values_list('id', flat=True).first()
+    invoice = Invoice.objects.order_by('-id').values_list('id', flat=True).first()
+    client = Client.objects.order_by('id').values_list('id', 'company_name').first()
+    views = [
+        ('dashboard', reverse('dashboard')),
+        ('lead list', reverse('lead_list')),
+        ('client list', reverse('client')),
+        ('estimation list', reverse('estimation_list')),
+        ('invoice list', reverse('invoice_list')),
+        ('report list', reverse('report_list')),
+        ('report list, last 90 days', f"{reverse('report_list')}?{quarter}"),
+        ('export csv, last 90 days', f"{reverse('export_report_csv')}?{quarter}"),
+        ('export excel, last 90 days', f"{reverse('export_report_excel')}?{quarter}"),
+    ]
+    if client:
+        views += [
+            ('search', f"{reverse('global_search')}?q={client[1].split()[0]}"),
+            ('pending leads json', f"{reverse('get_pending_leads')}?client_id={client[0]}"),
+        ]
+    if estimation:
+        views.append(('quotation pdf', reverse('quotation_pdf', args=[estimation])))
+    if invoice:
+        views += [
+            ('invoice pdf', reverse('invoice_pdf', args=[invoice])),
+            ('invoice logs json', reverse('invoice_logs', args=[invoice])),
+        ]
+    return views
+
+
+def fetch(client, url):
+    """GET `url` and read the whole body, streamed or not. Returns (status, bytes)."""
+    response = client.get(url)
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    return response.status_code, size
+
+
+def measure(client, url, repeat):
+    """Timings, queries and peak traced memory for one URL. Queries are counted on the first (cold) run."""
+    # An execute_wrapper rather than CaptureQueriesContext: the test client
+    # sends request_started, which clears connection.queries.
+    stats = RequestStats(settings.REQUEST_REPEATED_QUERY_THRESHOLD)
+    with connection.execute_wrapper(stats):
+        started = time.perf_counter()
+        status, size = fetch(client, url)
+        first = time.perf_counter() - started
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fetch(client, url)
+        timings.append(time.perf_counter() - started)
+
+    # tracemalloc slows Python down several times, so it gets a run of its own.
+    tracemalloc.start()
+    try:
+        fetch(client, url)
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    ms = np.array(timings or [first]) * 1000
+    return {
+        'url': url,
+        'status': status,
+        'bytes': size,
+        'queries': stats.queries,
+        'repeated_queries': [[count, sql[:200], site] for count, sql, site in stats.repeated()],
+        'sql_ms': round(stats.sql_time * 1000, 2),
+        'first_ms': round(first * 1000, 2),
+        'p50_ms': round(float(np.percentile(ms, 50)), 2),
+        'p90_ms': round(float(np.percentile(ms, 90)), 2),
+        'p99_ms': round(float(np.percentile(ms, 99)), 2),
+        'mean_ms': round(float(ms.mean()), 2),
+        'min_ms': round(float(ms.min()), 2),
+        'max_ms': round(float(ms.max()), 2),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Time the hot views through the test client and write latency percentiles, queries and memory as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed runs per view after the first (cold) one')
+        parser.add_argument('--only', nargs='+', default=None,
+                            help='Benchmark only views whose name contains one of these words')
+        parser.add_argument('--output', default=None,
+                            help='Write the results to this JSON file')
+        parser.add_argument('--compare', default=None,
+                            help='Earlier JSON output to print p50 and query deltas against')
+
+    def handle(self, *args, **options):
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as fh:
+                    previous = json.load(fh)['views']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        results = {
+            'meta': {
+                'started_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'repeat': options['repeat'],
+                'rows': {model._meta.label: model.objects.count() for model in COUNTED_MODELS},
+            },
+            'views': {},
+        }
+        self.stdout.write(
+            f"[RUNNING] {options['repeat']} runs per view on {connection.vendor} "
+            f"({results['meta']['rows']['crm.Lead']} leads, {results['meta']['rows']['crm.Invoice']} invoices)"
+        )
+
+        # A throwaway superuser and any sessions or caches the views write
+        # are rolled back at the end.
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            user = get_user_model().objects.create_superuser('bench-views', 'bench@example.com', None)
+            client = TestClient()
+            client.force_login(user)
+            for name, url in hot_views():
+                if options['only'] and not any(word in name for word in options['only']):
+                    continue
+                try:
+                    # A savepoint per view: on PostgreSQL a database error
+                    # would otherwise abort the transaction for every later view.
+                    with transaction.atomic():
+                        row = measure(client, url, options['repeat'])
+                except Exception as e:  # one broken view should not lose the whole run
+                    results['views'][name] = {'url': url, 'error': f"{type(e).__name__}: {e}"}
+                    self.stderr.write(f"[FAILED] {name}: {type(e).__name__}: {e}")
+                    continue
+                results['views'][name] = row
+                self.stdout.write(
+                    f"[DONE] {name:<28} p50 {row['p50_ms']:8.1f} ms  p99 {row['p99_ms']:8.1f} ms  "
+                    f"{row['queries']:4d} queries  {row['peak_memory_kb']:9.0f} KiB  HTTP {row['status']}"
+                    + self.delta(previous, name, row)
+                )
+            transaction.set_rollback(True)
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(f"[SAVED] {options['output']}")
+        self.stdout.write(self.style.SUCCESS("✅ Benchmark finished (all data rolled back)."))
+
+    @staticmethod
+    def delta(previous, name, row):
+        before = (previous or {}).get(name)
+        if not before or 'p50_ms' not in before:
+            return ''
+        change = (row['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+        return f"  (p50 {change:+.0f}%, queries {row['queries'] - before['queries']:+d})"
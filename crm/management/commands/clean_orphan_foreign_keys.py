@@ -1,38 +1,38 @@
-﻿from django.core.management.base import BaseCommand
-from django.db import connection
+from django.core.management.base import BaseCommand
+
+from crm import orphans
+
 
 class Command(BaseCommand):
-    help = 'Clean orphan foreign keys from invoice, estimationitem, and paymentlog tables'
+    help = 'Delete (or null) rows whose foreign keys point at missing rows, across every crm model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count orphans per foreign key; do not write')
+        parser.add_argument('--chunk-size', type=int, default=orphans.ORPHAN_CHUNK_SIZE,
+                            help='Primary-key range scanned and fixed per transaction')
 
-    def handle(self, *args, **kwargs):
-        with connection.cursor() as cursor:
-            cleanup_queries = [
-                {
-                    "description": "Deleting invoice rows with missing estimation",
-                    "sql": """
-                        DELETE FROM crm_invoice
-                        WHERE estimation_id NOT IN (SELECT id FROM crm_estimation);
-                    """
-                },
-                {
-                    "description": "Deleting estimation items with missing estimation",
-                    "sql": """
-                        DELETE FROM crm_estimationitem
-                        WHERE estimation_id NOT IN (SELECT id FROM crm_estimation);
-                    """
-                },
-                {
-                    "description": "Deleting payment logs with missing invoice",
-                    "sql": """
-                        DELETE FROM crm_paymentlog
-                        WHERE invoice_id NOT IN (SELECT id FROM crm_invoice);
-                    """
-                }
-            ]
+    def handle(self, *args, **options):
+        checks = orphans.checks()
+        if options['dry_run']:
+            total = 0
+            for check in checks:
+                found = orphans.count(check)
+                total += found
+                if found:
+                    self.stdout.write(f"[ORPHANS] {check.label}: {found} (would {check.action})")
+            self.stdout.write(self.style.WARNING(
+                f"{total} orphan rows found (dry run, nothing written). "
+                "Rows that cascade from them are not counted."
+            ))
+            return
 
-            for item in cleanup_queries:
-                self.stdout.write(f"[RUNNING] {item['description']}")
-                cursor.execute(item["sql"])
-                self.stdout.write(self.style.SUCCESS("[DONE]"))
+        total = 0
+        for check in checks:
+            self.stdout.write(f"[RUNNING] {check.label}")
+            fixed = orphans.clean(check, options['chunk_size'])
+            total += fixed
+            verb = 'deleted' if check.action == 'delete' else 'nulled'
+            self.stdout.write(f"[DONE] {fixed} orphans {verb}")
 
-        self.stdout.write(self.style.SUCCESS("✅ All orphan foreign key records cleaned successfully."))
+        self.stdout.write(self.style.SUCCESS(f"✅ Orphan foreign keys cleaned ({total} rows fixed)."))
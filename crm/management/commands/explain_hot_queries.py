@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from crm.models import Estimation, Invoice, Lead, PaymentLog
+from crm.reports import filter_invoices, report_queryset
+
+# Indexes and constraints added for these queries (migration 0009), by model.
+HOT_INDEXES = {
+    Lead: ('crm_lead_date_idx', 'crm_lead_pending_idx'),
+    Estimation: ('crm_est_quote_date_idx', 'crm_est_follow_up_idx', 'crm_est_approved_idx'),
+    Invoice: ('crm_invoice_created_idx', 'crm_invoice_no_unique'),
+    PaymentLog: ('crm_paymentlog_inv_date_idx',),
+}
+
+
+def hot_queries():
+    """The list/report queries the indexes exist for, with realistic parameters."""
+    today = timezone.localdate()
+    month_ago = today - timedelta(days=30)
+    lead = Lead.objects.order_by('-id').values('company_name_id').first() or {'company_name_id': 0}
+    invoice = Invoice.objects.order_by('-id').values('id', 'invoice_no').first() or {'id': 0, 'invoice_no': ''}
+    return {
+        'estimation_list follow-up today': Estimation.objects.filter(follow_up_date=today).order_by('-id')[:15],
+        'invoice_approval_table': Estimation.objects.filter(status='Approved', invoice__isnull=True),
+        'report_list last 30 days': report_queryset(month_ago, today)[:20],
+        'get_pending_leads': Lead.objects.filter(company_name_id=lead['company_name_id'], status='Pending'),
+        'invoice report last 30 days': filter_invoices({'from_date': month_ago, 'to_date': today}),
+        'invoice list newest first': Invoice.objects.order_by('-created_at')[:20],
+        'invoice by number': Invoice.objects.filter(invoice_no=invoice['invoice_no']),
+        'invoice payment logs': PaymentLog.objects.filter(invoice_id=invoice['id']).order_by('-payment_date'),
+    }
+
+
+def _drop_hot_indexes(cursor):
+    """Drop the hot indexes with plain DDL; returns names that had to be kept."""
+    quote = connection.ops.quote_name
+    kept = []
+    for model, names in HOT_INDEXES.items():
+        indexes = {index.name for index in model._meta.indexes}
+        for name in names:
+            if name in indexes:
+                cursor.execute(f"DROP INDEX {quote(name)}")
+            elif connection.vendor == 'postgresql':
+                cursor.execute(f"ALTER TABLE {quote(model._meta.db_table)} DROP CONSTRAINT {quote(name)}")
+            else:
+                kept.append(name)  # SQLite builds unique constraints into the table
+    return kept
+
+
+class Command(BaseCommand):
+    help = 'Print EXPLAIN plans for the hot list/report queries, optionally compared with the lookup indexes dropped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--without-indexes', action='store_true',
+                            help='Also print the plans with the indexes dropped (in a rolled-back transaction)')
+        parser.add_argument('--force', action='store_true',
+                            help='Allow --without-indexes even though DEBUG is off')
+
+    def explain_all(self, label):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"===== {label} ====="))
+        for name, queryset in hot_queries().items():
+            self.stdout.write(f"[PLAN] {name}")
+            for line in queryset.explain().splitlines():
+                self.stdout.write(f"    {line}")
+
+    def handle(self, *args, **options):
+        if options['without_indexes']:
+            # The drops hold exclusive locks on the lead, estimation and invoice
+            # tables until the rollback, stalling every request that touches them.
+            if not settings.DEBUG and not options['force']:
+                raise CommandError("DEBUG is off, so this may be a live database: dropping the indexes "
+                                   "locks the hot tables for the whole run; pass --force to do it anyway.")
+            if not connection.features.can_rollback_ddl:
+                raise CommandError("Database cannot roll back DDL; run without --without-indexes")
+            # Drop the indexes inside a transaction that is always rolled back.
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    kept = _drop_hot_indexes(cursor)
+                self.explain_all("before (indexes dropped)")
+                if kept:
+                    self.stdout.write(f"[NOTE] kept in the 'before' plans: {', '.join(kept)}")
+                transaction.set_rollback(True)
+
+        self.explain_all("after (with indexes)")
+        self.stdout.write(self.style.SUCCESS("✅ Plans printed. Seed realistic volumes first; tiny tables favour full scans."))
@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from crm import batch
+
+
+class Command(BaseCommand):
+    help = 'Render matching invoice or quotation PDFs in parallel into one zip file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(batch.DOCUMENT_KINDS))
+        parser.add_argument('--from-date', help='YYYY-MM-DD')
+        parser.add_argument('--to-date', help='YYYY-MM-DD')
+        parser.add_argument('--company', help='Client id')
+        parser.add_argument('--lead-no', help='Lead id')
+        parser.add_argument('--output', '-o', help='Zip path (default: <kind>_pdfs.zip)')
+        parser.add_argument('--processes', type=int, default=settings.PDF_EXPORT_PROCESSES,
+                            help='Number of render processes (default: CPU count)')
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        params = {
+            'from_date': options['from_date'],
+            'to_date': options['to_date'],
+            'company': options['company'],
+            'lead_no': options['lead_no'],
+        }
+        output = options['output'] or f"{kind}_pdfs.zip"
+
+        ids = batch.document_ids(kind, params)
+        if not ids:
+            raise CommandError(f"No {kind}s match the given filters.")
+
+        self.stdout.write(f"[RUNNING] Rendering {len(ids)} {kind} PDFs with {options['processes']} processes")
+        started = time.monotonic()
+        with open(output, 'wb') as fh:
+            documents = batch.iter_rendered(kind, ids, processes=options['processes'])
+            for count in batch.write_zip(documents, fh):
+                if count % 50 == 0 or count == len(ids):
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(f"  {count}/{len(ids)} ({count / elapsed:.1f} PDFs/s)")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"✅ Wrote {len(ids)} PDFs to {output} in {elapsed:.1f}s"))
@@ -1,34 +1,44 @@
-﻿import os
+import sys
+
 from django.core.management.base import BaseCommand
-from django.conf import settings
-from crm.models import Estimation
+
+from crm import attachments
+
 
 class Command(BaseCommand):
-    help = "Fix broken PO attachments in Estimation table"
-
-    def handle(self, *args, **kwargs):
-        media_root = os.path.join(settings.MEDIA_ROOT, "po_attachments")
-
-        # Pick a fallback file (first valid one found)
-        fallback_file = None
-        for f in os.listdir(media_root):
-            if f.endswith(".pdf"):
-                fallback_file = f"po_attachments/{f}"
-                break
-
-        if not fallback_file:
-            self.stdout.write(self.style.ERROR("❌ No PDF found in po_attachments. Nothing to fix."))
-            return
-
-        fixed = 0
-        for e in Estimation.objects.exclude(po_attachment=""):
-            file_path = os.path.join(settings.MEDIA_ROOT, os.path.basename(e.po_attachment.name))
-            if not os.path.exists(file_path):
-                self.stdout.write(f"[MISSING] {e.id} → {e.po_attachment.name} → replaced with {fallback_file}")
-                e.po_attachment.name = fallback_file
-                e.save()
-                fixed += 1
-            else:
-                self.stdout.write(f"[OK] {e.id} → {e.po_attachment.name}")
-
-        self.stdout.write(self.style.SUCCESS(f"✅ Fixed {fixed} broken attachments"))
+    help = "Check Estimation PO attachments against MEDIA_ROOT and repoint the ones that moved"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report only; do not write')
+        parser.add_argument('--clear-missing', action='store_true',
+                            help='Clear references to files that exist nowhere under MEDIA_ROOT')
+        parser.add_argument('--hash', action='store_true',
+                            help='Read every referenced file to find corrupt PDFs and duplicate uploads')
+        parser.add_argument('--workers', type=int, default=attachments.HASH_WORKERS,
+                            help='Threads used by --hash')
+        parser.add_argument('--report', help="Write a CSV of every issue to this path ('-' for stdout)")
+
+    def handle(self, *args, **options):
+        self.stdout.write("[RUNNING] Scanning PO attachments...")
+        result = attachments.scan(
+            fix=not options['dry_run'],
+            clear_missing=options['clear_missing'],
+            hash_files=options['hash'],
+            workers=options['workers'],
+        )
+
+        for issue in result.issues[:20]:
+            self.stdout.write(f"[{issue.problem.upper()}] {issue.estimation_id or '-'} → {issue.stored} {issue.detail}".rstrip())
+        if options['report'] == '-':
+            attachments.write_report(result, sys.stdout)
+        elif options['report']:
+            with open(options['report'], 'w', newline='', encoding='utf-8') as fh:
+                attachments.write_report(result, fh)
+            self.stdout.write(f"[REPORT] {options['report']}")
+
+        counts = ", ".join(f"{count} {problem}" for problem, count in sorted(result.counts().items())) or "no issues"
+        self.stdout.write(f"[DONE] {result.scanned} attachments scanned: {counts}")
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Dry run, nothing written."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ Fixed {result.fixed} attachments"))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm import bank_import
+
+
+class Command(BaseCommand):
+    help = "Match a bank statement (CSV/XLSX) to open invoices by UTR, invoice number, amount and client, and post the payments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help='Path to the .csv or .xlsx statement')
+        parser.add_argument('--dry-run', action='store_true', help='Match and report without posting payments')
+        parser.add_argument('--report', help='Write a CSV of every credit line and its outcome here')
+        parser.add_argument('--batch-size', type=int, default=bank_import.IMPORT_BATCH_SIZE,
+                            help='Payments posted per transaction')
+
+    def handle(self, *args, **options):
+        path = options['statement']
+        self.stdout.write(f"[RUNNING] Importing {path}{' (dry run)' if options['dry_run'] else ''}...")
+        started = time.perf_counter()
+        try:
+            with open(path, 'rb') as fh:
+                result = bank_import.import_statement(fh, path, options['dry_run'], options['batch_size'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"[DONE] {len(result.matched)} matched, {result.posted} posted, "
+            f"{len(result.duplicates)} already recorded, {len(result.unmatched)} unmatched, "
+            f"{result.skipped} debit/blank lines skipped"
+        )
+        for item in result.unmatched[:20]:
+            self.stdout.write(f"[UNMATCHED] line {item.line.line}: {item.line.credit} {item.line.utr} - {item.reason}")
+
+        if options['report']:
+            with open(options['report'], 'w', newline='', encoding='utf-8') as out:
+                bank_import.write_report(result, out)
+            self.stdout.write(f"[DONE] Report written to {options['report']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Statement reconciled in {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm import crm_import
+
+
+class Command(BaseCommand):
+    help = "Bulk-import clients and leads from a CSV/XLSX export, deduplicating clients on GSTIN and name"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the .csv or .xlsx file')
+        parser.add_argument('--chunk-size', type=int, default=crm_import.IMPORT_CHUNK_SIZE,
+                            help='Rows per transaction')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        self.stdout.write(f"[RUNNING] Importing {path} in chunks of {options['chunk_size']}...")
+        started = time.perf_counter()
+
+        def progress(stats):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"[PROGRESS] {stats['rows']} rows, {stats['clients_created']} new clients, "
+                f"{stats['leads_created']} leads ({stats['rows'] / elapsed:,.0f} rows/s)"
+            )
+
+        try:
+            with open(path, 'rb') as fh:
+                result = crm_import.import_crm(fh, path, options['chunk_size'], progress)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for number, message in result.errors[:20]:
+            self.stdout.write(f"[WARNING] row {number}: {message}")
+        stats, elapsed = result.stats, time.perf_counter() - started
+        self.stdout.write(
+            f"[DONE] {stats['rows']} rows: {stats['clients_created']} clients created, "
+            f"{stats['clients_matched']} matched existing, {stats['leads_created']} leads, "
+            f"{stats['skipped']} skipped"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Import finished in {elapsed:.1f}s ({stats['rows'] / max(elapsed, 1e-9):,.0f} rows/s)."
+        ))
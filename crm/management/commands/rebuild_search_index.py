@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from crm import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for clients, leads, quotations and invoices"
+
+    def handle(self, *args, **options):
+        self.stdout.write("[RUNNING] Rebuilding search index...")
+        counts = search.rebuild()
+        for kind, count in counts.items():
+            self.stdout.write(f"[DONE] {kind}: {count} documents")
+        self.stdout.write(self.style.SUCCESS(f"✅ Search index rebuilt ({sum(counts.values())} documents)."))
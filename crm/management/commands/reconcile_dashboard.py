@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from crm import dashboard
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or backfill) the daily dashboard rollups from invoices, payments, leads and estimations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report cells that drifted; do not write')
+
+    def handle(self, *args, **options):
+        drift = dashboard.reconcile(dry_run=options['dry_run'])
+
+        for (metric, day), (stored, expected) in sorted(drift.items(), key=lambda d: (d[0][0], str(d[0][1]))):
+            self.stdout.write(f"[DRIFT] {metric} @ {day or 'all time'}: {stored} → {expected}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("✅ Dashboard snapshot is up to date."))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} cells drifted (dry run, nothing written)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt dashboard snapshot ({len(drift)} cells fixed)."))
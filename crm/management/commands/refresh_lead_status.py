@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from crm import leads
+
+
+class Command(BaseCommand):
+    help = "Recompute every Lead.computed_status from its latest estimation in one UPDATE"
+
+    def handle(self, *args, **options):
+        self.stdout.write("[RUNNING] Refreshing lead status...")
+        changed = leads.refresh_computed_status()
+        self.stdout.write(self.style.SUCCESS(f"✅ Lead status refreshed ({changed} leads changed)."))
@@ -0,0 +1,104 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from crm import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued PDF/Excel report jobs in a local process pool (no broker needed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.REPORT_WORKER_PROCESSES,
+                            help='Number of worker processes (default: CPU count)')
+        parser.add_argument('--poll', type=float, default=settings.REPORT_JOB_POLL_SECONDS,
+                            help='Seconds to wait between queue polls when idle')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is drained instead of polling forever')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        poll = options['poll']
+
+        self.requeue()
+        last_requeue = time.monotonic()
+
+        connections.close_all()
+        self.stdout.write(f"[STARTED] report worker with {processes} processes")
+
+        in_flight = {}
+        pool = self.start_pool(processes)
+        try:
+            while True:
+                jobs.heartbeat(in_flight.values())
+                # Jobs of workers that died since start-up, on this host or another.
+                if time.monotonic() - last_requeue > 60:
+                    self.requeue()
+                    last_requeue = time.monotonic()
+
+                for job_id in jobs.claim_jobs(processes - len(in_flight)):
+                    try:
+                        in_flight[pool.submit(jobs.run_job, job_id)] = job_id
+                    except BrokenProcessPool:
+                        pool = self.restart_pool(pool, processes, [job_id, *in_flight.values()])
+                        in_flight.clear()
+                        break
+                    self.stdout.write(f"[RUNNING] job {job_id}")
+
+                if not in_flight:
+                    if options['once']:
+                        break
+                    time.sleep(poll)
+                    continue
+
+                done, _ = wait(in_flight, timeout=poll, return_when=FIRST_COMPLETED)
+                lost = []  # jobs whose process died; the rest of in_flight went with the pool
+                for future in done:
+                    job_id = in_flight.pop(future)
+                    try:
+                        status = future.result()
+                    except BrokenProcessPool:
+                        lost.append(job_id)
+                        continue
+                    except Exception as exc:
+                        jobs.mark_failed(job_id, repr(exc))
+                        status = 'Failed'
+                    style = self.style.SUCCESS if status == 'Done' else self.style.ERROR
+                    self.stdout.write(style(f"[{status.upper()}] job {job_id}"))
+                if lost:
+                    pool = self.restart_pool(pool, processes, [*lost, *in_flight.values()])
+                    in_flight.clear()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping; interrupted jobs are requeued once they go stale.")
+        finally:
+            pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS("✅ Report worker stopped."))
+
+    @staticmethod
+    def start_pool(processes):
+        return ProcessPoolExecutor(max_workers=processes, initializer=jobs.init_worker_process)
+
+    def restart_pool(self, pool, processes, job_ids):
+        """
+        A child died (OOM, or a crash in WeasyPrint) and took the pool with it:
+        every job still in it is lost. Requeue them, failing any that have used
+        up their attempts, and carry on with a fresh pool.
+        """
+        pool.shutdown(wait=False, cancel_futures=True)
+        requeued, failed = jobs.requeue_jobs(job_ids)
+        self.stdout.write(self.style.ERROR(
+            f"[BROKEN] a worker process died; {requeued} jobs requeued, {failed} failed"
+        ))
+        return self.start_pool(processes)
+
+    def requeue(self):
+        requeued, failed = jobs.requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"[REQUEUED] {requeued} stale running jobs")
+        if failed:
+            self.stdout.write(self.style.ERROR(f"[FAILED] {failed} jobs that stopped their worker too often"))
@@ -0,0 +1,55 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from crm import search, seeding
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic client/lead/quotation/invoice/payment dataset for benchmarking"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', default='10k',
+                            help="Number of leads: 10k, 100k, 1M or a plain number (other tables scale with it)")
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Random seed; the same seed on an empty database gives the same data')
+        parser.add_argument('--skip-search', action='store_true',
+                            help='Do not index the new rows for search (run rebuild_search_index later)')
+        parser.add_argument('--force', action='store_true',
+                            help='Seed even though DEBUG is off')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError("DEBUG is off, so this may be a live database; pass --force to seed it anyway.")
+        try:
+            lead_count = seeding.leads_for(options['scale'])
+        except ValueError as e:
+            raise CommandError(f"Invalid --scale {options['scale']!r}: {e}")
+
+        self.stdout.write(f"[RUNNING] Seeding {lead_count:,} leads (seed {options['seed']})...")
+        started = last = time.perf_counter()
+
+        def progress(stats):
+            nonlocal last
+            now = time.perf_counter()
+            if now - last < 5:
+                return
+            last = now
+            self.stdout.write(
+                f"[PROGRESS] {stats['leads']:,} leads, {stats['estimations']:,} quotations, "
+                f"{stats['invoices']:,} invoices ({stats['leads'] / (now - started):,.0f} leads/s)"
+            )
+
+        stats = seeding.seed(lead_count, options['seed'], not options['skip_search'], progress)
+        elapsed = time.perf_counter() - started
+        rows = sum(stats.values())
+        self.stdout.write(
+            f"[DONE] {stats['clients']:,} clients, {stats['leads']:,} leads, {stats['estimations']:,} quotations, "
+            f"{stats['items']:,} items, {stats['invoices']:,} invoices, {stats['payments']:,} payments"
+        )
+        if options['skip_search']:
+            self.stdout.write(f"[NOTE] Search not indexed; run rebuild_search_index ({len(search.INDEXED)} kinds).")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Seeded {rows:,} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)."
+        ))
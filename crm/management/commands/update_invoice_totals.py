@@ -1,30 +1,38 @@
-from django.core.management.base import BaseCommand
-from crm.models import Invoice, EstimationItem
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
 
-class Command(BaseCommand):
-    help = 'Update total_value and balance_due for all invoices'
+from crm import invoices
 
-    def handle(self, *args, **kwargs):
-        for invoice in Invoice.objects.all():
-            est = invoice.estimation
-            items = EstimationItem.objects.filter(estimation=est)
 
-            if not items.exists():
-                self.stdout.write(f"{invoice.invoice_no} ➤ No items found. Skipping.")
-                continue
+class Command(BaseCommand):
+    help = 'Recompute total_value and balance_due of invoices from their estimation items'
 
-            total = 0
-            for item in items:
-                qty = item.quantity or 0
-                rate = float(item.rate or 0)
-                tax = float(item.tax or 0)
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report invoices whose totals would change; do not write')
+        parser.add_argument('--since', help='Only invoices created on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=invoices.TOTALS_CHUNK_SIZE,
+                            help='Invoices read and updated per transaction')
 
-                base = qty * rate
-                tax_amount = (base * tax) / 100
-                total += base + tax_amount
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid --since date: {options['since']!r}")
 
-            invoice.total_value = round(total, 2)
-            invoice.balance_due = round(total, 2)
-            invoice.save()
+        self.stdout.write("[RUNNING] Recomputing invoice totals...")
+        scanned = skipped = changed = 0
+        for chunk in invoices.recompute_totals(since, options['dry_run'], options['chunk_size']):
+            scanned, skipped, changed = scanned + chunk.scanned, skipped + chunk.skipped, changed + len(chunk.changes)
+            for change in chunk.changes:
+                self.stdout.write(
+                    f"{change.invoice_no} ➤ ₹{change.old_total} → ₹{change.new_total} "
+                    f"(balance ₹{change.old_balance} → ₹{change.new_balance})"
+                )
 
-            self.stdout.write(self.style.SUCCESS(f"{invoice.invoice_no} ➤ ₹{invoice.total_value} updated"))
+        self.stdout.write(f"[DONE] {scanned} invoices scanned, {changed} changed, {skipped} without items skipped")
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{changed} invoices would change (dry run, nothing written)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ Invoice totals updated ({changed} invoices changed)."))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:23
+
+from django.db import migrations, models
+
+
+def backfill_snapshot(apps, schema_editor):
+    # All-time cells from the existing fact tables, so the dashboard is right
+    # straight after deploy; 0006 moves to daily buckets and fills those.
+    from crm import dashboard
+    DashboardSnapshot = apps.get_model('crm', 'DashboardSnapshot')
+    DashboardSnapshot.objects.bulk_create(
+        [DashboardSnapshot(metric=metric, value=value)
+         for (metric, day), value in dashboard.compute_snapshot(apps).items() if day is None and value],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_reportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=60)),
+                ('month', models.DateField(blank=True, null=True)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('metric', 'month'), name='crm_dashboard_metric_month'), models.UniqueConstraint(condition=models.Q(('month__isnull', True)), fields=('metric',), name='crm_dashboard_metric_alltime')],
+            },
+        ),
+        migrations.RunPython(backfill_snapshot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+
+def rebuild_daily_buckets(apps, schema_editor):
+    # Month buckets can't be split into days, so every cell is rebuilt from
+    # the fact tables: the month rows go and the daily rollups come in.
+    from crm import dashboard
+    dashboard.reconcile(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_dashboardsnapshot'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='dashboardsnapshot',
+            name='crm_dashboard_metric_month',
+        ),
+        migrations.RemoveConstraint(
+            model_name='dashboardsnapshot',
+            name='crm_dashboard_metric_alltime',
+        ),
+        migrations.RenameField(
+            model_name='dashboardsnapshot',
+            old_name='month',
+            new_name='day',
+        ),
+        migrations.RunPython(rebuild_daily_buckets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dashboardsnapshot',
+            constraint=models.UniqueConstraint(fields=('metric', 'day'), name='crm_dashboard_metric_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='dashboardsnapshot',
+            constraint=models.UniqueConstraint(condition=models.Q(('day__isnull', True)), fields=('metric',), name='crm_dashboard_metric_alltime'),
+        ),
+        migrations.AddIndex(
+            model_name='dashboardsnapshot',
+            index=models.Index(fields=['day', 'metric'], name='crm_dashboard_day_idx'),
+        ),
+    ]
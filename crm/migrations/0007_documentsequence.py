@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_dashboard_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('period', models.CharField(blank=True, default='', max_length=8)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'period'), name='crm_docseq_kind_period')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_documentsequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estimation',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:37
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_invoice_numbers(apps, schema_editor):
+    # Renumbering issued invoices is a business decision, so stop with a
+    # readable list instead of failing on the unique index.
+    Invoice = apps.get_model('crm', 'Invoice')
+    duplicates = list(
+        Invoice.objects.values('invoice_no').annotate(n=Count('id')).filter(n__gt=1)
+        .values_list('invoice_no', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Duplicate invoice numbers must be resolved before invoice_no can be made unique: "
+            + ", ".join(duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0008_estimation_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='estimation',
+            index=models.Index(fields=['quote_date', 'id'], name='crm_est_quote_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estimation',
+            index=models.Index(condition=models.Q(('follow_up_date__isnull', False)), fields=['follow_up_date', 'id'], name='crm_est_follow_up_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estimation',
+            index=models.Index(condition=models.Q(('status', 'Approved')), fields=['id'], name='crm_est_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['created_at'], name='crm_invoice_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['date', 'id'], name='crm_lead_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(condition=models.Q(('status', 'Pending')), fields=['company_name', 'id'], name='crm_lead_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentlog',
+            index=models.Index(fields=['invoice', 'payment_date'], name='crm_paymentlog_inv_date_idx'),
+        ),
+        migrations.RunPython(check_duplicate_invoice_numbers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(fields=('invoice_no',), name='crm_invoice_no_unique'),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:39
+
+from django.db import migrations, models
+
+# The full-text index lives outside the Django model so each backend can use
+# its native machinery. NOTE for SQLite: a later migration that rebuilds
+# crm_searchdocument (AlterField etc.) drops these triggers; re-create them
+# and run `manage.py rebuild_search_index`.
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE crm_search_fts USING fts5(
+        title, body,
+        content='crm_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER crm_search_ai AFTER INSERT ON crm_searchdocument BEGIN
+        INSERT INTO crm_search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER crm_search_ad AFTER DELETE ON crm_searchdocument BEGIN
+        INSERT INTO crm_search_fts(crm_search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER crm_search_au AFTER UPDATE ON crm_searchdocument BEGIN
+        INSERT INTO crm_search_fts(crm_search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO crm_search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS crm_search_au",
+    "DROP TRIGGER IF EXISTS crm_search_ad",
+    "DROP TRIGGER IF EXISTS crm_search_ai",
+    "DROP TABLE IF EXISTS crm_search_fts",
+]
+
+POSTGRES_FORWARD = [
+    """ALTER TABLE crm_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(body, '')), 'B')
+    ) STORED""",
+    "CREATE INDEX crm_search_vector_gin ON crm_searchdocument USING gin (search_vector)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS crm_search_vector_gin",
+    "ALTER TABLE crm_searchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for sql in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+def populate_index(apps, schema_editor):
+    # Index the existing rows so list search keeps working straight after
+    # deploy; the triggers (SQLite) or generated column (Postgres) above
+    # fill the full-text side as the documents are inserted.
+    from crm import search
+    search.rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0009_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('url', models.CharField(blank=True, max_length=200)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='crm_search_kind_object')],
+            },
+        ),
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+        migrations.RunPython(populate_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:47
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def backfill_paid_amount(apps, schema_editor):
+    # balance_due has been the running total so far; paid is what it is short of the total.
+    Invoice = apps.get_model('crm', 'Invoice')
+    Invoice.objects.filter(total_value__gt=F('balance_due')).update(
+        paid_amount=F('total_value') - F('balance_due')
+    )
+
+
+def check_duplicate_utrs(apps, schema_editor):
+    # Two logs with one bank reference are either a double entry or a typo;
+    # someone has to look at them before UTRs can be unique.
+    PaymentLog = apps.get_model('crm', 'PaymentLog')
+    duplicates = list(
+        PaymentLog.objects.exclude(utr_number='').values('utr_number').annotate(n=Count('id'))
+        .filter(n__gt=1).values_list('utr_number', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Duplicate UTR numbers in payment logs must be resolved before they can be made unique: "
+            + ", ".join(duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0010_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='paid_amount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.RunPython(backfill_paid_amount, migrations.RunPython.noop),
+        migrations.RunPython(check_duplicate_utrs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='paymentlog',
+            constraint=models.UniqueConstraint(condition=models.Q(('utr_number', ''), _negated=True), fields=('utr_number',), name='crm_paymentlog_utr_unique'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-18 04:45
+
+from django.db import migrations, models
+
+
+def keep_running_series(apps, schema_editor):
+    # The quotation number generator before 0007 ignored frequency and issued
+    # PREFIX-NNNN from next_number; keep that series for existing settings.
+    EstimationSettings = apps.get_model('crm', 'EstimationSettings')
+    EstimationSettings.objects.update(frequency='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0012_reportjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='estimationsettings',
+            name='frequency',
+            field=models.CharField(blank=True, choices=[('', 'Never'), ('daily', 'Daily'), ('monthly', 'Monthly'), ('yearly', 'Yearly')], default='', max_length=10),
+        ),
+        migrations.RunPython(keep_running_series, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 04:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0013_quotation_numbering_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='permissions_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -10,6 +10,8 @@ class User(AbstractUser):
     ]
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='User')
     mobile = models.CharField(max_length=15, blank=True, null=True)
+    # Bumped whenever the user's effective permissions change; keys the cached set.
+    permissions_version = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.username
@@ -24,11 +26,7 @@ class UserPermission(models.Model):
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-<<<<<<< HEAD
     mobile = models.CharField(max_length=15, blank=True, null=True)
-=======
-    mobile = models.CharField("0")
->>>>>>> 9a85476b80137d17312bc3d00a29ba847fb293b4
 
 
 # --------- User Profile Model ----------
@@ -66,16 +64,8 @@ from django.db import models
 from .models import Client  # If in same file, you can skip this
 
 def generate_lead_no():
-    last_lead = Lead.objects.order_by('id').last()
-    if last_lead and last_lead.lead_no:
-        try:
-            number = int(last_lead.lead_no.split('-')[-1])
-        except ValueError:
-            number = last_lead.id
-        number += 1
-    else:
-        number = 1
-    return f"#{number:04d}"
+    from .sequences import next_number
+    return next_number('lead')
 
 
 class Lead(models.Model):
@@ -98,6 +88,15 @@ class Lead(models.Model):
     ]
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
 
+    class Meta:
+        indexes = [
+            # Report date ranges, newest first (report_queryset orders by -date, -id)
+            models.Index(fields=['date', 'id'], name='crm_lead_date_idx'),
+            # Pending leads per client (get_pending_leads, quotation form)
+            models.Index(fields=['company_name', 'id'], condition=models.Q(status='Pending'),
+                         name='crm_lead_pending_idx'),
+        ]
+
     def __str__(self):
         return f"{self.lead_no} - {self.company_name}"
 
@@ -150,17 +149,34 @@ class Estimation(models.Model):
     po_number = models.CharField(max_length=100, blank=True, null=True)
     po_date = models.DateField(blank=True, null=True)
     po_received_date = models.DateField(blank=True, null=True)
-<<<<<<< HEAD
     po_attachment = models.FileField(upload_to="po_attachments/", blank=True, null=True)
-=======
-    po_attachment = models.FileField(upload_to='po_attachments/', blank=True, null=True)
->>>>>>> 9a85476b80137d17312bc3d00a29ba847fb293b4
     remarks = models.TextField(blank=True, null=True)
     follow_up_date = models.DateField(null=True, blank=True)
     follow_up_remarks = models.TextField(null=True, blank=True)
 
     status = models.CharField(max_length=20, default='Pending')
     lost_reason = models.TextField(blank=True, null=True)
+    # Bumped on every edit; a form posted with an older version is rejected.
+    version = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            # Date-range filters (report exports, bulk PDF export)
+            models.Index(fields=['quote_date', 'id'], name='crm_est_quote_date_idx'),
+            # "Follow up today" list; most rows have no follow-up date
+            models.Index(fields=['follow_up_date', 'id'], condition=models.Q(follow_up_date__isnull=False),
+                         name='crm_est_follow_up_idx'),
+            # Approved quotations waiting for an invoice (invoice approval table)
+            models.Index(fields=['id'], condition=models.Q(status='Approved'),
+                         name='crm_est_approved_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The lead as loaded; crm.signals refreshes it too if a save moves the quotation.
+        instance._loaded_lead_id = instance.__dict__.get('lead_no_id', models.DEFERRED)
+        return instance
 
     def amount_in_words(self):
         return num2words(self.total, to='currency', lang='en_IN').title() + ' Only'
@@ -196,24 +212,17 @@ class Invoice(models.Model):
     is_approved = models.BooleanField(default=False)
     total_value = models.DecimalField(max_digits=12, decimal_places=2)
     balance_due = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    paid_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
     due_date = models.DateField(null=True, blank=True)
 
-@property
-def due_date(self):
-    return self.created_at + timedelta(days=30)
-
-@property
-def balance(self):
-    return self.total_amount - self.paid_amount
-
-
-
-
-    # 🆕 New Field
-    paid_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
-    payment_date = models.DateField(null=True, blank=True)
-    utr_number = models.CharField(max_length=100, blank=True, null=True)
-
+    class Meta:
+        indexes = [
+            # Invoice lists (newest first) and report date ranges
+            models.Index(fields=['created_at'], name='crm_invoice_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['invoice_no'], name='crm_invoice_no_unique'),
+        ]
 
     def __str__(self):
         return self.invoice_no
@@ -253,15 +262,35 @@ class QuotationItem(models.Model):
 class EstimationSettings(models.Model):
     prefix = models.CharField(max_length=10, default='EST')
     next_number = models.PositiveIntegerField(default=1)
+    # How often quotation numbers restart at 1. Blank keeps one running
+    # series, PREFIX-0001, with next_number as its floor.
     frequency = models.CharField(
         max_length=10,
-        choices=[('daily', 'Daily'), ('monthly', 'Monthly'), ('yearly', 'Yearly')],
-        default='monthly'
+        choices=[('', 'Never'), ('daily', 'Daily'), ('monthly', 'Monthly'), ('yearly', 'Yearly')],
+        default='',
+        blank=True,
     )
 
     def __str__(self):
         return f"{self.prefix} Settings"
 
+class DocumentSequence(models.Model):
+    """
+    Next number to hand out per document kind and numbering period
+    ('' when the numbering never resets). Allocated by crm/sequences.py.
+    """
+    kind = models.CharField(max_length=20)
+    period = models.CharField(max_length=8, blank=True, default='')
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'period'], name='crm_docseq_kind_period'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.period or '-'}: {self.next_value}"
+
 class GSTSettings(models.Model):
     percentage = models.DecimalField(max_digits=5, decimal_places=2, default=18.00)
 
@@ -313,6 +342,17 @@ class PaymentLog(models.Model):
     )
     remarks = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Payment history per invoice, latest first (invoice_logs_api)
+            models.Index(fields=['invoice', 'payment_date'], name='crm_paymentlog_inv_date_idx'),
+        ]
+        constraints = [
+            # A bank reference is recorded once; replays of the same UTR are no-ops.
+            models.UniqueConstraint(fields=['utr_number'], condition=~models.Q(utr_number=''),
+                                    name='crm_paymentlog_utr_unique'),
+        ]
+
     def __str__(self):
         return f"{self.invoice.invoice_no} - ₹{self.amount_paid}"
 
@@ -338,13 +378,90 @@ class Report(models.Model):
         return self.title
 
 
+# ---------- Background Report Jobs ----------
+class ReportJob(models.Model):
+    KIND_CHOICES = [
+        ('quotation_pdf', 'Quotation PDF'),
+        ('invoice_pdf', 'Invoice PDF'),
+        ('report_pdf', 'Report PDF'),
+        ('report_xlsx', 'Report Excel'),
+    ]
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Running', 'Running'),
+        ('Done', 'Done'),
+        ('Failed', 'Failed'),
+    ]
 
- 
-
-
-
-
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    result = models.FileField(upload_to='report_jobs/', blank=True, null=True)
+    filename = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the worker while the job runs; a Running job whose
+    # heartbeat stops belongs to a dead worker.
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='crm_reportjob_queue_idx'),
+        ]
 
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.status})"
+
+
+# ---------- Dashboard Snapshot ----------
+class DashboardSnapshot(models.Model):
+    """
+    Pre-aggregated dashboard figures, kept current by signals in crm.signals
+    and rebuilt/backfilled by `manage.py reconcile_dashboard`. One row per
+    metric per day that has activity, plus an all-time row (day is NULL).
+    """
+    metric = models.CharField(max_length=60)
+    day = models.DateField(null=True, blank=True)
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'day'], name='crm_dashboard_metric_day'),
+            models.UniqueConstraint(
+                fields=['metric'], condition=models.Q(day__isnull=True),
+                name='crm_dashboard_metric_alltime',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'metric'], name='crm_dashboard_day_idx'),
+        ]
 
+    def __str__(self):
+        return f"{self.metric} @ {self.day or 'all time'} = {self.value}"
+
+
+# ---------- Search ----------
+class SearchDocument(models.Model):
+    """
+    Searchable text for one client, lead, estimation or invoice, written by
+    crm.search through signals. The full-text index over title/body is kept
+    by the database itself: FTS5 triggers on SQLite, a generated tsvector
+    column with a GIN index on Postgres (see migration 0010).
+    """
+    kind = models.CharField(max_length=20)
+    object_id = models.PositiveBigIntegerField()
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    url = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='crm_search_kind_object'),
+        ]
 
+    def __str__(self):
+        return f"{self.kind} #{self.object_id}: {self.title}"
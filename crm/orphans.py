@@ -0,0 +1,81 @@
+from typing import NamedTuple
+
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models import Exists, Max, Min, OuterRef
+
+ORPHAN_CHUNK_SIZE = 5000
+
+
+class OrphanCheck(NamedTuple):
+    model: type
+    field: models.ForeignKey
+    action: str  # 'delete' or 'null'
+
+    @property
+    def label(self):
+        return f"{self.model._meta.label}.{self.field.name} → {self.field.related_model._meta.label}"
+
+    def orphans(self):
+        """Rows whose reference points at a missing row, as a NOT EXISTS anti-join."""
+        parent = self.field.related_model._base_manager.filter(
+            **{self.field.target_field.attname: OuterRef(self.field.attname)}
+        )
+        return self.model._base_manager.filter(**{f"{self.field.attname}__isnull": False}).filter(~Exists(parent))
+
+
+def _depth(model, seen=()):
+    """How many crm FK hops `model` is from a table with no crm parents."""
+    parents = [field.related_model for field in model._meta.concrete_fields
+               if field.is_relation and field.related_model._meta.app_label == 'crm'
+               and field.related_model is not model and field.related_model not in seen]
+    return 1 + max((_depth(parent, seen + (model,)) for parent in parents), default=-1)
+
+
+def checks():
+    """
+    One check per foreign key on a crm model (auto-created M2M tables
+    included), parents before children so rows orphaned by an earlier
+    delete are gone before their own table is scanned. Orphans are
+    deleted when the FK cascades or is required, and nulled otherwise,
+    mirroring what the ORM would have done when the parent was deleted.
+    """
+    found = []
+    for model in apps.get_app_config('crm').get_models(include_auto_created=True):
+        for field in model._meta.concrete_fields:
+            if not field.many_to_one and not field.one_to_one:
+                continue
+            if field.remote_field.parent_link:
+                continue
+            cascades = field.remote_field.on_delete is models.CASCADE
+            found.append(OrphanCheck(model, field, 'delete' if cascades or not field.null else 'null'))
+    return sorted(found, key=lambda check: (_depth(check.model), check.label))
+
+
+def count(check):
+    return check.orphans().count()
+
+
+def clean(check, chunk_size=ORPHAN_CHUNK_SIZE):
+    """
+    Fix the orphans of one check, walking the table in primary-key ranges
+    with a transaction per range, so no lock is held for more than one
+    chunk. Deletes go through the ORM, so cascades, the dashboard rollup
+    and the search index follow. Returns the number of orphans fixed.
+    """
+    bounds = check.model._base_manager.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return 0
+    fixed = 0
+    for start in range(bounds['low'], bounds['high'] + 1, chunk_size):
+        with transaction.atomic():
+            ids = list(check.orphans().filter(pk__gte=start, pk__lt=start + chunk_size).values_list('pk', flat=True))
+            if not ids:
+                continue
+            rows = check.model._base_manager.filter(pk__in=ids)
+            if check.action == 'null':
+                rows.update(**{check.field.name: None})
+            else:
+                rows.delete()
+            fixed += len(ids)
+    return fixed
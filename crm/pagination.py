@@ -0,0 +1,167 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+
+# Cursor direction: rows after the key ('n'ext) or before it ('p'revious).
+NEXT, PREVIOUS = 'n', 'p'
+
+
+def _encode(direction, key=None):
+    payload = {'d': direction}
+    if key is not None:
+        payload['k'] = [value if isinstance(value, int) else str(value) for value in key]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode(cursor):
+    """(direction, raw key list or None); raises ValueError on anything malformed."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        direction, key = payload['d'], payload.get('k')
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, TypeError, KeyError):
+        raise ValueError("Malformed cursor")
+    if direction not in (NEXT, PREVIOUS) or not (key is None or isinstance(key, list)):
+        raise ValueError("Malformed cursor")
+    return direction, key
+
+
+def estimate_count(queryset):
+    """
+    Planner row estimate on Postgres (no scan). Other backends have no
+    cheap estimate, and a COUNT(*) per page is what keyset pagination is
+    meant to avoid, so they get None and the list shows no total.
+    Estimates on filtered lists can be off; show them as "about N".
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, has_next, has_previous, count=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return _encode(NEXT, self.paginator.key_of(self.object_list[-1]))
+        return ''
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return _encode(PREVIOUS, self.paginator.key_of(self.object_list[0]))
+        return ''
+
+    @property
+    def last_cursor(self):
+        return _encode(PREVIOUS)
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a unique ordering such as ('-id',) or
+    ('-quote_date', '-id'). Each page is one indexed range scan of
+    per_page + 1 rows, so deep pages cost the same as the first; there is
+    no OFFSET and, unless `count` asks for one, no COUNT(*).
+
+    count: None (no total), 'exact' or 'estimate' (see estimate_count;
+    None on backends without a planner estimate).
+    """
+
+    def __init__(self, queryset, ordering=('-id',), per_page=10, count=None):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.count_mode = count
+        self.fields = [queryset.model._meta.get_field(name.lstrip('-')) for name in self.ordering]
+
+    def key_of(self, obj):
+        return tuple(getattr(obj, field.attname) for field in self.fields)
+
+    def _parse_key(self, raw):
+        if len(raw) != len(self.fields):
+            raise ValueError("Cursor does not match this list")
+        try:
+            return [field.to_python(value) for field, value in zip(self.fields, raw)]
+        except ValidationError:
+            raise ValueError("Malformed cursor")
+
+    def _after(self, key, reverse):
+        """Q for rows strictly after `key` in the ordering (before it if reverse)."""
+        condition = Q()
+        for position in reversed(range(len(self.fields))):
+            name = self.ordering[position]
+            descending = name.startswith('-') != reverse
+            lookup = f"{name.lstrip('-')}__{'lt' if descending else 'gt'}"
+            ties = {self.fields[i].attname: key[i] for i in range(position)}
+            condition |= Q(**ties, **{lookup: key[position]})
+        return condition
+
+    def get_page(self, cursor=None):
+        """Page for an opaque cursor token; empty or invalid tokens give the first page."""
+        direction, key = NEXT, None
+        if cursor:
+            try:
+                direction, raw = _decode(cursor)
+                key = self._parse_key(raw) if raw is not None else None
+            except ValueError:
+                direction, key = NEXT, None
+
+        reverse = direction == PREVIOUS
+        ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering] \
+            if reverse else list(self.ordering)
+        rows = self.queryset.order_by(*ordering)
+        if key is not None:
+            rows = rows.filter(self._after(key, reverse))
+        rows = list(rows[:self.per_page + 1])
+
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = key is not None, more
+        else:
+            has_next, has_previous = more, key is not None
+
+        return KeysetPage(rows, self, has_next, has_previous, count=self._count())
+
+    def _count(self):
+        if self.count_mode == 'exact':
+            return self.queryset.count()
+        if self.count_mode == 'estimate':
+            return estimate_count(self.queryset)
+        return None
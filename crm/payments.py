@@ -0,0 +1,175 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import dashboard
+from .models import Invoice, PaymentLog
+from .utils import update_rows
+
+
+class PaymentError(ValueError):
+    pass
+
+
+class PaymentEntry(NamedTuple):
+    invoice_id: int
+    amount: Decimal
+    utr_number: str
+    payment_date: object
+    remarks: str = None
+
+
+class Payment(NamedTuple):
+    log: PaymentLog
+    invoice: Invoice
+    created: bool  # False when the UTR had already been recorded
+
+
+def _amount(value):
+    try:
+        amount = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        raise PaymentError(f"Invalid amount: {value!r}")
+    if not amount.is_finite() or amount <= 0:
+        raise PaymentError("Amount paid must be greater than zero.")
+    return amount.quantize(Decimal("0.01"))
+
+
+def _payment_date(value):
+    if not value:
+        return timezone.localdate()
+    if hasattr(value, 'isoformat'):
+        return value
+    parsed = parse_date(str(value))
+    if parsed is None:
+        raise PaymentError(f"Invalid payment date: {value!r}")
+    return parsed
+
+
+def record_payment(invoice_id, amount, utr_number, payment_date=None, remarks=None):
+    """
+    Record a payment against an invoice and move its paid_amount,
+    balance_due and status, all in one transaction. The invoice row is
+    locked for the update, so concurrent payments queue up instead of
+    overwriting each other's balance.
+
+    Idempotent by UTR: posting the same bank reference again returns the
+    existing log (created=False) and changes nothing; reusing it on a
+    different invoice raises PaymentError.
+    """
+    amount = _amount(amount)
+    payment_date = _payment_date(payment_date)
+    utr = (utr_number or '').strip()
+    if not utr:
+        raise PaymentError("UTR number is required.")
+
+    try:
+        with transaction.atomic():
+            # Insert first: it takes the write lock on SQLite, and a replayed
+            # UTR trips the unique index before anything else has changed.
+            log = PaymentLog.objects.create(
+                invoice_id=invoice_id,
+                amount_paid=amount,
+                utr_number=utr,
+                payment_date=payment_date,
+                status='Partial Paid',
+                remarks=remarks,
+            )
+            invoice = Invoice.objects.select_for_update().get(pk=invoice_id)
+            invoice.paid_amount += amount
+            invoice.balance_due = max(invoice.balance_due - amount, Decimal("0.00"))
+            invoice.status = 'Paid' if invoice.balance_due == 0 else 'Partial Paid'
+            invoice.save(update_fields=['paid_amount', 'balance_due', 'status'])
+
+            if invoice.status == 'Paid':
+                log.status = 'Paid'  # the payment that settles the invoice
+                log.save(update_fields=['status'])
+    except IntegrityError:
+        existing = PaymentLog.objects.select_related('invoice').filter(utr_number=utr).first()
+        if existing is None:
+            raise
+        if existing.invoice_id != int(invoice_id):
+            raise PaymentError(
+                f"UTR {utr} is already recorded against invoice {existing.invoice.invoice_no}."
+            )
+        return Payment(existing, existing.invoice, created=False)
+
+    return Payment(log, invoice, created=True)
+
+
+# ---------- Batches ----------
+def _sum_into(totals, cells):
+    for key, amount in cells.items():
+        totals[key] += amount
+
+
+def record_payments(entries):
+    """
+    Post many payments in one transaction without a query per payment:
+    the touched invoices are locked and read once, logs are bulk-inserted,
+    invoices bulk-updated, and the dashboard rollup gets one combined delta
+    (bulk writes bypass the model signals). Entries whose UTR is already
+    recorded are skipped. Returns the created PaymentLogs.
+
+    If the batch collides with a concurrent insert it is posted line by
+    line through record_payment instead, which is idempotent.
+    """
+    entries = [entry._replace(amount=_amount(entry.amount), payment_date=_payment_date(entry.payment_date),
+                              utr_number=(entry.utr_number or '').strip())
+               for entry in entries]
+    if any(not entry.utr_number for entry in entries):
+        raise PaymentError("UTR number is required.")
+    try:
+        return _record_batch(entries)
+    except IntegrityError:
+        posted = [record_payment(*entry) for entry in entries]
+        return [payment.log for payment in posted if payment.created]
+
+
+def _record_batch(entries):
+    with transaction.atomic():
+        invoices = Invoice.objects.select_for_update().in_bulk({entry.invoice_id for entry in entries})
+        recorded = set(
+            PaymentLog.objects.filter(utr_number__in={entry.utr_number for entry in entries})
+            .values_list('utr_number', flat=True)
+        )
+        old, new = defaultdict(Decimal), defaultdict(Decimal)
+        for invoice in invoices.values():
+            _sum_into(old, dashboard.contribution(invoice))
+
+        logs = []
+        for entry in entries:
+            invoice = invoices.get(entry.invoice_id)
+            if invoice is None:
+                raise PaymentError(f"Invoice {entry.invoice_id} does not exist.")
+            if entry.utr_number in recorded:
+                continue
+            recorded.add(entry.utr_number)
+            invoice.paid_amount += entry.amount
+            invoice.balance_due = max(invoice.balance_due - entry.amount, Decimal("0.00"))
+            invoice.status = 'Paid' if invoice.balance_due == 0 else 'Partial Paid'
+            logs.append(PaymentLog(
+                invoice=invoice,
+                amount_paid=entry.amount,
+                utr_number=entry.utr_number,
+                payment_date=entry.payment_date,
+                status=invoice.status,  # same rule as record_payment
+                remarks=entry.remarks,
+            ))
+
+        PaymentLog.objects.bulk_create(logs, batch_size=500)
+        update_rows(Invoice, ('paid_amount', 'balance_due', 'status'), [
+            (invoice.paid_amount, invoice.balance_due, invoice.status, invoice.pk)
+            for invoice in (invoices[pk] for pk in {log.invoice_id for log in logs})
+        ])
+
+        for invoice in invoices.values():
+            _sum_into(new, dashboard.contribution(invoice))
+        for log in logs:
+            _sum_into(new, dashboard.contribution(log))
+        dashboard.apply_change(old, new)
+    return logs
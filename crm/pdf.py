@@ -0,0 +1,241 @@
+import mimetypes
+import os
+from datetime import timedelta
+from functools import lru_cache
+from urllib.parse import urlsplit, unquote
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.template.loader import render_to_string
+from django.utils._os import safe_join
+from num2words import num2words
+from weasyprint import HTML, default_url_fetcher
+from weasyprint.text.fonts import FontConfiguration
+
+from .models import EstimationItem, DefaultTerms
+from .utils import inr_currency_words
+
+OUR_GST_STATE_CODE = "29"  # Karnataka
+
+QUOTATION_TEMPLATE = 'quotation_pdf_template.html'
+INVOICE_TEMPLATE = 'invoice_pdf_weasy.html'
+
+
+# Static files every PDF uses; read once per process and kept in memory.
+PRELOAD_STATIC = ('images/logo.png',)
+
+
+# ---------- Local asset fetcher ----------
+@lru_cache(maxsize=None)
+def _local_hosts():
+    hosts = {h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'}
+    hosts.add(urlsplit(settings.PDF_BASE_URL).hostname)
+    return frozenset(hosts)
+
+
+@lru_cache(maxsize=256)
+def _read_asset(path):
+    with open(path, 'rb') as fh:
+        return fh.read()
+
+
+@lru_cache(maxsize=None)
+def font_config():
+    """
+    One FontConfiguration per process. The PDF CSS names system fonts
+    (Arial, sans-serif), so the cost per render is fontconfig matching them;
+    sharing the configuration lets WeasyPrint match each face once.
+    """
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=256)  # static files only change on deploy
+def _static_path(name):
+    """Filesystem path of a static file: manifest (hashed) name first, then the plain name, then finders."""
+    candidates = []
+    try:
+        candidates.append(staticfiles_storage.stored_name(name))
+    except (AttributeError, ValueError):
+        pass  # no manifest entry (collectstatic not run, or plain storage)
+    candidates.append(name)
+
+    for candidate in candidates:
+        try:
+            path = safe_join(settings.STATIC_ROOT, candidate)
+        except SuspiciousFileOperation:
+            return None
+        if os.path.isfile(path):
+            return path
+    return finders.find(name)
+
+
+def _media_path(name):
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        return None
+    return path if os.path.isfile(path) else None
+
+
+def _local_asset_path(url):
+    """Map a /static/ or /media/ URL on our own host to a file, or None."""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or parts.hostname not in _local_hosts():
+        return None
+
+    path = unquote(parts.path)
+    if path.startswith(settings.STATIC_URL):
+        return _static_path(path[len(settings.STATIC_URL):]) or ''
+    if path.startswith(settings.MEDIA_URL):
+        return _media_path(path[len(settings.MEDIA_URL):]) or ''
+    return None
+
+
+def local_url_fetcher(url, *args, **kwargs):
+    """
+    WeasyPrint url_fetcher that reads our own /static/ and /media/ assets
+    straight from disk instead of making an HTTP request back into the app.
+    Anything else (other hosts, data: URIs) goes to WeasyPrint's fetcher.
+    """
+    path = _local_asset_path(url)
+    if path is None:
+        return default_url_fetcher(url, *args, **kwargs)
+    if not path:
+        raise ValueError(f"Local asset not found: {url}")
+
+    return {
+        'string': _read_asset(path),
+        'mime_type': mimetypes.guess_type(path)[0] or 'application/octet-stream',
+        'redirected_url': url,
+    }
+
+
+def preload_assets():
+    font_config()
+    for name in PRELOAD_STATIC:
+        path = _static_path(name)
+        if path:
+            _read_asset(path)
+
+
+def _write_pdf(html_string, base_url=None):
+    html = HTML(
+        string=html_string,
+        base_url=base_url or settings.PDF_BASE_URL,
+        url_fetcher=local_url_fetcher,
+    )
+    return html.write_pdf(font_config=font_config())
+
+
+# ---------- Quotation ----------
+def latest_terms():
+    default_terms = DefaultTerms.objects.order_by('-id').first()
+    if not default_terms:
+        default_terms = DefaultTerms(content="")  # Fallback empty terms
+    return default_terms
+
+
+def render_quotation_pdf(estimation, base_url=None, items=None, terms=None):
+    if items is None:
+        items = estimation.items.all()
+    if terms is None:
+        terms = latest_terms()
+
+    # GST State Code Logic
+    company_gst = (estimation.gst_no or "").strip()
+    same_state = company_gst[:2] == OUR_GST_STATE_CODE
+    gst_rate = 18  # or fetch from your GSTSettings if needed
+
+    if same_state:
+        cgst = sgst = estimation.gst_amount / 2
+        igst = 0
+        cgst_rate = sgst_rate = gst_rate / 2
+        igst_rate = 0
+    else:
+        cgst = sgst = 0
+        igst = estimation.gst_amount
+        igst_rate = gst_rate
+        cgst_rate = sgst_rate = 0
+
+    html_string = render_to_string(QUOTATION_TEMPLATE, {
+        'estimation': estimation,
+        'items': items,
+        'amount_in_words': inr_currency_words(estimation.total),
+        'logo_path': os.path.join(settings.STATIC_ROOT, 'images', 'logo.png'),
+        'expiry_date': estimation.quote_date + timedelta(days=estimation.validity_days),
+        'same_state': same_state,
+        'cgst': cgst,
+        'sgst': sgst,
+        'igst': igst,
+        'cgst_rate': cgst_rate,
+        'sgst_rate': sgst_rate,
+        'igst_rate': igst_rate,
+        'terms': terms,
+    })
+    return _write_pdf(html_string, base_url)
+
+
+def quotation_filename(estimation):
+    return f"Quotation_{estimation.quote_no}.pdf"
+
+
+# ---------- Invoice ----------
+def render_invoice_pdf(invoice, base_url=None, items=None):
+    estimation = invoice.estimation
+    if items is None:
+        items = EstimationItem.objects.filter(estimation=estimation)
+
+    # Calculate due date
+    due_date = invoice.created_at + timedelta(days=invoice.credit_days or 0)
+
+    # Amount in words
+    total = estimation.total
+    rupees = int(total)
+    paise = int(round((total - rupees) * 100))
+
+    amount_in_words = f"Rupees {num2words(rupees, lang='en_IN').title()}"
+    if paise > 0:
+        amount_in_words += f" and {num2words(paise, lang='en_IN').title()} Paise"
+    amount_in_words += " Only"
+
+    # Tax Type Detection
+    company_gst_state_code = estimation.gst_no[:2] if estimation.gst_no else ''
+    same_state = company_gst_state_code == OUR_GST_STATE_CODE
+
+    # Calculate SGST/CGST if same state; IGST if different
+    if same_state:
+        sgst = cgst = estimation.gst_amount / 2
+        igst = 0
+    else:
+        sgst = cgst = 0
+        igst = estimation.gst_amount
+
+    html_string = render_to_string(INVOICE_TEMPLATE, {
+        'invoice': invoice,
+        'estimation': estimation,
+        'items': items,
+        'due_date': due_date,
+        'amount_in_words': amount_in_words,
+        'same_state': same_state,
+        'sgst': sgst,
+        'cgst': cgst,
+        'igst': igst,
+    })
+    return _write_pdf(html_string, base_url)
+
+
+def invoice_filename(invoice):
+    return f"{invoice.invoice_no}.pdf"
+
+
+# ---------- Report ----------
+def render_report_pdf(invoices, base_url=None):
+    html_string = render_to_string('report_pdf_template.html', {
+        'invoices': invoices,
+    })
+    return _write_pdf(html_string, base_url)
+
+
+REPORT_PDF_FILENAME = "Filtered_CRM_Report.pdf"
@@ -0,0 +1,215 @@
+import hashlib
+import os
+import tempfile
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.template.loader import get_template
+from django.utils.http import parse_etags, quote_etag
+
+from .models import Estimation, Invoice
+from . import pdf
+
+# Bump to invalidate every cached PDF (e.g. after a WeasyPrint upgrade).
+PDF_CACHE_VERSION = "1"
+
+
+# ---------- Cache keys ----------
+@lru_cache(maxsize=None)
+def template_version(template_name):
+    """Hash of the template source, read once per process."""
+    source = get_template(template_name).template.source
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def _row(obj):
+    return [str(getattr(obj, f.attname)) for f in obj._meta.concrete_fields]
+
+
+def _digest(*parts):
+    h = hashlib.sha256(PDF_CACHE_VERSION.encode())
+    for part in parts:
+        h.update(repr(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def quotation_cache_key(estimation, items, terms):
+    return _digest(
+        "quotation",
+        template_version(pdf.QUOTATION_TEMPLATE),
+        _row(estimation),
+        _row(estimation.company_name),
+        [_row(item) for item in items],
+        terms.content,
+    )
+
+
+def invoice_cache_key(invoice, items):
+    return _digest(
+        "invoice",
+        template_version(pdf.INVOICE_TEMPLATE),
+        _row(invoice),
+        _row(invoice.estimation),
+        _row(invoice.estimation.company_name),
+        [_row(item) for item in items],
+    )
+
+
+# ---------- Disk store ----------
+def _cache_dir():
+    return os.path.join(settings.MEDIA_ROOT, "pdf_cache")
+
+
+def cache_path(key):
+    return os.path.join(_cache_dir(), key[:2], f"{key}.pdf")
+
+
+# Bytes in each cache directory as of this process's last scan, plus what
+# it has stored since. Writes by other processes only show up at the next
+# scan, so the cache can overshoot the limit by what they stored meanwhile.
+_estimated_bytes = {}
+# Evict down to this share of the limit so the next scan is many stores away.
+EVICT_TO = 0.9
+
+
+def _scan(directory):
+    """(mtime, size, path) of every cached file, and their total size."""
+    entries = []
+    total = 0
+    for root, _dirs, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+    return entries, total
+
+
+def _evict(max_bytes):
+    """Drop least recently used files until the cache fits in EVICT_TO of `max_bytes`."""
+    directory = _cache_dir()
+    entries, total = _scan(directory)
+    if total > max_bytes:
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= max_bytes * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+    _estimated_bytes[directory] = total
+
+
+def _account(size, max_bytes):
+    """Add a stored file to the size estimate; scan and evict only once it crosses the limit."""
+    directory = _cache_dir()
+    if directory not in _estimated_bytes:
+        _evict(max_bytes)  # first store in this process: learn the real size
+        return
+    _estimated_bytes[directory] += size
+    if _estimated_bytes[directory] > max_bytes:
+        _evict(max_bytes)
+
+
+def get_cached(key):
+    """Path of a cached PDF, marked as recently used; None on a miss."""
+    path = cache_path(key)
+    try:
+        os.utime(path)  # mtime doubles as the LRU timestamp
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def open_cached(key):
+    """
+    The cached PDF opened for reading, or None on a miss. A file evicted
+    between the lookup and the open counts as a miss; once open, it stays
+    readable even if it is evicted.
+    """
+    path = get_cached(key)
+    if path is None:
+        return None
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        return None
+
+
+def store(key, pdf_bytes):
+    path = cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename so readers never see a half-written PDF.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(pdf_bytes)
+    os.replace(tmp, path)
+    _account(len(pdf_bytes), settings.PDF_CACHE_MAX_BYTES)
+    return path
+
+
+def get_or_render(key, render):
+    """PDF bytes for `key`, calling `render()` and caching the result on a miss."""
+    fh = open_cached(key)
+    if fh is not None:
+        with fh:
+            return fh.read()
+    pdf_bytes = render()
+    store(key, pdf_bytes)
+    return pdf_bytes
+
+
+def quotation_pdf(pk):
+    """(filename, bytes) for one quotation, rendered only on a cache miss."""
+    estimation = Estimation.objects.select_related('company_name').get(pk=pk)
+    items = list(estimation.items.all())
+    terms = pdf.latest_terms()
+    pdf_bytes = get_or_render(
+        quotation_cache_key(estimation, items, terms),
+        lambda: pdf.render_quotation_pdf(estimation, items=items, terms=terms),
+    )
+    return pdf.quotation_filename(estimation), pdf_bytes
+
+
+def invoice_pdf(pk):
+    """(filename, bytes) for one invoice, rendered only on a cache miss."""
+    invoice = Invoice.objects.select_related('estimation', 'estimation__company_name').get(pk=pk)
+    items = list(invoice.estimation.items.all())
+    pdf_bytes = get_or_render(
+        invoice_cache_key(invoice, items),
+        lambda: pdf.render_invoice_pdf(invoice, items=items),
+    )
+    return pdf.invoice_filename(invoice), pdf_bytes
+
+
+# ---------- HTTP ----------
+def pdf_response(request, key, render, disposition):
+    """
+    Serve a PDF for `key` with a strong ETag. A matching If-None-Match gets a
+    304 before anything is read or rendered; otherwise cache hits stream from
+    disk and misses are rendered once and stored.
+    """
+    etag = quote_etag(key)
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    else:
+        fh = open_cached(key)
+        if fh is not None:
+            response = FileResponse(fh, content_type="application/pdf")
+        else:
+            pdf_bytes = render()
+            store(key, pdf_bytes)
+            response = HttpResponse(pdf_bytes, content_type="application/pdf")
+        response["Content-Disposition"] = disposition
+
+    response["ETag"] = etag
+    # Always revalidate; a matching ETag makes that a cheap 304.
+    response["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,119 @@
+import threading
+from functools import wraps
+from typing import NamedTuple
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db.models import CharField, F, Q, Value
+from django.db.models.functions import Concat
+from django.http import HttpResponseForbidden
+
+from .models import UserPermission
+
+# Effective permission sets are cached under the user's permissions_version.
+# The version lives on the user row, which every request loads anyway, so a
+# bump committed by one worker is seen by all of them even though the cache
+# itself is per process; bumping orphans the old entry instead of deleting it.
+PERMISSION_CACHE_TIMEOUT = 60 * 60
+_PERMS_KEY = "crm:perms:{}:{}"
+
+
+class CatalogEntry(NamedTuple):
+    id: int
+    app_label: str
+    codename: str
+    name: str
+
+    @property
+    def code(self):
+        return f"{self.app_label}.{self.codename}"
+
+
+# ---------- Catalog ----------
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def catalog():
+    """Every auth Permission keyed by 'app_label.codename', loaded once per process."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                rows = Permission.objects.values_list('id', 'content_type__app_label', 'codename', 'name')
+                _catalog = {entry.code: entry for entry in (CatalogEntry(*row) for row in rows)}
+    return _catalog
+
+
+def clear_catalog():
+    global _catalog
+    _catalog = None
+
+
+def resolve(codes):
+    """
+    Permission objects for 'app_label.codename' strings in one IN query.
+    Returns (permissions, unknown codes).
+    """
+    entries = catalog()
+    if any(code not in entries for code in codes):
+        clear_catalog()  # a permission may have been created since the load
+        entries = catalog()
+    unknown = [code for code in codes if code not in entries]
+    ids = {entries[code].id for code in codes if code in entries}
+    return list(Permission.objects.filter(pk__in=ids)) if ids else [], unknown
+
+
+# ---------- Per-user sets ----------
+def bump(*user_ids):
+    """Invalidate the cached permission sets of `user_ids`, in every process."""
+    if user_ids:
+        get_user_model().objects.filter(pk__in=set(user_ids)).update(
+            permissions_version=F('permissions_version') + 1)
+
+
+def _load(user):
+    # Auth permissions (direct and via groups) as 'app.codename', plus the
+    # profile's UserPermission names, in a single UNION query.
+    auth = (
+        Permission.objects.filter(Q(user=user) | Q(group__user=user))
+        .annotate(code=Concat('content_type__app_label', Value('.'), 'codename', output_field=CharField()))
+        .order_by().values_list('code', flat=True)
+    )
+    profile = UserPermission.objects.filter(userprofile__user=user).order_by().values_list('name', flat=True)
+    return frozenset(auth.union(profile))
+
+
+def get_permissions(user):
+    """The user's effective permission strings; cached, and memoised on the user object."""
+    if not user.is_authenticated:
+        return frozenset()
+    memo = getattr(user, '_crm_permissions', None)
+    if memo is None:
+        key = _PERMS_KEY.format(user.pk, user.permissions_version)
+        memo = cache.get(key)
+        if memo is None:
+            memo = _load(user)
+            cache.set(key, memo, PERMISSION_CACHE_TIMEOUT)
+        user._crm_permissions = memo
+    return memo
+
+
+def has_perm(user, perm):
+    if not user.is_active:
+        return False
+    return user.is_superuser or perm in get_permissions(user)
+
+
+def permission_required(*perms):
+    """Like login_required, plus a 403 unless the user holds every one of `perms`."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not all(has_perm(request.user, perm) for perm in perms):
+                return HttpResponseForbidden("You do not have permission to access this page.")
+            return view(request, *args, **kwargs)
+        return login_required(wrapped)
+    return decorator
@@ -0,0 +1,238 @@
+import csv
+import tempfile
+from datetime import date, datetime, time, timedelta
+
+from django.core.files.storage import default_storage
+from django.core.paginator import Paginator
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .models import Lead, Estimation, Invoice
+
+
+# Columns pulled from the first estimation / invoice of each lead.
+# "First" means lowest id, which is what `.first()` used to return.
+ESTIMATION_FIELDS = {
+    'estimation_no': 'quote_no',
+    'estimation_status': 'status',
+    'lost_reason': 'lost_reason',
+    'po_number': 'po_number',
+    'po_date': 'po_date',
+    'po_attachment': 'po_attachment',
+}
+
+INVOICE_FIELDS = {
+    'invoice_no': 'invoice_no',
+    'invoice_amount': 'total_value',
+    'balance_due': 'balance_due',
+    'payment_status': 'status',
+}
+
+REPORT_PAGE_SIZE = 20
+
+
+def report_queryset(from_date=None, to_date=None):
+    """
+    One SELECT for the whole lead → estimation → invoice report.
+    Each lead row carries its first estimation and first invoice as
+    correlated subqueries, so slicing the queryset paginates in SQL.
+    """
+    estimations = Estimation.objects.filter(lead_no=OuterRef('pk')).order_by('pk')
+    invoices = Invoice.objects.filter(estimation__lead_no=OuterRef('pk')).order_by('pk')
+
+    annotations = {
+        'client': F('company_name__company_name'),
+        'lead_date': F('date'),
+    }
+    for alias, field in ESTIMATION_FIELDS.items():
+        annotations[alias] = Subquery(estimations.values(field)[:1])
+    for alias, field in INVOICE_FIELDS.items():
+        annotations[alias] = Subquery(invoices.values(field)[:1])
+
+    leads = Lead.objects.all()
+    from_date, to_date = parse_day(from_date), parse_day(to_date)
+    if from_date and to_date:
+        leads = leads.filter(date__range=[from_date, to_date])
+
+    return (
+        leads.annotate(**annotations)
+        .values('lead_no', 'requirement', *annotations)
+        .order_by('-date', '-id')
+    )
+
+
+def _fmt_date(value):
+    return value.strftime('%d-%m-%Y') if value else ''
+
+
+def build_row(values):
+    """Turn one `report_queryset()` row into the dict the templates/exports use."""
+    has_invoice = values['invoice_no'] is not None
+    amount = values['invoice_amount'] if has_invoice else ''
+    balance = values['balance_due'] if has_invoice else ''
+    return {
+        'lead_no': values['lead_no'],
+        'lead_date': _fmt_date(values['lead_date']),
+        'client': values['client'] or '',
+        'requirement': values['requirement'],
+        'estimation_no': values['estimation_no'] or '',
+        'estimation_status': values['estimation_status'] or '',
+        'lost_reason': values['lost_reason'] or '',
+        'po_number': values['po_number'] or '',
+        'po_date': _fmt_date(values['po_date']),
+        'po_attachment': default_storage.url(values['po_attachment']) if values['po_attachment'] else '',
+        'invoice_no': values['invoice_no'] or '',
+        'invoice_amount': amount,
+        'paid_amount': amount - balance if has_invoice else '',
+        'balance_due': balance,
+        'payment_status': values['payment_status'] or '',
+    }
+
+
+def iter_report_rows(queryset):
+    for values in queryset:
+        yield build_row(values)
+
+
+def report_page(from_date=None, to_date=None, page_number=None, per_page=REPORT_PAGE_SIZE):
+    """
+    Paginated report: a COUNT plus one LIMIT/OFFSET select, whatever the
+    table size. The returned page's object_list holds built rows.
+    """
+    paginator = Paginator(report_queryset(from_date, to_date), per_page)
+    page_obj = paginator.get_page(page_number)
+    page_obj.object_list = [build_row(values) for values in page_obj.object_list]
+    return page_obj
+
+
+# ---------- Exports ----------
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _money(row, key):
+    return float(row[key]) if row['invoice_no'] else ''
+
+
+EXPORT_COLUMNS = [
+    ("Lead No", lambda row: row['lead_no']),
+    ("Lead Date", lambda row: row['lead_date']),
+    ("Client", lambda row: row['client']),
+    ("Requirement", lambda row: row['requirement']),
+    ("Estimation No", lambda row: row['estimation_no']),
+    ("Estimation Status", lambda row: row['estimation_status'] or 'Pending'),
+    ("Lost Reason", lambda row: row['lost_reason']),
+    ("Client PO Number", lambda row: row['po_number']),
+    ("PO Date", lambda row: row['po_date']),
+    ("Invoice No", lambda row: row['invoice_no']),
+    ("Amount", lambda row: _money(row, 'invoice_amount')),
+    ("Paid", lambda row: _money(row, 'paid_amount')),
+    ("Balance", lambda row: _money(row, 'balance_due')),
+    ("Payment Status", lambda row: row['payment_status']),
+]
+
+
+def iter_export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Header row, then one list per lead. Rows come off a server-side cursor
+    (`iterator()`), so only `chunk_size` leads are held in memory at a time.
+    """
+    yield [header for header, _ in EXPORT_COLUMNS]
+    for values in queryset.iterator(chunk_size=chunk_size):
+        row = build_row(values)
+        yield [getter(row) for _, getter in EXPORT_COLUMNS]
+
+
+class Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def stream_report_csv(queryset):
+    writer = csv.writer(Echo())
+    for row in iter_export_rows(queryset):
+        yield writer.writerow(row)
+
+
+def write_report_xlsx(queryset):
+    """
+    Write the report with a write-only openpyxl workbook, which flushes rows
+    to disk as they are appended. Returns an open temporary file at offset 0.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Report")
+    for row in iter_export_rows(queryset):
+        ws.append(row)
+
+    tmp = tempfile.TemporaryFile(suffix=".xlsx")
+    wb.save(tmp)
+    tmp.seek(0)
+    return tmp
+
+
+# ---------- Invoice filters ----------
+INVOICE_FILTER_PARAMS = ('from_date', 'to_date', 'company', 'lead_no')
+
+
+def parse_day(value):
+    """`value` as a date; None when it is empty or not a valid 'YYYY-MM-DD', so the filter is skipped."""
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)) if value else None
+    except ValueError:
+        return None
+
+
+def _day_start(day, days=0):
+    """Aware datetime at local midnight of `day`, plus `days`."""
+    return timezone.make_aware(datetime.combine(day + timedelta(days=days), time.min))
+
+
+def filter_invoices(params):
+    """Invoices matching the report filters in `params` (request.GET or a dict)."""
+    invoices = Invoice.objects.select_related(
+        'estimation__company_name', 'estimation__lead_no__company_name'
+    ).all()
+
+    from_date = parse_day(params.get('from_date'))
+    to_date = parse_day(params.get('to_date'))
+    company = params.get('company')
+    lead_no = params.get('lead_no')
+
+    # Compare created_at against local-midnight bounds rather than
+    # created_at__date, so the created_at index can be used.
+    if from_date:
+        invoices = invoices.filter(created_at__gte=_day_start(from_date))
+    if to_date:
+        invoices = invoices.filter(created_at__lt=_day_start(to_date, days=1))
+
+    if company:
+        invoices = invoices.filter(estimation__company_name__id=company)
+    if lead_no:
+        invoices = invoices.filter(estimation__lead_no=lead_no)
+
+    return invoices
+
+
+def filter_estimations(params):
+    """Quotations matching the same filters, applied to quote_date."""
+    estimations = Estimation.objects.all()
+
+    from_date = parse_day(params.get('from_date'))
+    to_date = parse_day(params.get('to_date'))
+    company = params.get('company')
+    lead_no = params.get('lead_no')
+
+    if from_date:
+        estimations = estimations.filter(quote_date__gte=from_date)
+    if to_date:
+        estimations = estimations.filter(quote_date__lte=to_date)
+    if company:
+        estimations = estimations.filter(company_name__id=company)
+    if lead_no:
+        estimations = estimations.filter(lead_no=lead_no)
+
+    return estimations
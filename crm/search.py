@@ -0,0 +1,234 @@
+import re
+from itertools import islice
+
+from django.apps import apps as global_apps
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.urls import reverse
+
+from .models import Client, Estimation, Invoice, Lead, SearchDocument
+
+SEARCH_RESULT_LIMIT = 20
+INDEX_BATCH_SIZE = 1000
+MAX_TERMS = 8
+
+# Same word boundaries as FTS5's unicode61 tokenizer and Postgres' 'simple'
+# parser: runs of letters/digits, so "INV-2025" and "a@b.com" split alike.
+_TERM = re.compile(r"[^\W_]+")
+
+
+def terms(query):
+    return _TERM.findall((query or "").lower())[:MAX_TERMS]
+
+
+# ---------- Documents ----------
+def _join(*parts):
+    return " ".join(str(part) for part in parts if part)
+
+
+def _client_doc(client):
+    return (
+        client.company_name,
+        _join(client.contact_person, client.email, client.mobile, client.gst_no, client.type_of_company),
+        reverse('edit_client', args=[client.pk]),
+    )
+
+
+def _lead_doc(lead):
+    company = lead.company_name
+    return (
+        _join(lead.lead_no, company.company_name),
+        _join(lead.contact_person, lead.email, lead.mobile, company.gst_no, lead.requirement),
+        reverse('lead_edit', args=[lead.pk]),
+    )
+
+
+def _estimation_doc(estimation):
+    company = estimation.company_name
+    return (
+        _join(estimation.quote_no, company.company_name),
+        _join(estimation.lead_no.lead_no if estimation.lead_no_id else None,
+              estimation.gst_no or company.gst_no, company.contact_person),
+        reverse('estimation_detail', args=[estimation.pk]),
+    )
+
+
+def _invoice_doc(invoice):
+    estimation = invoice.estimation
+    return (
+        _join(invoice.invoice_no, estimation.company_name.company_name),
+        _join(estimation.quote_no, estimation.gst_no),
+        reverse('invoice_detail', args=[estimation.pk]),
+    )
+
+
+# kind -> (model, select_related for building its document, builder)
+INDEXED = {
+    'client': (Client, (), _client_doc),
+    'lead': (Lead, ('company_name',), _lead_doc),
+    'estimation': (Estimation, ('company_name', 'lead_no'), _estimation_doc),
+    'invoice': (Invoice, ('estimation__company_name',), _invoice_doc),
+}
+KIND_BY_MODEL = {model: kind for kind, (model, _related, _build) in INDEXED.items()}
+
+
+# ---------- Indexing ----------
+def index_objects(kind, objects, document_model=SearchDocument):
+    """Upsert the search documents for `objects` in one statement per batch."""
+    _model, _related, build = INDEXED[kind]
+    documents = []
+    for obj in objects:
+        title, body, url = build(obj)
+        documents.append(document_model(kind=kind, object_id=obj.pk, title=title[:255], body=body, url=url))
+    document_model.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=['kind', 'object_id'],
+        update_fields=['title', 'body', 'url'],
+        batch_size=INDEX_BATCH_SIZE,
+    )
+    return len(documents)
+
+
+def index_queryset(kind, queryset, document_model=SearchDocument):
+    _model, related, _build = INDEXED[kind]
+    rows = queryset.select_related(*related).iterator(chunk_size=INDEX_BATCH_SIZE)
+    total = 0
+    while batch := list(islice(rows, INDEX_BATCH_SIZE)):
+        total += index_objects(kind, batch, document_model)
+    return total
+
+
+def index_instance(instance):
+    kind = KIND_BY_MODEL[type(instance)]
+    if kind == 'client':
+        old_title = (
+            SearchDocument.objects.filter(kind='client', object_id=instance.pk)
+            .values_list('title', flat=True).first()
+        )
+        index_objects(kind, [instance])
+        # Leads, quotations and invoices carry the company name too.
+        if old_title is not None and old_title != instance.company_name:
+            index_queryset('lead', Lead.objects.filter(company_name=instance))
+            index_queryset('estimation', Estimation.objects.filter(company_name=instance))
+            index_queryset('invoice', Invoice.objects.filter(estimation__company_name=instance))
+    else:
+        index_objects(kind, [instance])
+
+
+def remove_instance(instance):
+    SearchDocument.objects.filter(kind=KIND_BY_MODEL[type(instance)], object_id=instance.pk).delete()
+
+
+def rebuild(apps=global_apps):
+    """
+    Re-create every search document from the source tables.
+    Migrations pass their historical `apps` to fill a new index.
+    """
+    Document = apps.get_model('crm', 'SearchDocument')
+    Document.objects.all().delete()
+    return {kind: index_queryset(kind, apps.get_model('crm', model.__name__).objects.order_by('pk'), Document)
+            for kind, (model, _related, _build) in INDEXED.items()}
+
+
+# ---------- Backends ----------
+class SearchBackend:
+    """Fallback for databases without a native full-text index: AND of icontains."""
+
+    def _matching(self, words):
+        documents = SearchDocument.objects.all()
+        for word in words:
+            documents = documents.filter(Q(title__icontains=word) | Q(body__icontains=word))
+        return documents
+
+    def ranked_ids(self, words, kinds, limit):
+        documents = self._matching(words)
+        if kinds:
+            documents = documents.filter(kind__in=kinds)
+        return list(documents.order_by('-id').values_list('id', flat=True)[:limit])
+
+    def matching_object_ids(self, kind, words):
+        return self._matching(words).filter(kind=kind).values('object_id')
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """FTS5 table crm_search_fts, ranked by bm25 with the title weighted 10x."""
+
+    def _query(self, words):
+        return " ".join(f'"{word}"*' for word in words)  # prefix match, implicit AND
+
+    def ranked_ids(self, words, kinds, limit):
+        sql = (
+            "SELECT d.id FROM crm_search_fts JOIN crm_searchdocument d ON d.id = crm_search_fts.rowid "
+            "WHERE crm_search_fts MATCH %s"
+        )
+        params = [self._query(words)]
+        if kinds:
+            sql += f" AND d.kind IN ({', '.join(['%s'] * len(kinds))})"
+            params += list(kinds)
+        sql += " ORDER BY bm25(crm_search_fts, 10.0, 1.0) LIMIT %s"
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def matching_object_ids(self, kind, words):
+        return RawSQL(
+            "SELECT d.object_id FROM crm_search_fts JOIN crm_searchdocument d ON d.id = crm_search_fts.rowid "
+            "WHERE crm_search_fts MATCH %s AND d.kind = %s",
+            [self._query(words), kind],
+        )
+
+
+class PostgresBackend(SearchBackend):
+    """Generated tsvector column with a GIN index, ranked by ts_rank."""
+
+    def _query(self, words):
+        return " & ".join(f"{word}:*" for word in words)
+
+    def ranked_ids(self, words, kinds, limit):
+        sql = "SELECT id FROM crm_searchdocument WHERE search_vector @@ to_tsquery('simple', %s)"
+        params = [self._query(words)]
+        if kinds:
+            sql += " AND kind = ANY(%s)"
+            params.append(list(kinds))
+        sql += " ORDER BY ts_rank(search_vector, to_tsquery('simple', %s)) DESC, id DESC LIMIT %s"
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [self._query(words), limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def matching_object_ids(self, kind, words):
+        return RawSQL(
+            "SELECT object_id FROM crm_searchdocument "
+            "WHERE kind = %s AND search_vector @@ to_tsquery('simple', %s)",
+            [kind, self._query(words)],
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresBackend,
+}
+
+
+def get_backend():
+    return BACKENDS.get(connection.vendor, SearchBackend)()
+
+
+# ---------- Queries ----------
+def search(query, kinds=None, limit=SEARCH_RESULT_LIMIT):
+    """Best-matching SearchDocuments across all kinds (or `kinds`), best first."""
+    words = terms(query)
+    if not words:
+        return []
+    ids = get_backend().ranked_ids(words, kinds, limit)
+    documents = SearchDocument.objects.in_bulk(ids)
+    return [documents[pk] for pk in ids if pk in documents]
+
+
+def filter_queryset(queryset, kind, query):
+    """Restrict a list view's queryset to objects of `kind` matching `query`."""
+    words = terms(query)
+    if not words:
+        return queryset
+    return queryset.filter(pk__in=get_backend().matching_object_ids(kind, words))
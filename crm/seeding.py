@@ -0,0 +1,293 @@
+import math
+from collections import Counter
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import dashboard, leads, search, sequences
+from .models import Client, Estimation, EstimationItem, Invoice, Lead, PaymentLog
+from .utils import insert_rows, update_rows
+
+# Number of leads per named scale; every other table is sized from it.
+SCALES = {'10k': 10_000, '100k': 100_000, '1M': 1_000_000}
+HISTORY_DAYS = 730
+WINDOW_DAYS = 14          # rows are generated and committed one date window at a time
+INSERT_BATCH_SIZE = 2000
+LEADS_PER_CLIENT = 8
+
+# Shape of the data, tuned to look like the production mix.
+QUOTED_SHARE = 0.7
+ESTIMATION_STATUSES = (('Pending', 0.30), ('Approved', 0.08), ('Invoiced', 0.37), ('Rejected', 0.10), ('Lost', 0.15))
+TAX_RATES = ((0, 0.05), (5, 0.15), (12, 0.20), (18, 0.50), (28, 0.10))
+PAYMENTS_PER_INVOICE = ((0, 0.30), (1, 0.45), (2, 0.17), (3, 0.08))
+SETTLED_SHARE = 0.7
+
+FIRST_WORDS = ('Shree', 'Sai', 'Om', 'Global', 'National', 'Apex', 'Bharat', 'Sunrise', 'Metro', 'Royal',
+               'Prime', 'United', 'Vikas', 'Ganesh', 'Lakshmi', 'Star', 'Eastern', 'Deccan', 'Kaveri', 'Indus')
+TRADES = ('Steels', 'Traders', 'Engineering', 'Fabricators', 'Polymers', 'Electricals', 'Industries',
+          'Infra', 'Packaging', 'Chemicals', 'Textiles', 'Motors', 'Pharma', 'Agro', 'Logistics')
+LEGAL_FORMS = (('Pvt. Ltd.', 'Private Limited'), ('LLP', 'LLP'), ('Enterprises', 'Proprietorship'),
+               ('& Co.', 'Partnership'), ('Ltd.', 'Public Limited'))
+CITIES = (('Mumbai', '27'), ('Pune', '27'), ('Chennai', '33'), ('Bengaluru', '29'), ('Ahmedabad', '24'),
+          ('Delhi', '07'), ('Hyderabad', '36'), ('Kolkata', '19'), ('Coimbatore', '33'), ('Surat', '24'))
+PEOPLE = ('Ravi Kumar', 'Priya Shah', 'Anil Mehta', 'Sita Rao', 'Vikram Singh', 'Meera Iyer', 'Arjun Nair',
+          'Kavita Joshi', 'Suresh Patel', 'Neha Gupta', 'Rahul Verma', 'Divya Menon')
+PRODUCTS = ('MS plates', 'SS pipes', 'Control panel', 'Conveyor belt', 'HDPE granules', 'Pressure valve',
+            'Cable tray', 'Gear motor', 'Packing film', 'Fasteners', 'Fabricated shed', 'Pump set')
+
+LETTERS = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+
+
+def leads_for(scale):
+    """'10k', '100k', '1M' or a plain number of leads."""
+    if scale in SCALES:
+        return SCALES[scale]
+    count = int(str(scale).replace('_', ''))
+    if count < 1:
+        raise ValueError("Scale must be at least 1 lead")
+    return count
+
+
+def _pick(rng, table, size):
+    values, weights = zip(*table)
+    return np.array(values)[rng.choice(len(values), size=size, p=weights)]
+
+
+def _split(totals, counts, rng):
+    """Split each of `totals` (int paise) into `counts` random positive-ish parts, summing exactly."""
+    weights = rng.random(counts.sum()) + 0.2
+    starts = np.cumsum(counts) - counts
+    owner = np.repeat(np.arange(len(totals)), counts)
+    share = weights / np.add.reduceat(weights, starts)[owner]
+    parts = np.floor(share * totals[owner]).astype(np.int64)
+    last = starts + counts - 1
+    parts[last] += totals - np.add.reduceat(parts, starts)  # rounding remainder on the last part
+    return parts
+
+
+def _paise(values):
+    return [Decimal(int(v)) / 100 for v in values]
+
+
+def _timestamp(day, seconds):
+    """A local time on `day`, ready to pass to raw SQL (naive UTC text on SQLite)."""
+    moment = timezone.make_aware(datetime.combine(day, time()) + timedelta(seconds=int(seconds)))
+    return connection.ops.adapt_datetimefield_value(moment)
+
+
+class Seeder:
+    """
+    Generates a consistent Client → Lead → Estimation → EstimationItem →
+    Invoice → PaymentLog graph with numpy-drawn distributions: skewed
+    client popularity, more recent activity than old, log-normal prices,
+    partial and settled payments. Amounts are computed in integer paise,
+    so totals match what update_invoice_totals would compute. Document
+    numbers come from crm.sequences, reserved per date.
+    """
+
+    def __init__(self, lead_count, seed=42, index_search=True, progress=None):
+        self.lead_count = lead_count
+        self.rng = np.random.default_rng(seed)
+        self.index_search = index_search
+        self.progress = progress
+        self.today = timezone.localdate()
+        self.stats = Counter()
+        self.utr_base = (PaymentLog.objects.aggregate(top=Max('id'))['top'] or 0) + 1
+
+    # ---------- Clients ----------
+    def make_clients(self):
+        rng, count = self.rng, max(self.lead_count // LEADS_PER_CLIENT, 1)
+        first = rng.integers(len(FIRST_WORDS), size=count)
+        trade = rng.integers(len(TRADES), size=count)
+        form = rng.integers(len(LEGAL_FORMS), size=count)
+        city = rng.integers(len(CITIES), size=count)
+        pan_letters = LETTERS[rng.integers(26, size=(count, 6))]
+        pan_digits = rng.integers(10_000, size=count)
+        has_gst = rng.random(count) < 0.85
+
+        clients = []
+        for i in range(count):
+            city_name, state = CITIES[city[i]]
+            letters = ''.join(pan_letters[i])
+            gst = f"{state}{letters[:5]}{pan_digits[i]:04d}{letters[5]}1Z{i % 10}" if has_gst[i] else None
+            clients.append(Client(
+                company_name=f"{FIRST_WORDS[first[i]]} {TRADES[trade[i]]} {i} {LEGAL_FORMS[form[i]][0]}",
+                type_of_company=LEGAL_FORMS[form[i]][1],
+                gst_no=gst,
+                contact_person=PEOPLE[i % len(PEOPLE)],
+                email=f"accounts{i}@example.com",
+                mobile=f"9{800000000 + i % 100000000}",
+                address=f"{i % 400 + 1}, Industrial Area, {city_name}",
+            ))
+        for start in range(0, count, INSERT_BATCH_SIZE * 10):
+            with transaction.atomic():
+                batch = clients[start:start + INSERT_BATCH_SIZE * 10]
+                Client.objects.bulk_create(batch, batch_size=INSERT_BATCH_SIZE)
+                if self.index_search:
+                    search.index_objects('client', batch)
+        self.clients = clients
+        # Zipf-like popularity: a few clients bring most of the leads.
+        weights = 1 / np.arange(1, count + 1) ** 0.8
+        self.client_cdf = np.cumsum(rng.permutation(weights) / weights.sum())
+        self.stats['clients'] = count
+
+    # ---------- Windows ----------
+    def run(self):
+        self.make_clients()
+        days = np.arange(HISTORY_DAYS, -1, -1)                      # days ago, oldest first
+        growth = 1 + (HISTORY_DAYS - days) / HISTORY_DAYS            # twice as busy now as two years ago
+        weekday = np.array([0.35 if (self.today - timedelta(int(d))).weekday() == 6 else 1.0 for d in days])
+        per_day = self.rng.multinomial(self.lead_count, growth * weekday / (growth * weekday).sum())
+        for start in range(0, len(days), WINDOW_DAYS):
+            window_days, counts = days[start:start + WINDOW_DAYS], per_day[start:start + WINDOW_DAYS]
+            if counts.sum():
+                with transaction.atomic():
+                    self.make_window(np.repeat(window_days, counts))
+            if self.progress:
+                self.progress(self.stats)
+
+        leads.refresh_computed_status()
+        dashboard.reconcile()
+        return self.stats
+
+    def make_window(self, days_ago):
+        rng, n = self.rng, len(days_ago)
+        lead_dates = [self.today - timedelta(int(d)) for d in days_ago]
+        client_ix = np.minimum(np.searchsorted(self.client_cdf, rng.random(n)), len(self.clients) - 1)
+        people = rng.integers(len(PEOPLE), size=n)
+        products = rng.integers(len(PRODUCTS), size=n)
+
+        lead_rows = []
+        for number, i in zip(sequences.reserve('lead', n), range(n)):
+            client = self.clients[client_ix[i]]
+            lead_rows.append(Lead(
+                lead_no=number, company_name=client, contact_person=PEOPLE[people[i]],
+                email=client.email, mobile=client.mobile, address=client.address,
+                requirement=f"{PRODUCTS[products[i]]}, {int(rng.integers(1, 500))} units",
+            ))
+        Lead.objects.bulk_create(lead_rows, batch_size=INSERT_BATCH_SIZE)
+        # `date` is auto_now_add, which bulk_create fills with today.
+        update_rows(Lead, ('date',), [(day, lead.pk) for day, lead in zip(lead_dates, lead_rows)])
+        self.stats['leads'] += n
+
+        quoted = np.flatnonzero(rng.random(n) < QUOTED_SHARE)
+        estimations = self.make_estimations([lead_rows[i] for i in quoted], days_ago[quoted])
+        invoiced = [e for e in estimations if e.status == 'Invoiced']
+        invoices = self.make_invoices(invoiced)
+        if self.index_search:
+            search.index_objects('lead', lead_rows)
+            search.index_objects('estimation', estimations)
+            search.index_objects('invoice', invoices)
+
+    def _numbers(self, kind, dates):
+        """Document numbers for `dates`, one sequence reservation per distinct date."""
+        by_date = Counter(dates)
+        blocks = {day: iter(sequences.reserve(kind, count, today=day)) for day, count in by_date.items()}
+        return [next(blocks[day]) for day in dates]
+
+    # ---------- Estimations and items ----------
+    def make_estimations(self, lead_rows, days_ago):
+        rng, m = self.rng, len(lead_rows)
+        if not m:
+            return []
+        delay = rng.integers(0, 10, size=m)
+        dates = [self.today - timedelta(int(max(d - k, 0))) for d, k in zip(days_ago, delay)]
+        statuses = _pick(rng, ESTIMATION_STATUSES, m)
+
+        per_estimation = 1 + rng.poisson(2.0, size=m)
+        t = per_estimation.sum()
+        quantity = rng.integers(1, 51, size=t)
+        rate = np.clip(np.round(rng.lognormal(math.log(150_000), 1.0, size=t)), 100, 5_000_000).astype(np.int64)
+        tax = _pick(rng, TAX_RATES, t).astype(np.int64)
+        starts = np.cumsum(per_estimation) - per_estimation
+        net = quantity * rate
+        gross_x100 = net * (100 + tax)                       # paise x 100
+        sub_total = np.add.reduceat(net, starts)
+        total = (np.add.reduceat(gross_x100, starts) + 50) // 100   # round half up, as invoices.py does
+        line_amount = (gross_x100 + 50) // 100
+
+        estimations = []
+        for i, (lead, number) in enumerate(zip(lead_rows, self._numbers('quotation', dates))):
+            client = lead.company_name
+            estimations.append(Estimation(
+                quote_no=number, quote_date=dates[i], lead_no=lead, company_name=client,
+                validity_days=30, gst_no=client.gst_no,
+                billing_address=client.address, shipping_address=client.address,
+                sub_total=Decimal(int(sub_total[i])) / 100, discount=Decimal("0.00"),
+                gst_amount=Decimal(int(total[i] - sub_total[i])) / 100, total=Decimal(int(total[i])) / 100,
+                status=str(statuses[i]), credit_days=30,
+                follow_up_date=dates[i] + timedelta(days=7) if statuses[i] == 'Pending' else None,
+            ))
+        Estimation.objects.bulk_create(estimations, batch_size=INSERT_BATCH_SIZE)
+
+        owners = np.repeat(np.arange(m), per_estimation)
+        products = rng.integers(len(PRODUCTS), size=t)
+        insert_rows(EstimationItem, ('estimation', 'item_details', 'quantity', 'rate', 'tax', 'amount'), [
+            (estimations[owners[j]].pk, PRODUCTS[products[j]], int(quantity[j]),
+             Decimal(int(rate[j])) / 100, Decimal(int(tax[j])), Decimal(int(line_amount[j])) / 100)
+            for j in range(t)
+        ])
+        self.stats['estimations'] += m
+        self.stats['items'] += int(t)
+        return estimations
+
+    # ---------- Invoices and payments ----------
+    def make_invoices(self, estimations):
+        rng, k = self.rng, len(estimations)
+        if not k:
+            return []
+        lag = rng.integers(1, 15, size=k)
+        dates = [min(e.quote_date + timedelta(int(d)), self.today) for e, d in zip(estimations, lag)]
+        seconds = rng.integers(10 * 3600, 19 * 3600, size=k)
+        totals = np.array([int(e.total * 100) for e in estimations], dtype=np.int64)
+
+        payments = _pick(rng, PAYMENTS_PER_INVOICE, k).astype(np.int64)
+        settled = rng.random(k) < SETTLED_SHARE
+        paid = np.where(payments == 0, 0,
+                        np.where(settled, totals, np.floor(totals * rng.uniform(0.2, 0.9, size=k)).astype(np.int64)))
+        paid_total = paid.astype(np.int64)
+
+        invoices = []
+        for i, (estimation, number) in enumerate(zip(estimations, self._numbers('invoice', dates))):
+            balance = int(totals[i] - paid_total[i])
+            invoices.append(Invoice(
+                estimation=estimation, invoice_no=number, credit_days=30, is_approved=True,
+                total_value=Decimal(int(totals[i])) / 100, paid_amount=Decimal(int(paid_total[i])) / 100,
+                balance_due=Decimal(balance) / 100, due_date=dates[i] + timedelta(days=30),
+                status='Unpaid' if not paid_total[i] else ('Paid' if balance == 0 else 'Partial Paid'),
+            ))
+        Invoice.objects.bulk_create(invoices, batch_size=INSERT_BATCH_SIZE)
+        update_rows(Invoice, ('created_at',), [(_timestamp(day, s), inv.pk) for day, s, inv in zip(dates, seconds, invoices)])
+        self.stats['invoices'] += k
+
+        has_logs = np.flatnonzero(payments > 0)
+        counts = payments[has_logs]
+        if not len(has_logs):
+            return invoices
+        amounts = _split(paid_total[has_logs], counts, rng)
+        gaps = rng.integers(1, 30, size=counts.sum())
+        log_seconds = rng.integers(10 * 3600, 19 * 3600, size=counts.sum())
+        logs, j = [], 0
+        for owner, count in zip(has_logs, counts):
+            invoice, day = invoices[owner], dates[owner]
+            for n in range(count):
+                day = min(day + timedelta(int(gaps[j])), self.today)
+                settles = n == count - 1 and invoice.status == 'Paid'
+                logs.append((
+                    invoice.pk, Decimal(int(amounts[j])) / 100,
+                    f"SEEDUTR{self.utr_base + self.stats['payments'] + j:012d}",
+                    day, _timestamp(day, log_seconds[j]), 'Paid' if settles else 'Partial Paid',
+                ))
+                j += 1
+        insert_rows(PaymentLog, ('invoice', 'amount_paid', 'utr_number', 'payment_date', 'created_at', 'status'), logs)
+        self.stats['payments'] += len(logs)
+        return invoices
+
+
+def seed(lead_count, seed=42, index_search=True, progress=None):
+    """Add a synthetic dataset of about `lead_count` leads; returns row counts by table."""
+    return Seeder(lead_count, seed, index_search, progress).run()
@@ -0,0 +1,107 @@
+from typing import NamedTuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import DocumentSequence, Estimation, EstimationSettings, Invoice, Lead
+
+# strftime format of the period each EstimationSettings.frequency resets on.
+PERIOD_FORMATS = {
+    'daily': '%Y%m%d',
+    'monthly': '%Y%m',
+    'yearly': '%Y',
+}
+
+
+class Numbering(NamedTuple):
+    period: str   # sequence key within the kind; '' never resets
+    stem: str     # everything before the zero-padded counter
+    width: int
+    model: type
+    field: str
+    floor: int = 1  # lowest number to hand out (EstimationSettings.next_number)
+
+    def format(self, n):
+        return f"{self.stem}{n:0{self.width}d}"
+
+    def seed(self):
+        """
+        First number for a new sequence row: one past the highest number
+        already issued under this stem, so existing documents never collide,
+        and never below the floor. Runs once per (kind, period).
+        """
+        highest = self.floor - 1
+        issued = self.model.objects.filter(**{f"{self.field}__startswith": self.stem})
+        for value in issued.values_list(self.field, flat=True).iterator():
+            suffix = value[len(self.stem):]
+            if suffix.isdigit():
+                highest = max(highest, int(suffix))
+        return highest + 1
+
+
+# ---------- Document kinds ----------
+def _lead(today):
+    return Numbering('', '#', 4, Lead, 'lead_no')
+
+
+def _quotation(today):
+    # Prefix, reset frequency and floor come from EstimationSettings
+    # (admin-editable). Without a frequency the numbers are the original
+    # PREFIX-NNNN series; raising next_number in the admin skips ahead.
+    settings = EstimationSettings.objects.first() or EstimationSettings()
+    fmt = PERIOD_FORMATS.get(settings.frequency)
+    if not fmt:
+        return Numbering('', f"{settings.prefix}-", 4, Estimation, 'quote_no', settings.next_number)
+    period = today.strftime(fmt)
+    return Numbering(period, f"{settings.prefix}-{period}-", 4, Estimation, 'quote_no')
+
+
+def _invoice(today):
+    period = today.strftime(PERIOD_FORMATS['daily'])
+    return Numbering(period, f"INV-{period}-", 3, Invoice, 'invoice_no')
+
+
+NUMBERINGS = {
+    'lead': _lead,
+    'quotation': _quotation,
+    'invoice': _invoice,
+}
+
+
+# ---------- Allocation ----------
+def _allocate(kind, numbering, count):
+    """Reserve `count` consecutive values and return the first one."""
+    sequence = DocumentSequence.objects.filter(kind=kind, period=numbering.period)
+    with transaction.atomic():
+        # The UPDATE holds the row lock (the write lock on SQLite) until
+        # commit, so the value read back below belongs to this caller alone.
+        if not sequence.update(next_value=Greatest(F('next_value'), numbering.floor) + count):
+            try:
+                with transaction.atomic():
+                    DocumentSequence.objects.create(
+                        kind=kind, period=numbering.period, next_value=numbering.seed()
+                    )
+            except IntegrityError:
+                pass  # another caller created the row first
+            sequence.update(next_value=Greatest(F('next_value'), numbering.floor) + count)
+        return sequence.values_list('next_value', flat=True).get() - count
+
+
+def reserve(kind, count=1, today=None):
+    """
+    Hand out `count` consecutive document numbers for `kind` in one
+    round-trip, e.g. to pre-allocate a block for a bulk import.
+    """
+    if kind not in NUMBERINGS:
+        raise ValueError(f"Unknown document kind: {kind}")
+    if count < 1:
+        return []
+    numbering = NUMBERINGS[kind](today or timezone.localdate())
+    first = _allocate(kind, numbering, count)
+    return [numbering.format(n) for n in range(first, first + count)]
+
+
+def next_number(kind, today=None):
+    return reserve(kind, 1, today)[0]
@@ -1,6 +1,10 @@
-from django.db.models.signals import post_save
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.db.models import DEFERRED
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import UserProfile, User
+from .models import UserProfile, UserPermission, User, Client, Invoice, PaymentLog, Lead, Estimation
+from . import dashboard, leads, permissions, search
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -11,3 +15,127 @@ def create_user_profile(sender, instance, created, **kwargs):
             email=instance.email,
             role=instance.role
         )
+
+
+# ---------- Dashboard Snapshot ----------
+DASHBOARD_MODELS = (Invoice, PaymentLog, Lead, Estimation)
+
+
+def dashboard_pre_save(sender, instance, raw=False, **kwargs):
+    # Remember what the stored row contributed so post_save can apply the difference.
+    if raw:
+        return
+    instance._dashboard_old = dashboard.stored_contribution(sender, instance.pk) if instance.pk else {}
+
+
+def dashboard_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    dashboard.apply_change(getattr(instance, '_dashboard_old', {}), dashboard.contribution(instance))
+    instance._dashboard_old = {}
+
+
+def dashboard_post_delete(sender, instance, **kwargs):
+    dashboard.apply_change(dashboard.contribution(instance), {})
+
+
+for model in DASHBOARD_MODELS:
+    pre_save.connect(dashboard_pre_save, sender=model, dispatch_uid=f'dashboard_pre_save_{model.__name__}')
+    post_save.connect(dashboard_post_save, sender=model, dispatch_uid=f'dashboard_post_save_{model.__name__}')
+    post_delete.connect(dashboard_post_delete, sender=model, dispatch_uid=f'dashboard_post_delete_{model.__name__}')
+
+
+# ---------- Lead Status ----------
+@receiver(pre_save, sender=Estimation, dispatch_uid='lead_status_pre_save')
+def remember_previous_lead(sender, instance, raw=False, update_fields=None, **kwargs):
+    # A quotation moved to another lead changes the old lead's status too.
+    # Rows loaded from the database carry the lead they were loaded with
+    # (Estimation.from_db); only other instances with a pk are looked up.
+    if raw or not instance.pk:
+        instance._loaded_lead_id = None
+    elif update_fields is not None and 'lead_no' not in update_fields:
+        instance._loaded_lead_id = instance.lead_no_id
+    elif getattr(instance, '_loaded_lead_id', DEFERRED) is DEFERRED:
+        instance._loaded_lead_id = (
+            Estimation.objects.filter(pk=instance.pk).values_list('lead_no_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Estimation, dispatch_uid='lead_status_post_save')
+@receiver(post_delete, sender=Estimation, dispatch_uid='lead_status_post_delete')
+def refresh_lead_status(sender, instance, raw=False, **kwargs):
+    # Lead.computed_status follows the lead's latest estimation; keep it
+    # current on the write path so list views never have to write.
+    if raw:
+        return
+    lead_ids = {instance.lead_no_id, getattr(instance, '_loaded_lead_id', None)} - {None, DEFERRED}
+    instance._loaded_lead_id = instance.lead_no_id
+    if lead_ids:
+        leads.refresh_computed_status(lead_ids)
+
+
+# ---------- Search Index ----------
+def search_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_instance(instance)
+
+
+def search_post_delete(sender, instance, **kwargs):
+    search.remove_instance(instance)
+
+
+for model in search.KIND_BY_MODEL:
+    post_save.connect(search_post_save, sender=model, dispatch_uid=f'search_post_save_{model.__name__}')
+    post_delete.connect(search_post_delete, sender=model, dispatch_uid=f'search_post_delete_{model.__name__}')
+
+
+# ---------- Permission Cache ----------
+def _users_for(through, instance, reverse, pk_set):
+    """Ids of the users whose effective permissions an m2m change touches."""
+    User = get_user_model()  # crm.models re-exports auth's User under that name
+    label = through._meta.label
+    if label in ('crm.User_user_permissions', 'crm.User_groups'):
+        if not reverse:
+            return [instance.pk]
+        if pk_set is not None:
+            return list(pk_set)
+        related = 'user_permissions' if label == 'crm.User_user_permissions' else 'groups'
+        return list(User.objects.filter(**{related: instance}).values_list('pk', flat=True))
+    if label == 'auth.Group_permissions':
+        groups = [instance.pk] if not reverse else (
+            pk_set if pk_set is not None else instance.group_set.values_list('pk', flat=True))
+        return list(User.objects.filter(groups__in=list(groups)).values_list('pk', flat=True).distinct())
+    # crm.UserProfile_permissions
+    if not reverse:
+        return [instance.user_id]
+    profiles = UserProfile.objects.filter(pk__in=pk_set) if pk_set is not None \
+        else UserProfile.objects.filter(permissions=instance)
+    return list(profiles.values_list('user_id', flat=True))
+
+
+def permission_m2m_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Clears are caught before they happen, while the rows still say who is affected.
+    if action in ('post_add', 'post_remove', 'pre_clear'):
+        permissions.bump(*_users_for(sender, instance, reverse, pk_set))
+
+
+# Lazy 'app_label.Model' senders: the User through tables are not built yet
+# when this module is imported.
+for through in ('crm.User_user_permissions', 'crm.User_groups',
+                'auth.Group_permissions', 'crm.UserProfile_permissions'):
+    m2m_changed.connect(permission_m2m_changed, sender=through, dispatch_uid=f'permission_m2m_{through}')
+
+
+@receiver(post_save, sender=UserPermission, dispatch_uid='user_permission_post_save')
+@receiver(pre_delete, sender=UserPermission, dispatch_uid='user_permission_pre_delete')
+def user_permission_changed(sender, instance, **kwargs):
+    if instance.pk:
+        permissions.bump(*UserProfile.objects.filter(permissions=instance).values_list('user_id', flat=True))
+
+
+@receiver(post_save, sender=Permission, dispatch_uid='permission_catalog_post_save')
+@receiver(post_delete, sender=Permission, dispatch_uid='permission_catalog_post_delete')
+@receiver(post_migrate, dispatch_uid='permission_catalog_post_migrate')
+def permission_catalog_changed(sender, **kwargs):
+    permissions.clear_catalog()
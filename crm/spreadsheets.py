@@ -0,0 +1,52 @@
+import csv
+import io
+
+from openpyxl import load_workbook
+
+HEADER_SCAN_ROWS = 30  # exports often open with a title block before the header
+
+
+def iter_rows(fileobj, filename):
+    """Stream rows as value lists: CSV via csv.reader, XLSX via openpyxl's read-only mode."""
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else:
+        text = fileobj if isinstance(fileobj, io.TextIOBase) else io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+        yield from csv.reader(text)
+
+
+def header_map(row, columns, required):
+    """
+    {column: index} for a candidate header row, or None if any `required`
+    column is missing. `columns` maps each column to its accepted
+    spellings, compared lower-cased and stripped.
+    """
+    labels = [str(cell or '').strip().lower() for cell in row]
+    found = {}
+    for column, spellings in columns.items():
+        for index, label in enumerate(labels):
+            if label in spellings and index not in found.values():
+                found[column] = index
+                break
+    return found if set(required) <= found.keys() else None
+
+
+def iter_records(fileobj, filename, columns, required):
+    """
+    Yield (row number, {column: value}) for every row after the header,
+    which is found by its column names within the first HEADER_SCAN_ROWS.
+    """
+    found = None
+    for number, row in enumerate(iter_rows(fileobj, filename), start=1):
+        if found is None:
+            if number > HEADER_SCAN_ROWS:
+                break
+            found = header_map(row, columns, required)
+            continue
+        yield number, {name: row[index] if index < len(row) else None for name, index in found.items()}
+    if found is None:
+        raise ValueError(f"No header row with {', '.join(required)} columns found.")
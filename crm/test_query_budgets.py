@@ -0,0 +1,210 @@
+"""
+Query budgets for every route in crmproject/urls.py.
+
+Each URL is requested against a seeded dataset, the dataset is doubled,
+and the URL is requested again. The query count must be identical both
+times and within the route's budget, so a loop that queries per row
+fails here whatever the size of the test data.
+"""
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.urls import URLPattern
+from django.utils import timezone
+
+from crmproject import urls
+
+from . import permissions, seeding
+from .instrumentation import RequestStats
+from .management.commands.bench_create_quotation import quotation_post
+from .models import Client, Estimation, Invoice, Lead, ReportJob, UserProfile
+
+SEED_LEADS = 120
+USERS = 3
+
+
+def routes():
+    """Route strings of crmproject/urls.py (includes such as admin/ count once)."""
+    return {str(entry.pattern) for entry in urls.urlpatterns
+            if not isinstance(entry, URLPattern) or entry.callback.__module__ != 'django.views.static'}
+
+
+def add_users(count, start):
+    User = get_user_model()
+    for i in range(start, start + count):
+        user = User.objects.create_user(f"staff{i}", f"staff{i}@example.com", "pw")
+        UserProfile.objects.create(user=user, name=f"Staff {i}", email=user.email, role='User')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PDF_EXPORT_REQUEST_PROCESSES=1)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seeding.seed(SEED_LEADS, seed=11, index_search=True)
+        add_users(USERS, 0)
+        cls.admin = get_user_model().objects.create_superuser("budget", "budget@example.com", "pw")
+
+        # Fixed objects the URLs point at; growing the data never touches them.
+        cls.invoice = (Invoice.objects.filter(status='Partial Paid').order_by('pk').first()
+                       or Invoice.objects.order_by('pk').first())
+        cls.estimation = cls.invoice.estimation
+        cls.lead = cls.estimation.lead_no
+        cls.client_obj = cls.estimation.company_name
+        cls.pending = Estimation.objects.filter(status='Pending').order_by('pk').first()
+        cls.profile = UserProfile.objects.order_by('pk').first()
+        cls.job = ReportJob.objects.create(kind='report_xlsx', created_by=cls.admin, status='Done', filename='r.xlsx')
+        cls.job.result.save('r.xlsx', ContentFile(b'xlsx'), save=True)
+
+    def cases(self):
+        """
+        (route, label, method, path, data, budget) for every route. Budgets are
+        the measured counts: a change that adds a query has to raise one here.
+        """
+        est, pending, inv, lead, client = self.estimation, self.pending, self.invoice, self.lead, self.client_obj
+        today = timezone.localdate()
+        period = f"from_date={today - timedelta(days=365)}&to_date={today}"
+        # Keyset lists show an estimated total only on Postgres, via one EXPLAIN.
+        estimate = 1 if connection.vendor == 'postgresql' else 0
+        csv_upload = io.BytesIO(b"Company Name,GST No,Requirement\nNew Co,,Pumps\n")
+        csv_upload.name = "clients.csv"
+        return [
+            ('admin/', 'admin index', 'get', '/admin/', None, 3),
+            ('users/', 'user list', 'get', '/users/', None, 3),
+            ('users/create/', 'add user form', 'get', '/users/create/', None, 2),
+            ('create-user/', 'create user', 'post', '/create-user/',
+             {'username': 'newbie', 'password': 'pw', 'confirm_password': 'pw', 'role': 'User',
+              'permissions': ['crm.view_client']}, 12),
+            ('users/<int:pk>/edit/', 'edit user form', 'get', f'/users/{self.profile.user_id}/edit/', None, 6),
+            ('users/<int:user_id>/delete/', 'delete user', 'get', f'/users/{self.profile.pk}/delete/', None, 14),
+            ('get-permissions/', 'permissions json', 'get', '/get-permissions/?role=User', None, 3),
+            ('dashboard/', 'dashboard', 'get', '/dashboard/', None, 6),
+            ('search/', 'search json', 'get', f'/search/?q={client.company_name.split()[0]}', None, 4),
+            ('', 'login page', 'get', '/', None, 0),
+            ('login/', 'login page', 'get', '/login/', None, 0),
+            ('logout/', 'logout', 'get', '/logout/', None, 4),
+            ('client/', 'client list', 'get', '/client/', None, 3 + estimate),
+            ('client/', 'client search', 'get', f'/client/?q={client.company_name.split()[1]}', None, 3 + estimate),
+            ('client/add/', 'add client', 'post', '/client/add/',
+             {'company_name': 'Budget Co', 'type_of_company': 'LLP', 'gst_no': ''}, 5),
+            ('client/add/ajax/', 'add client (ajax)', 'post', '/client/add/ajax/',
+             {'company_name': 'Budget Co', 'type_of_company': 'LLP', 'gst_no': ''}, 3),
+            ('client/import/', 'import form', 'get', '/client/import/', None, 2),
+            ('client/import/', 'import upload', 'post', '/client/import/', {'file': csv_upload}, 22),
+            ('client/edit/<int:client_id>/', 'edit client form', 'get', f'/client/edit/{client.pk}/', None, 1),
+            ('client/edit/<int:client_id>/', 'edit client', 'post', f'/client/edit/{client.pk}/',
+             {'company_name': client.company_name, 'type_of_company': 'LLP', 'gst_no': client.gst_no or ''}, 4),
+            ('lead/', 'lead list', 'get', '/lead/', None, 4 + estimate),
+            ('lead/', 'lead search', 'get', f'/lead/?q={client.company_name.split()[0]}', None, 4 + estimate),
+            ('lead/create/', 'create lead', 'post', '/lead/create/',
+             {'company_name': client.pk, 'contact_person': 'A', 'mobile': '9', 'address': 'X', 'requirement': 'Y'}, 13),
+            ('lead/add/', 'create lead', 'post', '/lead/add/',
+             {'company_name': client.pk, 'contact_person': 'A', 'mobile': '9', 'address': 'X', 'requirement': 'Y'}, 13),
+            ('lead/edit/<int:pk>/', 'edit lead form', 'get', f'/lead/edit/{lead.pk}/', None, 4),
+            ('lead/edit/<int:pk>/', 'edit lead', 'post', f'/lead/edit/{lead.pk}/',
+             {'contact_person': 'B', 'email': '', 'mobile': '9', 'requirement': 'Z'}, 7),
+            ('invoice/approval/', 'invoice approvals', 'get', '/invoice/approval/', None, 4),
+            ('get-pending-lead/', 'pending lead json', 'get', f'/get-pending-lead/?client_id={client.pk}', None, 2),
+            ('get-pending-leads/', 'pending leads json', 'get', f'/get-pending-leads/?client_id={client.pk}', None, 1),
+            ('estimations/', 'estimation list', 'get', '/estimations/', None, 3 + estimate),
+            ('estimation/', 'estimation list', 'get', '/estimation/', None, 3 + estimate),
+            ('estimation/', 'follow-ups today', 'get', '/estimation/?follow_up=today', None, 3 + estimate),
+            ('create-quotation/', 'quotation form', 'get', '/create-quotation/', None, 5),
+            ('create-quotation/', 'create quotation', 'post', '/create-quotation/', quotation_post(client, 5), 16),
+            ('estimation/<int:pk>/edit/', 'edit quotation form', 'get', f'/estimation/{est.pk}/edit/', None, 7),
+            ('estimation/<int:pk>/approve/', 'approve form', 'get', f'/estimation/{pending.pk}/approve/', None, 3),
+            ('estimation/<int:pk>/approve/', 'approve', 'post', f'/estimation/{pending.pk}/approve/',
+             {'credit_days': '30', 'po_number': 'PO-1', 'po_date': str(today), 'po_received_date': str(today)}, 14),
+            ('estimation/<int:pk>/reject/', 'reject quotation', 'post', f'/estimation/{pending.pk}/reject/',
+             {'reason': 'Price'}, 14),
+            ('estimation/<int:pk>/status/<str:new_status>/', 'set status', 'get',
+             f'/estimation/{pending.pk}/status/Pending/', None, 7),
+            ('estimation/<int:pk>/lost/', 'mark lost', 'post', f'/estimation/{pending.pk}/lost/', {'reason': 'Price'}, 14),
+            ('estimation/<int:id>/review/', 'mark under review', 'post', f'/estimation/{pending.pk}/review/',
+             {'follow_up_date': str(today), 'follow_up_remarks': 'Call'}, 17),
+            ('estimation/view/<int:pk>/', 'quotation detail', 'get', f'/estimation/view/{est.pk}/', None, 4),
+            ('quotation/<int:pk>/pdf/', 'quotation pdf', 'get', f'/quotation/{est.pk}/pdf/', None, 3),
+            ('get-gst-no/', 'gst json', 'get', f'/get-gst-no/?client_id={client.pk}', None, 1),
+            ('invoice/', 'invoice page', 'get', '/invoice/', None, 2),
+            ('invoices/', 'invoice list', 'get', '/invoices/', None, 4),
+            ('invoice/view/<int:pk>/', 'invoice detail', 'get', f'/invoice/view/{est.pk}/', None, 5),
+            ('invoice/generate/<int:pk>/', 'generate invoice', 'post', f'/invoice/generate/{pending.pk}/', None, 17),
+            ('invoice/create/', 'create invoice page', 'get', '/invoice/create/', None, 2),
+            ('invoice/create/<int:estimation_id>/', 'create invoice page', 'get', f'/invoice/create/{est.pk}/', None, 2),
+            ('invoice/<int:pk>/update-payment-status/', 'payment status', 'post',
+             f'/invoice/{inv.pk}/update-payment-status/', {'payment_status': 'Pending'}, 6),
+            ('invoice/<int:invoice_id>/logs/', 'payment log page', 'get', f'/invoice/{inv.pk}/logs/', None, 4),
+            ('invoices/pdf/<int:invoice_id>/', 'invoice pdf', 'get', f'/invoices/pdf/{inv.pk}/', None, 2),
+            ('invoices/approve/<int:est_id>/', 'approve invoice', 'post', f'/invoices/approve/{pending.pk}/', None, 46),
+            ('invoices/reject/<int:pk>/', 'reject invoice', 'post', f'/invoices/reject/{inv.pk}/', {'reason': 'x'}, 31),
+            ('api/invoice/<int:invoice_id>/logs/', 'payment logs json', 'get', f'/api/invoice/{inv.pk}/logs/', None, 2),
+            ('confirm-payment/<int:invoice_id>/', 'confirm payment', 'post', f'/confirm-payment/{inv.pk}/',
+             {'amount_paid': '1.00', 'utr_number': 'BUDGET1', 'payment_date': str(today)}, 16),
+            ('confirm-payment/', 'confirm payment (form field)', 'post', '/confirm-payment/',
+             {'invoice_id': inv.pk, 'amount_paid': '1.00', 'utr_number': 'BUDGET2', 'payment_date': str(today)}, 16),
+            ('reports/', 'report list', 'get', '/reports/', None, 4),
+            ('reports/', 'report list, one year', 'get', f'/reports/?{period}', None, 4),
+            ('reports/export/excel/', 'excel export', 'get', f'/reports/export/excel/?{period}', None, 3),
+            ('reports/export/csv/', 'csv export', 'get', f'/reports/export/csv/?{period}', None, 3),
+            ('reports/export/pdf/', 'pdf report', 'get', f'/reports/export/pdf/?{period}', None, 1),
+            ('reports/export/pdfs/', 'pdf zip', 'get', f'/reports/export/pdfs/?kind=invoice&lead_no={lead.pk}', None, 5),
+            ('reports/jobs/', 'enqueue job', 'post', '/reports/jobs/', {'kind': 'report_xlsx'}, 3),
+            ('reports/jobs/<int:job_id>/', 'job status', 'get', f'/reports/jobs/{self.job.pk}/', None, 3),
+            ('reports/jobs/<int:job_id>/download/', 'job download', 'get',
+             f'/reports/jobs/{self.job.pk}/download/', None, 3),
+            ('purchase-order/', 'purchase orders', 'get', '/purchase-order/', None, 2),
+            ('bill/', 'bills', 'get', '/bill/', None, 2),
+            ('vendor/', 'vendors', 'get', '/vendor/', None, 2),
+            ('profile/', 'profile', 'get', '/profile/', None, 2),
+        ]
+
+    def count_queries(self, method, path, data):
+        """Queries for one request, its body read to the end, with everything it wrote rolled back."""
+        cache.clear()
+        permissions.clear_catalog()  # loaded once per process; measure every request cold
+        shutil.rmtree(os.path.join(settings.MEDIA_ROOT, 'pdf_cache'), ignore_errors=True)  # render every time
+        for value in (data or {}).values():
+            if hasattr(value, 'seek'):
+                value.seek(0)
+        with transaction.atomic():
+            self.client.force_login(self.admin)
+            stats = RequestStats(settings.REQUEST_REPEATED_QUERY_THRESHOLD)
+            with connection.execute_wrapper(stats):
+                response = getattr(self.client, method)(path, data or {})
+                if response.streaming:
+                    b"".join(response.streaming_content)
+            transaction.set_rollback(True)
+        self.assertLess(response.status_code, 500, path)
+        return stats
+
+    def measure(self):
+        return {(route, label): self.count_queries(method, path, data)
+                for route, label, method, path, data, _budget in self.cases()}
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual(routes() - {case[0] for case in self.cases()}, set())
+
+    def test_query_counts_are_within_budget_and_do_not_grow_with_the_data(self):
+        budgets = {(route, label): budget for route, label, _m, _p, _d, budget in self.cases()}
+        before = self.measure()
+
+        seeding.seed(SEED_LEADS, seed=12, index_search=True)
+        add_users(USERS, USERS)
+        self.assertGreaterEqual(Lead.objects.count(), 2 * SEED_LEADS)
+        self.assertGreater(Client.objects.count(), SEED_LEADS // seeding.LEADS_PER_CLIENT)
+        after = self.measure()
+
+        for key, stats in after.items():
+            with self.subTest(route=key[0], request=key[1]):
+                repeated = "; ".join(f"{count}x at {site}" for count, _sql, site in stats.repeated())
+                self.assertEqual(stats.queries, before[key].queries,
+                                 f"query count grew with the data ({repeated or 'no repeated statement'})")
+                self.assertLessEqual(stats.queries, budgets[key], repeated)
@@ -1,3 +1,1591 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import QuerySet, Sum
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, QueryDict, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+
+from .models import (
+    Client, Lead, Estimation, EstimationItem, EstimationSettings, Invoice, PaymentLog, ReportJob,
+    DashboardSnapshot, DefaultTerms, SearchDocument, UserPermission, UserProfile,
+)
+from . import attachments, bank_import, batch, crm_import, dashboard, invoices, jobs, leads, orphans, payments, pdf, pdf_cache, permissions, search, seeding, sequences
+from .estimation_items import parse_items
+from .instrumentation import QueryInstrumentationMiddleware
+from .pagination import KeysetPaginator
+from .management.commands import bench_views, run_report_worker
+from .management.commands.bench_create_quotation import quotation_post
+from .reports import (
+    report_page, report_queryset, iter_report_rows,
+    stream_report_csv, write_report_xlsx, filter_invoices,
+)
+
+
+def make_lead_graph(client, n, invoiced=True):
+    """Create `n` leads, each with one estimation and (optionally) one invoice."""
+    leads = []
+    for i in range(n):
+        lead = Lead.objects.create(
+            lead_no=f"T-{Lead.objects.count() + 1:05d}",
+            company_name=client,
+            contact_person="Test",
+            mobile="9999999999",
+            address="Addr",
+            requirement=f"Requirement {i}",
+        )
+        estimation = Estimation.objects.create(
+            quote_no=f"Q-{lead.lead_no}",
+            lead_no=lead,
+            company_name=client,
+            validity_days=30,
+            billing_address="Addr",
+            shipping_address="Addr",
+            sub_total=Decimal("100.00"),
+            discount=Decimal("0.00"),
+            gst_amount=Decimal("18.00"),
+            total=Decimal("118.00"),
+        )
+        if invoiced:
+            Invoice.objects.create(
+                estimation=estimation,
+                invoice_no=f"INV-{lead.lead_no}",
+                total_value=Decimal("118.00"),
+                balance_due=Decimal("18.00"),
+                status="Partial Paid",
+            )
+        leads.append(lead)
+    return leads
+
+
+class ReportEngineTests(TestCase):
+    def setUp(self):
+        self.client_obj = Client.objects.create(company_name="Acme", type_of_company="Pvt")
+
+    def test_row_shape(self):
+        make_lead_graph(self.client_obj, 1)
+        make_lead_graph(self.client_obj, 1, invoiced=False)
+
+        rows = list(iter_report_rows(report_queryset()))
+        self.assertEqual(len(rows), 2)
+
+        invoiced = next(r for r in rows if r['invoice_no'])
+        self.assertEqual(invoiced['client'], "Acme")
+        self.assertEqual(invoiced['estimation_no'], "Q-T-00001")
+        self.assertEqual(invoiced['invoice_amount'], Decimal("118.00"))
+        self.assertEqual(invoiced['paid_amount'], Decimal("100.00"))
+        self.assertEqual(invoiced['payment_status'], "Partial Paid")
+
+        pending = next(r for r in rows if not r['invoice_no'])
+        self.assertEqual(pending['invoice_amount'], '')
+        self.assertEqual(pending['payment_status'], '')
+
+    def test_page_query_count_is_constant(self):
+        make_lead_graph(self.client_obj, 25)
+        # COUNT(*) + one page SELECT, no per-lead lookups.
+        with self.assertNumQueries(2):
+            page = report_page(page_number=1)
+        self.assertEqual(len(page.object_list), 20)
+
+        make_lead_graph(self.client_obj, 25)
+        with self.assertNumQueries(2):
+            page = report_page(page_number=2)
+        self.assertEqual(len(page.object_list), 20)
+
+
+class ReportExportTests(TestCase):
+    def setUp(self):
+        self.client_obj = Client.objects.create(company_name="Acme", type_of_company="Pvt")
+        make_lead_graph(self.client_obj, 3)
+
+    def test_csv_stream(self):
+        lines = list(stream_report_csv(report_queryset()))
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith("Lead No,Lead Date,Client"))
+
+    def test_xlsx_write_only(self):
+        with write_report_xlsx(report_queryset()) as fh:
+            ws = load_workbook(fh, read_only=True).active
+            rows = list(ws.iter_rows(values_only=True))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][10], 118.0)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ReportJobTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("rep", password="pw")
+        make_lead_graph(Client.objects.create(company_name="Acme", type_of_company="Pvt"), 2)
+
+    def test_enqueue_drops_unknown_params(self):
+        job = jobs.enqueue('report_xlsx', {'from_date': '2020-01-01', 'evil': 'x'}, user=self.user)
+        self.assertEqual(job.params, {'from_date': '2020-01-01'})
+        with self.assertRaises(ValueError):
+            jobs.enqueue('nope', {})
+
+    def test_claim_is_exclusive(self):
+        first = jobs.enqueue('report_xlsx', {})
+        second = jobs.enqueue('report_xlsx', {})
+        self.assertEqual(jobs.claim_jobs(1), [first.id])
+        self.assertEqual(jobs.claim_jobs(5), [second.id])
+        self.assertEqual(jobs.claim_jobs(5), [])
+        self.assertEqual(ReportJob.objects.get(pk=first.id).attempts, 1)
+
+    def test_stale_jobs_are_requeued_until_out_of_attempts(self):
+        job = jobs.enqueue('report_xlsx', {})
+        jobs.claim_jobs(1)
+        self.assertEqual(jobs.requeue_stale_jobs(minutes=5, max_attempts=2), (0, 0))  # heartbeat is fresh
+
+        stale = timezone.now() - timedelta(minutes=10)
+        ReportJob.objects.filter(pk=job.pk).update(heartbeat_at=stale)
+        jobs.heartbeat([job.pk])  # a live worker keeps a long render from going stale
+        self.assertEqual(jobs.requeue_stale_jobs(minutes=5, max_attempts=2), (0, 0))
+
+        ReportJob.objects.filter(pk=job.pk).update(heartbeat_at=stale)
+        self.assertEqual(jobs.requeue_stale_jobs(minutes=5, max_attempts=2), (1, 0))
+        jobs.claim_jobs(1)
+        ReportJob.objects.filter(pk=job.pk).update(heartbeat_at=stale)
+        self.assertEqual(jobs.requeue_stale_jobs(minutes=5, max_attempts=2), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('Failed', 2))
+
+    def test_run_job_stores_result(self):
+        job = jobs.enqueue('report_xlsx', {}, user=self.user)
+        jobs.claim_jobs(1)
+        self.assertEqual(jobs.run_job(job.id), 'Done')
+
+        job.refresh_from_db()
+        self.assertEqual(job.filename, "CRM_Complete_Report.xlsx")
+        with job.result.open('rb') as fh:
+            self.assertEqual(len(list(load_workbook(fh, read_only=True).active.iter_rows())), 3)
+
+    def test_run_job_records_failure(self):
+        job = jobs.enqueue('invoice_pdf', {'invoice_id': 999999})
+        jobs.claim_jobs(1)
+        self.assertEqual(jobs.run_job(job.id), 'Failed')
+        job.refresh_from_db()
+        self.assertIn("DoesNotExist", job.error)
+
+    def test_run_job_does_not_overwrite_a_job_taken_from_it(self):
+        job = jobs.enqueue('report_xlsx', {})
+        jobs.claim_jobs(1)
+        real_renderer = jobs.RENDERERS['report_xlsx']
+
+        def requeued_and_reclaimed(params):
+            # The stale sweep hands the job to another worker mid-render.
+            ReportJob.objects.filter(pk=job.pk).update(status='Pending')
+            jobs.claim_jobs(1)
+            return real_renderer(params)
+
+        def stored():
+            storage = job.result.storage
+            return set(storage.listdir('report_jobs')[1]) if storage.exists('report_jobs') else set()
+
+        before = stored()
+        with mock.patch.dict(jobs.RENDERERS, {'report_xlsx': requeued_and_reclaimed}):
+            self.assertEqual(jobs.run_job(job.id), 'Superseded')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.result.name), ('Running', 2, ''))
+        self.assertEqual(stored(), before)  # the orphaned file was deleted
+
+    def test_worker_requeues_jobs_and_replaces_a_broken_pool(self):
+        class FakePool:
+            def __init__(self, broken):
+                self.broken = broken
+
+            def submit(self, fn, *args):
+                future = Future()
+                if self.broken:  # a child died: every job in the pool is lost
+                    future.set_exception(BrokenProcessPool("child terminated"))
+                else:
+                    future.set_result(fn(*args))
+                return future
+
+            def shutdown(self, wait=True, cancel_futures=False):
+                pass
+
+        first, second = jobs.enqueue('report_xlsx', {}), jobs.enqueue('report_xlsx', {})
+        pools = iter([FakePool(broken=True), FakePool(broken=False)])
+        out = io.StringIO()
+        with mock.patch.object(run_report_worker.Command, 'start_pool', side_effect=lambda processes: next(pools)), \
+                mock.patch.object(run_report_worker, 'connections'):
+            call_command('run_report_worker', '--once', '--processes', '2', '--poll', '0', stdout=out)
+
+        self.assertIn("[BROKEN] a worker process died; 2 jobs requeued, 0 failed", out.getvalue())
+        for job in (first, second):
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ('Done', 2))
+
+        job = jobs.enqueue('report_xlsx', {})
+        jobs.claim_jobs(1)
+        self.assertEqual(jobs.requeue_jobs([job.pk], max_attempts=1), (0, 1))  # out of attempts
+
+    def test_endpoints(self):
+        self.client.force_login(self.user)
+        resp = self.client.post('/reports/jobs/', {'kind': 'report_xlsx'})
+        self.assertEqual(resp.status_code, 202)
+        job_id = resp.json()['id']
+
+        self.assertEqual(self.client.get(f'/reports/jobs/{job_id}/download/').status_code, 409)
+        jobs.claim_jobs(1)
+        jobs.run_job(job_id)
+
+        status = self.client.get(f'/reports/jobs/{job_id}/').json()
+        self.assertEqual(status['status'], 'Done')
+        resp = self.client.get(status['download_url'])
+        self.assertEqual(resp.status_code, 200)
+        # Consume rather than close(): the client's wrapper then finishes the
+        # request without closing the test's database connection.
+        self.assertTrue(b"".join(resp.streaming_content))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PDF_CACHE_MAX_BYTES=10 * 1024 * 1024)
+class PDFCacheTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("pdf", password="pw")
+        self.client.force_login(self.user)
+        lead = make_lead_graph(Client.objects.create(company_name="Acme", type_of_company="Pvt"), 1)[0]
+        self.estimation = Estimation.objects.get(lead_no=lead)
+        self.estimation.items.create(
+            item_details="Camera", quantity=2, rate=Decimal("50.00"),
+            tax=Decimal("18.00"), amount=Decimal("118.00"),
+        )
+        self.url = f"/quotation/{self.estimation.pk}/pdf/"
+
+    def test_hit_skips_render_and_revalidates(self):
+        with mock.patch("crm.views.render_quotation_pdf", return_value=b"%PDF-1") as render:
+            first = self.client.get(self.url)
+            second = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first.content, b"%PDF-1")
+        self.assertEqual(b"".join(second.streaming_content), b"%PDF-1")
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_inputs_change_key(self):
+        first = self.client.get(self.url, HTTP_IF_NONE_MATCH="x")["ETag"]
+
+        item = self.estimation.items.get()
+        item.quantity = 3
+        item.save()
+        after_item = self.client.get(self.url)["ETag"]
+        self.assertNotEqual(first, after_item)
+
+        DefaultTerms.objects.create(content="New terms")
+        self.assertNotEqual(after_item, self.client.get(self.url)["ETag"])
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())  # its re-rendered PDF must not be a hit elsewhere
+    def test_file_evicted_after_lookup_is_rendered_again(self):
+        real_get_cached = pdf_cache.get_cached
+
+        def evicted_in_the_gap(key):
+            path = real_get_cached(key)
+            if path:
+                os.remove(path)  # another request's eviction wins the race
+            return path
+
+        with mock.patch("crm.views.render_quotation_pdf", return_value=b"%PDF-1") as render:
+            self.client.get(self.url)
+            with mock.patch("crm.pdf_cache.get_cached", side_effect=evicted_in_the_gap):
+                response = self.client.get(self.url)
+        self.assertEqual((response.status_code, response.content), (200, b"%PDF-1"))
+        self.assertEqual(render.call_count, 2)
+
+    def test_lru_eviction(self):
+        with override_settings(PDF_CACHE_MAX_BYTES=250):
+            pdf_cache.store("a" * 64, b"x" * 100)
+            pdf_cache.store("b" * 64, b"x" * 100)
+            os.utime(pdf_cache.cache_path("a" * 64), (1, 1))  # make "a" the oldest
+            pdf_cache.store("c" * 64, b"x" * 100)
+
+        self.assertIsNone(pdf_cache.get_cached("a" * 64))
+        self.assertIsNotNone(pdf_cache.get_cached("b" * 64))
+        self.assertIsNotNone(pdf_cache.get_cached("c" * 64))
+
+    def test_store_scans_only_when_over_the_limit(self):
+        with override_settings(PDF_CACHE_MAX_BYTES=10_000), mock.patch("crm.pdf_cache.os.walk",
+                                                                       wraps=os.walk) as walk:
+            pdf_cache.store("d" * 64, b"x" * 100)  # first store in the process learns the size
+            scans = walk.call_count
+            for key in "efg":
+                pdf_cache.store(key * 64, b"x" * 100)
+            self.assertEqual(walk.call_count, scans)
+            pdf_cache.store("h" * 64, b"x" * 10_000)
+            self.assertGreater(walk.call_count, scans)
+
+
+class LocalURLFetcherTests(TestCase):
+    def test_static_urls_read_from_disk(self):
+        with mock.patch("crm.pdf.default_url_fetcher") as remote:
+            relative = pdf.local_url_fetcher("http://127.0.0.1:8000/static/images/logo.png")
+            production = pdf.local_url_fetcher(
+                "https://www.crm.isecuresolutions.in/static/images/logo.png"
+            )
+        remote.assert_not_called()
+        self.assertEqual(relative["mime_type"], "image/png")
+        self.assertTrue(relative["string"].startswith(b"\x89PNG"))
+        self.assertIs(relative["string"], production["string"])  # served from the in-memory cache
+
+    def test_media_urls_read_from_disk(self):
+        media_root = tempfile.mkdtemp()
+        with open(os.path.join(media_root, "sig.png"), "wb") as fh:
+            fh.write(b"png-bytes")
+        with override_settings(MEDIA_ROOT=media_root):
+            result = pdf.local_url_fetcher("http://127.0.0.1:8000/media/sig.png")
+        self.assertEqual(result["string"], b"png-bytes")
+
+    def test_missing_or_escaping_paths_do_not_hit_network(self):
+        with mock.patch("crm.pdf.default_url_fetcher") as remote:
+            for url in ("http://127.0.0.1:8000/static/nope.png",
+                        "http://127.0.0.1:8000/static/../../etc/passwd"):
+                with self.assertRaises(ValueError):
+                    pdf.local_url_fetcher(url)
+        remote.assert_not_called()
+
+    def test_renders_share_one_font_configuration(self):
+        with mock.patch("crm.pdf.HTML") as html:
+            pdf.render_report_pdf([])
+            pdf.render_report_pdf([])
+        first, second = (call.kwargs["font_config"] for call in html.return_value.write_pdf.call_args_list)
+        self.assertIs(first, second)
+
+    def test_other_hosts_use_default_fetcher(self):
+        with mock.patch("crm.pdf.default_url_fetcher", return_value={"string": b""}) as remote:
+            pdf.local_url_fetcher("https://fonts.example.com/font.woff")
+        remote.assert_called_once()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PDF_EXPORT_REQUEST_PROCESSES=1)
+class BatchPDFExportTests(TestCase):
+    def setUp(self):
+        self.acme = Client.objects.create(company_name="Acme", type_of_company="Pvt")
+        other = Client.objects.create(company_name="Other", type_of_company="Pvt")
+        make_lead_graph(self.acme, 3)
+        make_lead_graph(other, 2)
+
+    def test_filters_match_invoice_report(self):
+        params = {'company': str(self.acme.id)}
+        self.assertEqual(len(batch.document_ids('invoice', params)), 3)
+        self.assertEqual(len(batch.document_ids('quotation', params)), 3)
+        self.assertEqual(len(batch.document_ids('invoice', {})), 5)
+
+    def test_stream_zip_endpoint(self):
+        self.client.force_login(get_user_model().objects.create_user("zip", password="pw"))
+        resp = self.client.get('/reports/export/pdfs/', {'kind': 'invoice', 'company': self.acme.id})
+        self.assertEqual(resp["Content-Type"], "application/zip")
+
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(resp.streaming_content)))
+        self.assertEqual(
+            sorted(archive.namelist()),
+            ["INV-T-00001.pdf", "INV-T-00002.pdf", "INV-T-00003.pdf"],
+        )
+        self.assertIsNone(archive.testzip())
+
+    def test_request_exports_share_one_pool_per_process(self):
+        with override_settings(PDF_EXPORT_REQUEST_PROCESSES=4), \
+                mock.patch("crm.batch.iter_rendered",
+                           side_effect=lambda kind, ids, processes=1: iter([("a.pdf", b"")])) as rendered:
+            first = batch.iter_rendered_for_request('invoice', [1])
+            next(first)  # holds the pool until the stream is closed
+            list(batch.iter_rendered_for_request('invoice', [2]))
+            first.close()
+            list(batch.iter_rendered_for_request('invoice', [3]))
+        self.assertEqual([call.kwargs.get('processes', 1) for call in rendered.call_args_list], [4, 1, 4])
+
+    def test_duplicate_names_are_kept(self):
+        buf = io.BytesIO()
+        list(batch.write_zip([("a.pdf", b"1"), ("a.pdf", b"2")], buf))
+        self.assertEqual(zipfile.ZipFile(buf).namelist(), ["a.pdf", "a (2).pdf"])
+
+    def test_command_writes_zip(self):
+        output = os.path.join(tempfile.mkdtemp(), "q.zip")
+        call_command('export_pdfs', 'quotation', output=output, processes=1, stdout=io.StringIO())
+        self.assertEqual(len(zipfile.ZipFile(output).namelist()), 5)
+
+
+class DashboardSnapshotTests(TestCase):
+    def setUp(self):
+        self.acme = Client.objects.create(company_name="Acme", type_of_company="Pvt")
+
+    def assertSnapshotMatchesFacts(self):
+        self.assertEqual(dashboard.reconcile(dry_run=True), {})
+
+    def test_migration_backfills_all_time_figures(self):
+        make_lead_graph(self.acme, 2)
+        DashboardSnapshot.objects.all().delete()  # as on a database that predates the snapshot
+        importlib.import_module('crm.migrations.0005_dashboardsnapshot').backfill_snapshot(django_apps, None)
+        figures = dashboard.figures()
+        self.assertEqual((figures['total_leads'], figures['total_invoices']), (2, 2))
+
+    def test_daily_rollup_migration_rebuilds_dated_cells(self):
+        make_lead_graph(self.acme, 2)
+        DashboardSnapshot.objects.filter(day__isnull=False).update(day=date(2000, 1, 1))  # old month buckets
+        importlib.import_module('crm.migrations.0006_dashboard_daily_rollups').rebuild_daily_buckets(django_apps, None)
+        self.assertSnapshotMatchesFacts()
+        today = timezone.localdate()
+        self.assertEqual(dashboard.figures((today, today))['total_invoices'], 2)
+
+    def test_signals_keep_snapshot_in_sync(self):
+        leads = make_lead_graph(self.acme, 3)
+        invoice = Invoice.objects.first()
+        PaymentLog.objects.create(
+            invoice=invoice, amount_paid=Decimal("50.00"), utr_number="UTR1",
+            payment_date=date(2025, 1, 5), status="Partial Paid",
+        )
+        self.assertSnapshotMatchesFacts()
+
+        invoice.status = "Paid"
+        invoice.balance_due = Decimal("0.00")
+        invoice.save()
+        estimation = Estimation.objects.last()
+        estimation.status = "Lost"
+        estimation.save()
+        self.assertSnapshotMatchesFacts()
+
+        leads[0].delete()  # cascades to its estimation and invoice
+        self.assertSnapshotMatchesFacts()
+
+        stats = dashboard.figures()
+        self.assertEqual(stats["total_leads"], 2)
+        self.assertEqual(stats["total_invoices"], 2)
+        self.assertEqual(stats["total_invoiced"], Decimal("236.00"))
+
+    def test_reconcile_repairs_drift(self):
+        make_lead_graph(self.acme, 2)
+        Invoice.objects.update(balance_due=0)  # bypasses signals
+        self.assertNotEqual(dashboard.reconcile(), {})
+        self.assertSnapshotMatchesFacts()
+        self.assertEqual(dashboard.figures()["balance_due"], 0)
+
+    def test_period_range(self):
+        today = date(2025, 5, 20)
+        self.assertEqual(dashboard.period_range("this_month", today), (date(2025, 5, 1), today))
+        self.assertEqual(
+            dashboard.period_range("previous_quarter", today),
+            (date(2025, 1, 1), date(2025, 3, 31)),
+        )
+        self.assertEqual(
+            dashboard.period_range("previous_month", date(2025, 3, 10)),
+            (date(2025, 2, 1), date(2025, 2, 28)),
+        )
+        self.assertEqual(
+            dashboard.period_range("custom", today, start="2025-04-30", end="2025-04-02"),
+            (date(2025, 4, 2), date(2025, 4, 30)),
+        )
+        self.assertIsNone(dashboard.period_range("custom", today, start="2025-04-02", end=""))
+        self.assertIsNone(dashboard.period_range("custom", today, start="garbage", end="2025-04-02"))
+        self.assertIsNone(dashboard.period_range("all", today))
+
+    def test_figures_sum_daily_rollups(self):
+        leads = make_lead_graph(self.acme, 3)
+        Lead.objects.filter(pk=leads[0].pk).update(date=date(2025, 1, 15))
+        Estimation.objects.filter(lead_no=leads[0]).update(quote_date=date(2025, 1, 15))
+        Lead.objects.filter(pk=leads[1].pk).update(date=date(2025, 2, 3))
+        Estimation.objects.filter(lead_no=leads[1]).update(quote_date=date(2025, 2, 3))
+        PaymentLog.objects.create(
+            invoice=Invoice.objects.first(), amount_paid=Decimal("40.00"), utr_number="UTR2",
+            payment_date=date(2025, 1, 20), status="Paid",
+        )
+        dashboard.reconcile()  # backfill after the signal-bypassing updates
+
+        january = dashboard.figures((date(2025, 1, 1), date(2025, 1, 31)))
+        self.assertEqual(january["total_leads"], 1)
+        self.assertEqual(january["total_quotations"], 1)
+        self.assertEqual(january["paid"], Decimal("40.00"))
+        self.assertEqual(january["total_invoices"], 0)  # invoices are dated by created_at
+
+        custom = dashboard.figures((date(2025, 1, 16), date(2025, 2, 3)))
+        self.assertEqual(custom["total_leads"], 1)
+        self.assertEqual(custom["quotation_status"], [{"status": "Pending", "count": 1}])
+        self.assertEqual(dashboard.figures()["total_leads"], 3)
+
+    def test_dashboard_query_count_is_constant(self):
+        user = get_user_model().objects.create_user("dash", password="pw")
+        self.client.force_login(user)
+        make_lead_graph(self.acme, 5)
+        cache.clear()
+        # session, user, permission set, figures, top clients (2), template perms (2)
+        with self.assertNumQueries(8):
+            self.client.get('/dashboard/')
+        make_lead_graph(Client.objects.create(company_name="B", type_of_company="Pvt"), 10)
+        with self.assertNumQueries(7):  # permission set now comes from the cache
+            resp = self.client.get('/dashboard/?date_filter=this_year')
+        self.assertEqual(resp.context["total_leads"], 15)
+
+
+class LeadStatusTests(TestCase):
+    def setUp(self):
+        self.acme = Client.objects.create(company_name="Acme", type_of_company="Pvt")
+
+    def test_estimation_saves_keep_computed_status_current(self):
+        lead = make_lead_graph(self.acme, 1, invoiced=False)[0]
+        lead.refresh_from_db()
+        self.assertEqual(lead.computed_status, "Quoted")
+
+        estimation = Estimation.objects.get(lead_no=lead)
+        estimation.status = "Invoiced"
+        estimation.save()
+        lead.refresh_from_db()
+        self.assertEqual(lead.computed_status, "Won")
+
+        estimation.delete()
+        lead.refresh_from_db()
+        self.assertEqual(lead.computed_status, "Pending")
+
+    def test_moving_a_quotation_refreshes_both_leads(self):
+        old_lead, new_lead = make_lead_graph(self.acme, 2, invoiced=False)
+        Estimation.objects.filter(lead_no=new_lead).delete()
+        estimation = Estimation.objects.get(lead_no=old_lead)
+        estimation.lead_no = new_lead
+        estimation.save()
+
+        old_lead.refresh_from_db()
+        new_lead.refresh_from_db()
+        self.assertEqual((old_lead.computed_status, new_lead.computed_status), ("Pending", "Quoted"))
+
+    def test_refresh_command_fixes_stale_rows(self):
+        make_lead_graph(self.acme, 3, invoiced=False)
+        Estimation.objects.update(status="Lost")  # bypasses signals
+        call_command('refresh_lead_status', stdout=io.StringIO())
+        self.assertEqual(set(Lead.objects.values_list("computed_status", flat=True)), {"Lost"})
+        self.assertEqual(leads.refresh_computed_status(), 0)
+
+    def test_lead_list_never_writes(self):
+        user = get_user_model().objects.create_user("leads", password="pw")
+        self.client.force_login(user)
+        make_lead_graph(self.acme, 12, invoiced=False)
+        Estimation.objects.filter(lead_no__in=Lead.objects.order_by('-id')[:2]).update(status="Approved")
+
+        # session, user, page (with status subquery), clients, template perms (2);
+        # Postgres adds an EXPLAIN for the estimated total
+        with self.assertNumQueries(7 if connection.vendor == 'postgresql' else 6):
+            resp = self.client.get('/lead/')
+        page = list(resp.context["leads"])
+        self.assertEqual(len(page), 10)
+        self.assertEqual([lead.current_status for lead in page[:3]], ["Won", "Won", "Quoted"])
+
+
+class DocumentSequenceTests(TestCase):
+    def test_numbers_follow_settings_and_reset_per_period(self):
+        EstimationSettings.objects.create(prefix="QT", frequency="monthly")
+        self.assertEqual(sequences.next_number('quotation', date(2025, 3, 9)), "QT-202503-0001")
+        self.assertEqual(sequences.next_number('quotation', date(2025, 3, 31)), "QT-202503-0002")
+        self.assertEqual(sequences.next_number('quotation', date(2025, 4, 1)), "QT-202504-0001")
+        self.assertEqual(sequences.next_number('invoice', date(2025, 4, 1)), "INV-20250401-001")
+
+    def test_quotations_default_to_one_series_from_next_number(self):
+        self.assertEqual(sequences.next_number('quotation'), "EST-0001")
+        settings = EstimationSettings.objects.create(prefix="EST", next_number=57)
+        self.assertEqual(sequences.next_number('quotation'), "EST-0057")
+        self.assertEqual(sequences.next_number('quotation', date(2030, 1, 1)), "EST-0058")
+        settings.next_number = 100  # raised in the admin: skip ahead, never back
+        settings.save()
+        self.assertEqual(sequences.next_number('quotation'), "EST-0100")
+
+    def test_new_sequence_continues_after_existing_documents(self):
+        acme = Client.objects.create(company_name="Acme", type_of_company="Pvt")
+        Lead.objects.create(lead_no="#0041", company_name=acme, contact_person="A",
+                            mobile="1", address="Addr", requirement="R")
+        lead = Lead.objects.create(company_name=acme, contact_person="B",
+                                   mobile="1", address="Addr", requirement="R")
+        self.assertEqual(lead.lead_no, "#0042")
+
+    def test_reserve_block(self):
+        block = sequences.reserve('invoice', 5, today=date(2025, 1, 2))
+        self.assertEqual(block[0], "INV-20250102-001")
+        self.assertEqual(block[-1], "INV-20250102-005")
+        self.assertEqual(sequences.next_number('invoice', date(2025, 1, 2)), "INV-20250102-006")
+        with self.assertRaises(ValueError):
+            sequences.reserve('receipt')
+
+
+class DocumentSequenceConcurrencyTests(TransactionTestCase):
+    def test_concurrent_allocation_never_duplicates(self):
+        # Shared-cache in-memory SQLite fails fast on table locks instead of
+        # waiting; settings give SQLite a file-backed test database for this.
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("needs a database with real lock waits")
+        threads, per_thread = 8, 25
+        issued = []
+        errors = []
+        lock = threading.Lock()
+        start = threading.Barrier(threads)
+
+        def worker(block_size):
+            try:
+                start.wait()
+                for _ in range(per_thread):
+                    numbers = sequences.reserve('invoice', block_size, today=date(2025, 6, 1))
+                    with lock:
+                        issued.extend(numbers)
+            except Exception as exc:  # surfaced in the main thread below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        pool = [threading.Thread(target=worker, args=(1 + i % 3,)) for i in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+
+        self.assertEqual(errors, [])
+        expected = sum(per_thread * (1 + i % 3) for i in range(threads))
+        self.assertEqual(len(issued), expected)
+        self.assertEqual(len(set(issued)), expected)
+        self.assertEqual(
+            sorted(issued),
+            [f"INV-20250601-{n:03d}" for n in range(1, expected + 1)],
+        )
+
+
+class CreateQuotationItemsTests(TestCase):
+    def setUp(self):
+        self.acme = Client.objects.create(company_name="Acme", type_of_company="Pvt")
+
+    def post(self, lines, **overrides):
+        data = quotation_post(self.acme, lines)
+        data.update(overrides)
+        return self.client.post('/create-quotation/', data)
+
+    def test_parse_items_skips_blank_lines(self):
+        post = QueryDict(mutable=True)
+        post.setlist('item_details[]', ["Cable", "", "Switch"])
+        post.setlist('quantity[]', ["2", "", "1"])
+        post.setlist('rate[]', ["10.50", "", "99"])
+        post.setlist('tax[]', ["18", "", "18"])
+        post.setlist('amount[]', ["24.78", "", "116.82"])
+        rows = parse_items(post)
+        self.assertEqual([r.item_details for r in rows], ["Cable", "Switch"])
+        self.assertEqual(rows[0].rate, Decimal("10.50"))
+
+        post.setlist('quantity[]', ["2", "", "one"])
+        with self.assertRaisesMessage(ValueError, "Line 3"):
+            parse_items(post)
+
+    def test_items_are_bulk_inserted(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.post(600).status_code, 302)
+        self.assertEqual(Estimation.objects.get().items.count(), 600)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "crm_estimationitem"')]
+        # a handful of batched INSERTs (SQLite caps rows per statement), not 600
+        self.assertLessEqual(len(inserts), 6)
+
+    def test_failed_item_rolls_back_the_quotation(self):
+        data = quotation_post(self.acme, 3)
+        data['quantity[]'] = ['1', '-5', '1']  # violates the PositiveIntegerField check
+        response = self.client.post('/create-quotation/', data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Something went wrong", response.context["error"])
+        self.assertFalse(Estimation.objects.exists())
+
+
+class EditEstimationTests(TestCase):
+    def setUp(self):
+        acme = Client.objects.create(company_name="Acme", type_of_company="Pvt")
+        self.client.post('/create-quotation/', quotation_post(acme, 3))
+        self.estimation = Estimation.objects.get()
+        self.items = list(self.estimation.items.order_by('id'))
+
+    def edit_post(self, rows, version=None):
+        """rows: (item_id or '', details, quantity) per line."""
+        data = {
+            'version': self.estimation.version if version is None else version,
+            'quote_date': '2025-04-01',
+            'validity_days': '45',
+            'billing_address': 'New billing',
+            'shipping_address': 'Addr',
+            'sub_total': '100', 'discount': '0', 'gst_amount': '18', 'total': '118',
+            'item_id[]': [str(r[0]) for r in rows],
+            'item_details[]': [r[1] for r in rows],
+            'quantity[]': [str(r[2]) for r in rows],
+            'rate[]': ['100.00'] * len(rows),
+            'tax[]': ['18'] * len(rows),
+            'amount[]': ['118.00'] * len(rows),
+        }
+        return self.client.post(f'/estimation/{self.estimation.pk}/edit/', data)
+
+    def test_edit_diffs_items_and_bumps_version(self):
+        first, second, third = self.items
+        with CaptureQueriesContext(connection) as queries:
+            response = self.edit_post([
+                (first.pk, first.item_details, first.quantity),  # unchanged
+                (second.pk, "Renamed", 7),                      # updated
+                ('', "Brand new", 1),                            # created; third is deleted
+            ])
+        self.assertEqual(response.status_code, 302)
+
+        items = list(self.estimation.items.order_by('id'))
+        self.assertEqual([i.pk for i in items[:2]], [first.pk, second.pk])  # ids survive
+        self.assertEqual((items[1].item_details, items[1].quantity), ("Renamed", 7))
+        self.assertEqual(items[2].item_details, "Brand new")
+        self.assertFalse(EstimationItem.objects.filter(pk=third.pk).exists())
+
+        # one statement per kind of change, no delete-all/re-insert
+        item_writes = sorted(
+            q['sql'].split()[0] for q in queries
+            if q['sql'].startswith(('INSERT INTO "crm_estimationitem"', 'UPDATE "crm_estimationitem"',
+                                    'DELETE FROM "crm_estimationitem"'))
+        )
+        self.assertEqual(item_writes, ["DELETE", "INSERT", "UPDATE"])
+
+        self.estimation.refresh_from_db()
+        self.assertEqual(self.estimation.version, 2)
+        self.assertEqual(self.estimation.billing_address, "New billing")
+        self.assertEqual(self.estimation.status, "Pending")  # fields not on the form are kept
+
+    def test_stale_form_is_rejected(self):
+        rows = [(item.pk, item.item_details, item.quantity) for item in self.items]
+        self.assertEqual(self.edit_post(rows).status_code, 302)  # someone else saves first
+
+        response = self.edit_post([('', "Overwrite", 1)], version=1)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.estimation.items.count(), 3)
+        self.assertFalse(self.estimation.items.filter(item_details="Overwrite").exists())
+        self.estimation.refresh_from_db()
+        self.assertEqual(self.estimation.version, 2)
+
+
+class HotQueryIndexTests(TestCase):
+    def test_explain_command_uses_indexes_and_restores_them(self):
+        out = io.StringIO()
+        call_command('explain_hot_queries', stdout=out)
+        self.assertNotIn("===== before", out.getvalue())  # no DDL unless asked for
+        with self.assertRaises(CommandError):
+            call_command('explain_hot_queries', '--without-indexes', stdout=io.StringIO())
+
+        out = io.StringIO()
+        call_command('explain_hot_queries', '--without-indexes', '--force', stdout=out)
+        self.assertIn("===== before", out.getvalue())
+        after = out.getvalue().split("===== after")[1]
+        self.assertIn("crm_est_follow_up_idx", after)
+        self.assertIn("crm_invoice_created_idx", after)
+        self.assertIn("crm_paymentlog_inv_date_idx", after)
+
+        with connection.cursor() as cursor:
+            indexes = {
+                name for model in (Lead, Estimation, Invoice, PaymentLog)
+                for name in connection.introspection.get_constraints(cursor, model._meta.db_table)
+            }
+        self.assertIn("crm_lead_date_idx", indexes)  # rolled back, not dropped
+
+    def test_invoice_date_filter_is_inclusive_in_local_time(self):
+        acme = Client.objects.create(company_name="Acme", type_of_company="Pvt")
+        make_lead_graph(acme, 2)
+        first, second = Invoice.objects.order_by('id')
+        # 23:30 IST on 31 Mar is 18:00 UTC; it must count as 31 Mar, not 1 Apr
+        Invoice.objects.filter(pk=first.pk).update(created_at=datetime(2025, 3, 31, 18, 0, tzinfo=dt_timezone.utc))
+        Invoice.objects.filter(pk=second.pk).update(created_at=datetime(2025, 4, 1, 0, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(list(filter_invoices({'to_date': '2025-03-31'})), [Invoice.objects.get(pk=first.pk)])
+        self.assertEqual(list(filter_invoices({'from_date': '2025-04-01', 'to_date': '2025-04-01'})),
+                         [Invoice.objects.get(pk=second.pk)])
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_malformed_dates_are_ignored(self):
+        make_lead_graph(Client.objects.create(company_name="Acme", type_of_company="Pvt"), 2)
+        self.assertEqual(filter_invoices({'from_date': '31/03/2025', 'to_date': 'x'}).count(), 2)
+        self.client.force_login(get_user_model().objects.create_user("dates", password="pw"))
+        for url in ('/reports/?from_date=2025-13-01&to_date=2025-12-31',
+                    '/reports/export/pdf/?from_date=nope',
+                    '/reports/export/pdfs/?kind=quotation&to_date=nope'):
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200, url)
+            if resp.streaming:
+                b"".join(resp.streaming_content)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.acme = Client.objects.create(company_name="Acme Steel", type_of_company="Pvt",
+                                          gst_no="27AAACA1234A1Z5", contact_person="Ravi")
+        self.other = Client.objects.create(company_name="Bolt Traders", type_of_company="Pvt",
+                                           contact_person="Acme liaison")
+        self.lead = make_lead_graph(self.acme, 1)[0]
+        Lead.objects.filter(pk=self.lead.pk).update(requirement="Stainless railings")
+        self.lead.refresh_from_db()
+        self.lead.save()  # reindex after the signal-free update
+
+    def kinds(self, query, **kwargs):
+        return [(doc.kind, doc.object_id) for doc in search.search(query, **kwargs)]
+
+    def test_prefix_terms_match_across_fields_and_title_ranks_first(self):
+        self.assertEqual(self.kinds("acm", kinds=['client']),
+                         [('client', self.acme.pk), ('client', self.other.pk)])
+        self.assertEqual(self.kinds("stainless rail"), [('lead', self.lead.pk)])
+        self.assertEqual(self.kinds("27AAACA1234A1Z5", kinds=['client']), [('client', self.acme.pk)])
+        self.assertEqual(self.kinds("INV T-00001"), [('invoice', Invoice.objects.get(estimation__lead_no=self.lead).pk)])
+        self.assertEqual(self.kinds("   "), [])
+
+    def test_index_follows_saves_renames_and_deletes(self):
+        self.acme.company_name = "Zenith Metals"
+        self.acme.save()
+        self.assertEqual({kind for kind, _pk in self.kinds("zenith")}, {'client', 'lead', 'estimation', 'invoice'})
+        self.assertEqual(self.kinds("acme steel"), [])
+
+        self.lead.delete()
+        self.assertFalse(SearchDocument.objects.filter(kind='lead', object_id=self.lead.pk).exists())
+
+        SearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.kinds("zenith", kinds=['client']), [('client', self.acme.pk)])
+
+    def test_migration_fills_the_index_from_existing_rows(self):
+        SearchDocument.objects.all().delete()  # as on a database that predates the index
+        state = MigrationLoader(connection).project_state(('crm', '0010_search_index'))
+        importlib.import_module('crm.migrations.0010_search_index').populate_index(state.apps, None)
+        self.assertEqual({kind for kind, _pk in self.kinds("acme")}, {'client', 'lead', 'estimation', 'invoice'})
+
+    def test_list_views_and_global_endpoint_use_the_index(self):
+        user = get_user_model().objects.create_user("searcher", password="pw")
+        self.client.force_login(user)
+
+        resp = self.client.get('/client/', {'q': 'ravi'})
+        self.assertEqual(list(resp.context['clients']), [self.acme])
+        resp = self.client.get('/lead/', {'q': 'railings'})
+        self.assertEqual([lead.pk for lead in resp.context['leads']], [self.lead.pk])
+
+        resp = self.client.get('/search/', {'q': 'acme', 'kind': 'client'})
+        results = resp.json()['results']
+        self.assertEqual([r['id'] for r in results], [self.acme.pk, self.other.pk])
+        self.assertEqual(results[0]['url'], f'/client/edit/{self.acme.pk}/')
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        acme = Client.objects.create(company_name="Acme", type_of_company="Pvt")
+        make_lead_graph(acme, 23, invoiced=False)
+        # Plenty of ties on quote_date so the id tie-breaker matters.
+        for i, pk in enumerate(Estimation.objects.order_by('id').values_list('pk', flat=True)):
+            Estimation.objects.filter(pk=pk).update(quote_date=date(2025, 1, 1 + i % 4))
+        self.expected = list(Estimation.objects.order_by('-quote_date', '-id').values_list('pk', flat=True))
+
+    def walk(self, paginator, cursor_attr, has_more, start=None):
+        page, seen = paginator.get_page(start), []
+        while True:
+            seen.append([obj.pk for obj in page])
+            if not getattr(page, has_more)():
+                return seen
+            page = paginator.get_page(getattr(page, cursor_attr))
+
+    def test_forward_and_backward_walks_cover_every_row_once(self):
+        paginator = KeysetPaginator(Estimation.objects.all(), ordering=('-quote_date', '-id'), per_page=5)
+        forward = self.walk(paginator, 'next_cursor', 'has_next')
+        self.assertEqual([len(p) for p in forward], [5, 5, 5, 5, 3])
+        self.assertEqual(sum(forward, []), self.expected)
+
+        last = paginator.get_page(paginator.get_page().last_cursor)
+        self.assertEqual([obj.pk for obj in last], self.expected[-5:])
+        self.assertFalse(last.has_next())
+        backward = self.walk(paginator, 'previous_cursor', 'has_previous', start=last.last_cursor)
+        self.assertEqual(sum(reversed(backward), []), self.expected)
+
+    def test_deep_pages_use_a_range_not_offset_and_bad_cursors_restart(self):
+        paginator = KeysetPaginator(Lead.objects.all(), per_page=5, count='exact')
+        deep = paginator.get_page(paginator.get_page(paginator.get_page().next_cursor).next_cursor)
+        with CaptureQueriesContext(connection) as queries:
+            page = paginator.get_page(deep.next_cursor)
+        self.assertEqual(len(queries), 2)  # page + COUNT
+        self.assertNotIn("OFFSET", queries[0]['sql'].upper())
+        self.assertEqual(page.count, 23)
+
+        other = KeysetPaginator(Estimation.objects.all(), ordering=('-quote_date', '-id'), per_page=5)
+        for bad in ("garbage!", deep.next_cursor):  # the latter is a one-field cursor
+            self.assertEqual([obj.pk for obj in other.get_page(bad)], self.expected[:5])
+
+    def test_list_views_follow_cursors(self):
+        user = get_user_model().objects.create_user("pager", password="pw")
+        self.client.force_login(user)
+        first = self.client.get('/estimations/').context['page_obj']
+        self.assertEqual([obj.pk for obj in first], self.expected[:15])
+        second = self.client.get('/estimations/', {'cursor': first.next_cursor}).context['page_obj']
+        self.assertEqual([obj.pk for obj in second], self.expected[15:])
+
+        resp = self.client.get('/lead/', {'cursor': self.client.get('/lead/').context['page_obj'].next_cursor})
+        self.assertEqual(len(resp.context['leads']), 10)
+        if connection.vendor == 'postgresql':
+            self.assertIsNotNone(resp.context['page_obj'].count)
+            self.assertContains(resp, f"About {resp.context['page_obj'].count} leads")
+        else:  # no planner estimate, and no COUNT(*) in its place
+            self.assertIsNone(resp.context['page_obj'].count)
+            self.assertNotContains(resp, "About 23 leads")
+
+
+class PermissionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        permissions.clear_catalog()
+        self.user = get_user_model().objects.create_user("perm", password="pw")
+
+    def fresh(self):
+        return get_user_model().objects.get(pk=self.user.pk)  # no per-object memo
+
+    def test_resolve_uses_one_query_and_reports_unknown_codes(self):
+        permissions.catalog()
+        with self.assertNumQueries(1):
+            found, unknown = permissions.resolve(["crm.view_client", "crm.view_lead"])
+        self.assertEqual({p.codename for p in found}, {"view_client", "view_lead"})
+        self.assertEqual(unknown, [])
+        self.assertEqual(permissions.resolve(["crm.nope"])[1], ["crm.nope"])
+
+    def test_effective_set_is_cached_and_invalidated_on_m2m_changes(self):
+        view_client = Permission.objects.get(codename="view_client")
+        self.user.user_permissions.add(view_client)
+        self.assertIn("crm.view_client", permissions.get_permissions(self.fresh()))
+        user = self.fresh()
+        with self.assertNumQueries(0):
+            self.assertTrue(permissions.has_perm(user, "crm.view_client"))
+
+        self.user.user_permissions.clear()
+        self.assertFalse(permissions.has_perm(self.fresh(), "crm.view_client"))
+
+        group = Group.objects.create(name="Sales")
+        group.user_set.add(self.user)
+        group.permissions.add(view_client)
+        flag = UserPermission.objects.create(name="can_view_client")
+        profile = UserProfile.objects.create(user=self.user, name="perm", email="p@example.com")
+        profile.permissions.add(flag)
+        self.assertEqual(permissions.get_permissions(self.fresh()), {"crm.view_client", "can_view_client"})
+
+        flag.delete()
+        self.assertEqual(permissions.get_permissions(self.fresh()), {"crm.view_client"})
+
+    def test_invalidation_is_carried_by_the_user_row_not_the_cache(self):
+        view_client = Permission.objects.get(codename="view_client")
+        self.assertEqual(permissions.get_permissions(self.fresh()), frozenset())
+        # Another worker grants the permission: only the database changes here.
+        with mock.patch.object(permissions, 'cache') as other_process_cache:
+            self.user.user_permissions.add(view_client)
+        self.assertEqual(other_process_cache.method_calls, [])
+        self.assertEqual(self.fresh().permissions_version, 1)
+        self.assertEqual(permissions.get_permissions(self.fresh()), {"crm.view_client"})
+
+    def test_create_user_assigns_resolved_permissions(self):
+        self.client.force_login(self.user)
+        resp = self.client.post('/users/create/', {
+            'username': 'newbie', 'password': 'pw', 'confirm_password': 'pw', 'role': 'User',
+            'permissions': ['crm.view_client', 'crm.view_lead', 'crm.bogus'],
+        })
+        self.assertRedirects(resp, '/users/', fetch_redirect_response=False)
+        newbie = get_user_model().objects.get(username='newbie')
+        self.assertEqual(permissions.get_permissions(newbie), {"crm.view_client", "crm.view_lead"})
+
+        with self.assertNumQueries(2):  # session, user
+            data = self.client.get('/get-permissions/', {'role': 'User'}).json()
+        self.assertIn("crm.view_client", [p['code'] for p in data['permissions']])
+
+
+class PaymentLedgerTests(TestCase):
+    def setUp(self):
+        acme = Client.objects.create(company_name="Acme", type_of_company="Pvt")
+        make_lead_graph(acme, 2, invoiced=True)
+        Invoice.objects.update(balance_due=Decimal("118.00"))
+        self.invoice, self.other = Invoice.objects.order_by('id')
+
+    def test_payments_move_balance_and_status_and_replays_are_noops(self):
+        first = payments.record_payment(self.invoice.pk, "18", "UTR-1", "2025-05-01")
+        self.assertTrue(first.created)
+        self.assertEqual((first.invoice.paid_amount, first.invoice.balance_due, first.invoice.status),
+                         (Decimal("18.00"), Decimal("100.00"), "Partial Paid"))
+
+        replay = payments.record_payment(self.invoice.pk, "18", " UTR-1 ", "2025-05-01")
+        self.assertFalse(replay.created)
+        self.assertEqual(replay.log.pk, first.log.pk)
+
+        settle = payments.record_payment(self.invoice.pk, "100.00", "UTR-2", "2025-05-02")
+        invoice = Invoice.objects.get(pk=self.invoice.pk)
+        self.assertEqual((invoice.paid_amount, invoice.balance_due, invoice.status),
+                         (Decimal("118.00"), Decimal("0.00"), "Paid"))
+        self.assertEqual(settle.log.status, "Paid")
+        self.assertEqual(PaymentLog.objects.filter(invoice=invoice).count(), 2)
+        self.assertEqual(dashboard.figures()["paid"], Decimal("118.00"))
+
+    def test_rejects_bad_input_and_utr_reuse_across_invoices(self):
+        payments.record_payment(self.invoice.pk, "10", "UTR-9")
+        for amount, utr in (("0", "UTR-A"), ("abc", "UTR-B"), ("10", "  ")):
+            with self.assertRaises(payments.PaymentError):
+                payments.record_payment(self.invoice.pk, amount, utr)
+        with self.assertRaises(payments.PaymentError):
+            payments.record_payment(self.other.pk, "10", "UTR-9")
+        self.assertEqual(Invoice.objects.get(pk=self.other.pk).paid_amount, Decimal("0.00"))
+
+    def test_confirm_payment_view(self):
+        self.client.force_login(get_user_model().objects.create_user("cash", password="pw"))
+        resp = self.client.post(f'/confirm-payment/{self.invoice.pk}/',
+                                {'amount_paid': '50', 'utr_number': 'UTR-V', 'payment_date': '2025-05-03'})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(Invoice.objects.get(pk=self.invoice.pk).balance_due, Decimal("68.00"))
+        resp = self.client.post(f'/confirm-payment/{self.invoice.pk}/', {'amount_paid': '-5', 'utr_number': 'X'})
+        self.assertEqual(resp.status_code, 400)
+
+
+class PaymentLedgerConcurrencyTests(TransactionTestCase):
+    def test_concurrent_payments_are_never_lost(self):
+        # Runs on the file-backed SQLite test database from settings, or on
+        # Postgres; only an explicitly in-memory test database skips it.
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("needs a database with real lock waits")
+        acme = Client.objects.create(company_name="Acme", type_of_company="Pvt")
+        make_lead_graph(acme, 1, invoiced=True)
+        invoice = Invoice.objects.get()
+        Invoice.objects.update(total_value=Decimal("10000.00"), balance_due=Decimal("10000.00"))
+
+        threads, per_thread = 8, 10
+        errors = []
+        start = threading.Barrier(threads)
+
+        def worker(n):
+            try:
+                start.wait()
+                for i in range(per_thread):
+                    payments.record_payment(invoice.pk, "12.50", f"UTR-{n}-{i}", "2025-06-01")
+                    # Every thread also replays a reference another thread owns.
+                    payments.record_payment(invoice.pk, "12.50", f"UTR-{(n + 1) % threads}-{i}", "2025-06-01")
+            except Exception as exc:  # surfaced in the main thread below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+
+        self.assertEqual(errors, [])
+        invoice.refresh_from_db()
+        paid = Decimal("12.50") * threads * per_thread
+        self.assertEqual(PaymentLog.objects.count(), threads * per_thread)
+        self.assertEqual(invoice.paid_amount, paid)
+        self.assertEqual(invoice.balance_due, Decimal("10000.00") - paid)
+
+
+class BankStatementImportTests(TestCase):
+    def setUp(self):
+        self.acme = Client.objects.create(company_name="Acme Steel", type_of_company="Pvt")
+        self.bolt = Client.objects.create(company_name="Bolt Traders", type_of_company="Pvt")
+        make_lead_graph(self.acme, 2)
+        make_lead_graph(self.bolt, 1)
+        # balances: acme 18.00 and 50.00, bolt 50.00
+        self.a1, self.a2, self.b1 = Invoice.objects.order_by('id')
+        Invoice.objects.filter(pk__in=[self.a2.pk, self.b1.pk]).update(balance_due=Decimal("50.00"))
+        PaymentLog.objects.create(invoice=self.a1, amount_paid=1, utr_number="SBIN000000000099",
+                                  payment_date=date(2025, 4, 1))
+        dashboard.reconcile()  # the update() above bypassed the rollup signals
+
+    def statement(self, rows):
+        lines = ["Account Statement,,,,", "Account No: 1234,,,,",
+                 "Txn Date,Narration,Chq/Ref No,Withdrawal,Deposit"]
+        return io.BytesIO("\n".join(lines + rows).encode())
+
+    def test_matches_by_invoice_number_amount_and_client(self):
+        data = self.statement([
+            f"02/05/2025,NEFT {self.a1.invoice_no} ACME,HDFC000000000001,,18.00",
+            "03/05/2025,RTGS BOLT TRADERS PAYMENT,HDFCR5202505030001,,\"50.00\"",
+            "03/05/2025,IMPS 123456789012 ACME STEEL,,,50",
+            "04/05/2025,UNKNOWN PARTY,ICIC000000000002,,999.00",
+            "04/05/2025,REPLAY,SBIN000000000099,,18.00",
+            "05/05/2025,BANK CHARGES,,150.00,",
+        ])
+        result = bank_import.import_statement(data, "may.csv")
+        self.assertEqual([(m.invoice_id, m.rule) for m in result.matched], [
+            (self.a1.pk, 'invoice number'), (self.b1.pk, 'amount + client'), (self.a2.pk, 'amount'),
+        ])
+        self.assertEqual([(u.line.line, u.reason) for u in result.unmatched],
+                         [(7, 'no open invoice for this amount')])
+        self.assertEqual([line.utr for line in result.duplicates], ["SBIN000000000099"])
+        self.assertEqual((result.skipped, result.posted), (1, 3))
+
+        self.assertEqual(set(Invoice.objects.values_list('status', flat=True)), {"Paid"})
+        self.assertEqual(PaymentLog.objects.get(utr_number="123456789012").invoice_id, self.a2.pk)
+        self.assertEqual(dashboard.figures()["paid"], Decimal("118.00"))
+        self.assertEqual(dashboard.reconcile(dry_run=True), {})  # bulk posting kept the rollup exact
+
+        report = io.StringIO()
+        bank_import.write_report(result, report)
+        self.assertIn("Unmatched", report.getvalue().splitlines()[1])
+
+        again = bank_import.import_statement(self.statement([
+            f"02/05/2025,NEFT {self.a1.invoice_no} ACME,HDFC000000000001,,18.00"]), "may.csv")
+        self.assertEqual((len(again.duplicates), again.posted), (1, 0))
+
+    def test_invoice_number_needs_the_balance_or_the_client_and_reports_overpayments(self):
+        a2, b1 = self.a2.invoice_no, self.b1.invoice_no
+        result = bank_import.import_statement(self.statement([
+            f"02/05/2025,NEFT/HDFCN52025050200001/ACME STEEL/{a2},HDFCN52025050200001,,20.00",
+            f"02/05/2025,NEFT/HDFCN52025050200002/SOMEONE/{b1},HDFCN52025050200002,,20.00",
+            f"03/05/2025,NEFT/HDFCN52025050300003/BOLT TRADERS/{b1},HDFCN52025050300003,,75.00",
+            f"04/05/2025,NEFT/HDFCN52025050400004/ACME STEEL/{a2},HDFCN52025050400004,,30.00",
+        ]), "may.csv")
+        self.assertEqual([(m.invoice_id, m.rule) for m in result.matched], [
+            (self.a2.pk, 'invoice number + client'), (self.a2.pk, 'invoice number'),
+        ])
+        self.assertEqual([(u.line.line, u.reason) for u in result.unmatched], [
+            (5, f"part payment of {b1} without the client's name"),
+            (6, f"overpays {b1} (balance 50.00)"),
+        ])
+        self.b1.refresh_from_db()
+        self.assertEqual(self.b1.balance_due, Decimal("50.00"))
+
+    def test_xlsx_statement_and_queries_do_not_grow_per_line(self):
+        clients = [Client.objects.create(company_name=f"Client {i}", type_of_company="Pvt") for i in range(30)]
+        for client in clients:
+            make_lead_graph(client, 1)
+        invoices = list(Invoice.objects.filter(estimation__company_name__in=clients).order_by('id'))
+
+        def xlsx(rows):
+            workbook = Workbook()
+            sheet = workbook.active
+            sheet.append(["Value Date", "Description", "UTR", "Credit"])
+            for invoice in rows:
+                sheet.append([datetime(2025, 5, 2), f"NEFT {invoice.invoice_no}", f"UTIB{invoice.pk:012d}", 18])
+            buffer = io.BytesIO()
+            workbook.save(buffer)
+            buffer.seek(0)
+            return buffer
+
+        with CaptureQueriesContext(connection) as small:
+            bank_import.import_statement(xlsx(invoices[:5]), "week.xlsx")
+        with CaptureQueriesContext(connection) as large:
+            result = bank_import.import_statement(xlsx(invoices[5:]), "month.xlsx")
+        self.assertEqual(result.posted, 25)
+        self.assertLessEqual(len(large), len(small))  # 5x the lines, no more queries
+        self.assertFalse(Invoice.objects.filter(pk__in=[i.pk for i in invoices]).exclude(status="Paid").exists())
+
+
+class CrmImportTests(TestCase):
+    def setUp(self):
+        self.acme = Client.objects.create(company_name="Acme Steels Pvt. Ltd.", type_of_company="Pvt",
+                                          gst_no="27AAACA1234A1Z5")
+        self.bolt = Client.objects.create(company_name="Bolt Traders", type_of_company="Partnership")
+
+    def csv(self, rows):
+        header = "Company Name,GSTIN,Contact Person,Mobile No,Email,Requirement"
+        return io.BytesIO("\n".join([header] + rows).encode())
+
+    def test_dedupes_on_gst_and_name_and_numbers_leads_from_the_sequence(self):
+        data = self.csv([
+            "ACME STEELS PRIVATE LIMITED,27 AAACA 1234 A1Z5,Ravi,+91 98765 43210,RAVI@ACME.IN,Plates",
+            "M/s. Bolt Traders,,Sita,9876500000,,Bolts",
+            "Nova Metals,29AAACN9999B1Z2,Anil,9000000001,,Pipes",
+            "Nova Metals Ltd,29AAACN9999B1Z2,Anil,9000000001,,Rods",
+            "Orbit Works,not-a-gstin,Meera,9000000002,,",
+            ",,,,,Orphan requirement",
+        ])
+        first = sequences.reserve('lead')[0]
+        result = crm_import.import_crm(data, "clients.csv", chunk_size=2)
+
+        self.assertEqual(dict(result.stats), {
+            'rows': 6, 'clients_created': 2, 'clients_matched': 3, 'leads_created': 4, 'skipped': 1,
+        })
+        self.assertEqual([number for number, _message in result.errors], [6, 7])
+        self.assertEqual(Client.objects.count(), 4)
+        nova = Client.objects.get(company_name="Nova Metals")
+        self.assertEqual(nova.gst_no, "29AAACN9999B1Z2")
+        self.assertEqual(Lead.objects.filter(company_name=nova).count(), 2)
+        self.assertIsNone(Client.objects.get(company_name="Orbit Works").gst_no)
+
+        lead = Lead.objects.get(requirement="Plates")
+        self.assertEqual((lead.company_name_id, lead.mobile, lead.email), (self.acme.pk, "9876543210", "ravi@acme.in"))
+        numbers = sorted(Lead.objects.values_list('lead_no', flat=True))
+        self.assertEqual(len(numbers), 4)
+        self.assertTrue(all(number > first for number in numbers))
+        self.assertGreater(sequences.reserve("lead")[0], numbers[-1])
+
+        # Bulk inserts bypass the signals; the search index and rollup were kept in step.
+        self.assertEqual([doc.object_id for doc in search.search("Nova", kinds=['client'])], [nova.pk])
+        self.assertEqual(len(search.search("Rods", kinds=['lead'])), 1)
+        self.assertEqual(dashboard.reconcile(dry_run=True), {})
+
+        again = crm_import.import_crm(self.csv(["Nova Metals,29AAACN9999B1Z2,Anil,9000000001,,"]), "again.csv")
+        self.assertEqual((again.stats['clients_created'], again.stats['clients_matched']), (0, 1))
+
+    def test_name_match_within_a_chunk_never_merges_two_gstins(self):
+        data = self.csv([
+            "Kite Labs,27AAACK1111A1Z5,,,,Drones",
+            "Kite Labs Pvt Ltd,29AAACK2222B1Z2,,,,Rotors",
+            "Kite Labs,,,,,Props",
+            "Zeta Tools,,,,,Drills",
+            "Zeta Tools,33AAACZ3333C1Z9,,,,Bits",
+        ])
+        result = crm_import.import_crm(data, "kite.csv")
+        self.assertEqual((result.stats['clients_created'], result.stats['clients_matched']), (3, 2))
+        self.assertEqual(sorted(Client.objects.filter(company_name__startswith="Kite").values_list('gst_no', flat=True)),
+                         ["27AAACK1111A1Z5", "29AAACK2222B1Z2"])
+        self.assertEqual(Lead.objects.get(requirement="Props").company_name.gst_no, "27AAACK1111A1Z5")
+        zeta = Client.objects.get(company_name="Zeta Tools")
+        self.assertEqual(zeta.gst_no, "33AAACZ3333C1Z9")  # picked up from the second row
+        self.assertEqual(Lead.objects.filter(company_name=zeta).count(), 2)
+
+    def test_xlsx_input_and_missing_header(self):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["Client export"])
+        sheet.append(["Customer", "GST No", "Phone", "Enquiry"])
+        sheet.append(["Zen Fabricators", "33AAACZ1111C1Z9", 9123456789, "Sheds"])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        buffer.seek(0)
+
+        result = crm_import.import_crm(buffer, "export.xlsx")
+        self.assertEqual((result.stats['clients_created'], result.stats['leads_created']), (1, 1))
+        self.assertEqual(Lead.objects.get(requirement="Sheds").mobile, "9123456789")
+
+        with self.assertRaises(ValueError):
+            crm_import.import_crm(io.BytesIO(b"foo,bar\n1,2\n"), "bad.csv")
+
+    def test_upload_view_requires_add_permissions(self):
+        user = get_user_model().objects.create_user("importer", password="pw")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get("/client/import/").status_code, 403)
+
+        user.user_permissions.add(*Permission.objects.filter(codename__in=["add_client", "add_lead"]))
+        upload = io.BytesIO(b"Company,Requirement\nKite Labs,Drones\n")
+        upload.name = "kite.csv"
+        response = self.client.post("/client/import/", {"file": upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["stats"]["leads_created"], 1)
+        self.assertTrue(Lead.objects.filter(company_name__company_name="Kite Labs").exists())
+
+
+class InvoiceTotalsTests(TestCase):
+    def setUp(self):
+        self.acme = Client.objects.create(company_name="Acme", type_of_company="Pvt")
+        make_lead_graph(self.acme, 3)
+        self.priced, self.paid, self.empty = Invoice.objects.order_by('id')
+        for invoice in (self.priced, self.paid):
+            EstimationItem.objects.bulk_create([
+                EstimationItem(estimation_id=invoice.estimation_id, item_details="Bolt", quantity=3,
+                               rate=Decimal("33.33"), tax=Decimal("18.00"), amount=0),
+            ] + [
+                EstimationItem(estimation_id=invoice.estimation_id, item_details="Washer", quantity=1,
+                               rate=Decimal("0.10"), tax=Decimal("0.00"), amount=0)
+                for _ in range(10)
+            ])
+        # 3 x 33.33 x 1.18 = 117.9882, plus 10 x 0.10: 118.99 after rounding the total.
+        Invoice.objects.filter(pk=self.paid.pk).update(paid_amount=Decimal("100.00"))
+        dashboard.reconcile()
+
+    def run_command(self, *args):
+        out = io.StringIO()
+        call_command('update_invoice_totals', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_reports_without_writing(self):
+        with mock.patch.object(QuerySet, 'select_for_update') as lock:
+            output = self.run_command('--dry-run')
+        lock.assert_not_called()  # a report takes no row locks
+        self.assertIn(f"{self.priced.invoice_no} ➤ ₹118.00 → ₹118.99", output)
+        self.assertIn("2 changed, 1 without items skipped", output)
+        self.assertEqual(set(Invoice.objects.values_list('total_value', flat=True)), {Decimal("118.00")})
+
+    def test_updates_in_decimal_and_only_rewrites_changed_rows(self):
+        chunks = list(invoices.recompute_totals(chunk_size=1))
+        self.assertEqual([chunk.scanned for chunk in chunks], [1, 1, 1])
+        self.assertEqual(sum(len(chunk.changes) for chunk in chunks), 2)
+
+        self.priced.refresh_from_db()
+        self.paid.refresh_from_db()
+        self.assertEqual((self.priced.total_value, self.priced.balance_due), (Decimal("118.99"), Decimal("118.99")))
+        self.assertEqual((self.paid.balance_due, self.paid.status), (Decimal("18.99"), "Partial Paid"))
+        self.assertEqual(Invoice.objects.get(pk=self.empty.pk).total_value, Decimal("118.00"))
+        self.assertEqual(dashboard.reconcile(dry_run=True), {})
+
+        with self.assertNumQueries(3):  # one SELECT, in its savepoint; nothing to write
+            self.assertEqual([len(chunk.changes) for chunk in invoices.recompute_totals()], [0])
+
+    def test_since_limits_the_scan(self):
+        Invoice.objects.filter(pk=self.priced.pk).update(created_at=datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertIn("2 invoices scanned, 1 changed", self.run_command('--since', '2025-01-01'))
+        self.assertEqual(Invoice.objects.get(pk=self.priced.pk).total_value, Decimal("118.00"))
+
+
+class OrphanCleanupTests(TestCase):
+    def setUp(self):
+        self.acme = Client.objects.create(company_name="Acme", type_of_company="Pvt")
+        self.ghost = Client.objects.create(company_name="Ghost", type_of_company="Pvt")
+        make_lead_graph(self.acme, 2)
+        make_lead_graph(self.ghost, 1)
+        self.kept_lead, self.lost_lead = Lead.objects.filter(company_name=self.acme).order_by('id')
+        self.ghost_invoice = Invoice.objects.get(estimation__company_name=self.ghost)
+        PaymentLog.objects.create(invoice=self.ghost_invoice, amount_paid=5, utr_number="UTR-GHOST",
+                                  payment_date=date(2025, 4, 1), status="Paid")
+        user = get_user_model().objects.create_user("gone", password="pw")
+        self.job = ReportJob.objects.create(kind="csv", params={}, created_by=user)
+
+        # Simulate rows removed behind the ORM's back; FK checks are deferred
+        # until commit, which a TestCase never reaches.
+        with connection.cursor() as cursor:
+            for table, pk in (("crm_client", self.ghost.pk), ("crm_lead", self.lost_lead.pk),
+                              ("crm_user", user.pk)):
+                cursor.execute(f"DELETE FROM {table} WHERE id = %s", [pk])
+        dashboard.reconcile()
+        # Leave no dangling rows for the teardown constraint check.
+        self.addCleanup(lambda: [orphans.clean(check) for check in orphans.checks()])
+
+    def run_command(self, *args):
+        out = io.StringIO()
+        call_command('clean_orphan_foreign_keys', *args, stdout=out)
+        return out.getvalue()
+
+    def test_checks_cover_every_crm_foreign_key_parents_first(self):
+        labels = [check.label for check in orphans.checks()]
+        for label in ("crm.Lead.company_name → crm.Client", "crm.Estimation.lead_no → crm.Lead",
+                      "crm.QuotationItem.estimation → crm.Estimation", "crm.UserProfile_permissions.userprofile → crm.UserProfile"):
+            self.assertIn(label, labels)
+        self.assertLess(labels.index("crm.Estimation.lead_no → crm.Lead"),
+                        labels.index("crm.PaymentLog.invoice → crm.Invoice"))
+        actions = {check.label: check.action for check in orphans.checks()}
+        self.assertEqual(actions["crm.ReportJob.created_by → crm.User"], "null")
+
+    def test_dry_run_counts_without_writing(self):
+        output = self.run_command('--dry-run')
+        self.assertIn("crm.Lead.company_name → crm.Client: 1 (would delete)", output)
+        self.assertIn("crm.Estimation.lead_no → crm.Lead: 1 (would delete)", output)
+        self.assertIn("crm.ReportJob.created_by → crm.User: 1 (would null)", output)
+        self.assertEqual(Lead.objects.count(), 2)
+
+    def test_cleanup_cascades_in_chunks_and_keeps_rollups(self):
+        self.run_command('--chunk-size', '1')
+
+        self.assertEqual(list(Lead.objects.values_list('pk', flat=True)), [self.kept_lead.pk])
+        self.assertEqual(Estimation.objects.count(), 1)
+        self.assertEqual(Invoice.objects.count(), 1)
+        self.assertFalse(PaymentLog.objects.filter(utr_number="UTR-GHOST").exists())
+        self.job.refresh_from_db()
+        self.assertIsNone(self.job.created_by_id)
+
+        self.assertEqual(dashboard.reconcile(dry_run=True), {})
+        self.assertFalse(SearchDocument.objects.filter(kind='invoice', object_id=self.ghost_invoice.pk).exists())
+        self.assertTrue(all(orphans.count(check) == 0 for check in orphans.checks()))
+
+
+class AttachmentScanTests(TestCase):
+    PDF = b"%PDF-1.4\n1 0 obj\n<<>>\nendobj\n%%EOF\n"
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        files = {
+            "po_attachments/ok.pdf": self.PDF,
+            "po_attachments/copy.pdf": self.PDF,
+            "po_attachments/bad.pdf": b"<html>error page</html>",
+            "po_attachments/empty.pdf": b"",
+            "po_attachments/moved.pdf": self.PDF + b"moved",
+            "po_attachments/stray.pdf": self.PDF + b"stray",
+            "legacy.pdf": self.PDF + b"legacy",
+        }
+        os.makedirs(os.path.join(self.media_root, "po_attachments"))
+        for name, content in files.items():
+            with open(os.path.join(self.media_root, name), "wb") as fh:
+                fh.write(content)
+
+        acme = Client.objects.create(company_name="Acme", type_of_company="Pvt")
+        make_lead_graph(acme, 8, invoiced=False)
+        stored = ["po_attachments/ok.pdf", "po_attachments/copy.pdf", "po_attachments/bad.pdf",
+                  "po_attachments/empty.pdf", "uploads/moved.pdf", "po_attachments/legacy.pdf",
+                  "po_attachments/gone.pdf", ""]
+        self.ids = {}
+        for estimation, name in zip(Estimation.objects.order_by('id'), stored):
+            Estimation.objects.filter(pk=estimation.pk).update(po_attachment=name)
+            self.ids[name] = estimation.pk
+
+    def problems(self, result):
+        return sorted((issue.problem, issue.stored) for issue in result.issues)
+
+    def test_dry_run_finds_every_problem_with_few_queries(self):
+        with self.assertNumQueries(1):
+            result = attachments.scan(hash_files=True, workers=2)
+        self.assertEqual(result.scanned, 7)
+        self.assertEqual(self.problems(result), [
+            ("corrupt", "po_attachments/bad.pdf"),
+            ("duplicate", "po_attachments/ok.pdf"),
+            ("empty", "po_attachments/empty.pdf"),
+            ("missing", "po_attachments/gone.pdf"),
+            ("moved", "po_attachments/legacy.pdf"),
+            ("moved", "uploads/moved.pdf"),
+            ("unreferenced", "po_attachments/stray.pdf"),
+        ])
+        self.assertEqual(result.fixed, 0)
+        self.assertEqual(Estimation.objects.get(pk=self.ids["uploads/moved.pdf"]).po_attachment.name,
+                         "uploads/moved.pdf")
+
+    def test_command_repoints_moved_files_and_writes_report(self):
+        report = os.path.join(self.media_root, "report.csv")
+        output = io.StringIO()
+        call_command('fix_attachments', '--clear-missing', '--report', report, stdout=output)
+        self.assertIn("✅ Fixed 3 attachments", output.getvalue())
+
+        names = dict(Estimation.objects.values_list('pk', 'po_attachment'))
+        self.assertEqual(names[self.ids["uploads/moved.pdf"]], "po_attachments/moved.pdf")
+        self.assertEqual(names[self.ids["po_attachments/legacy.pdf"]], "legacy.pdf")
+        self.assertEqual(names[self.ids["po_attachments/gone.pdf"]], "")
+        self.assertEqual(names[self.ids["po_attachments/ok.pdf"]], "po_attachments/ok.pdf")
+
+        with open(report, newline='') as fh:
+            rows = list(csv.DictReader(fh))
+        self.assertEqual({row["Problem"] for row in rows}, {"moved", "missing", "empty", "unreferenced"})
+        self.assertEqual(self.problems(attachments.scan()), [
+            ("empty", "po_attachments/empty.pdf"), ("unreferenced", "po_attachments/stray.pdf"),
+        ])
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        self.ids = [Client.objects.create(company_name=f"C{i}", type_of_company="Pvt").pk for i in range(5)]
+
+    def middleware(self, view):
+        return QueryInstrumentationMiddleware(view)(RequestFactory().get("/probe/"))
+
+    def test_server_timing_header_only_for_staff_or_debug(self):
+        self.assertNotIn("Server-Timing", self.client.get("/login/"))
+        with override_settings(DEBUG=True):
+            timing = self.client.get("/login/")["Server-Timing"]
+        self.assertRegex(timing, r'sql;dur=[\d.]+;desc="\d+ queries"')
+        self.assertNotIn("tpl;dur=0.0;", timing)  # LoginView's template render was timed
+
+        user = get_user_model().objects.create_user("timing", password="pw")
+        self.client.force_login(user)
+        self.assertNotIn("Server-Timing", self.client.get("/dashboard/"))
+        user.is_staff = True
+        user.save()
+        self.assertIn("Server-Timing", self.client.get("/dashboard/"))
+
+    @override_settings(REQUEST_REPEATED_QUERY_THRESHOLD=3, REQUEST_QUERY_BUDGET=4)
+    def test_flags_repeated_statements_with_their_call_site(self):
+        def view(request):
+            for pk in self.ids:
+                Client.objects.get(pk=pk)
+            return HttpResponse("ok")
+
+        with self.assertLogs("crm.performance", "WARNING") as logs, override_settings(DEBUG=True):
+            response = self.middleware(view)
+        self.assertIn('desc="5 queries"', response["Server-Timing"])
+        over_budget, repeated = logs.output
+        self.assertIn("Over budget: GET /probe/", over_budget)
+        self.assertIn("5 queries (1 distinct)", over_budget)
+        self.assertIn("Probable N+1 on GET /probe/: 5×", repeated)
+        self.assertRegex(repeated, r"crm/tests\.py:\d+ in view")
+
+    @override_settings(REQUEST_QUERY_BUDGET=0)
+    def test_streaming_responses_are_labelled_as_measured_to_the_first_byte(self):
+        def view(request):
+            Client.objects.count()
+            return StreamingHttpResponse(iter(["a,b\n"]))
+
+        with self.assertLogs("crm.performance", "WARNING") as logs:
+            self.middleware(view)
+        self.assertIn("GET /probe/ (streaming; measured to the first byte)", logs.output[0])
+
+    def test_quiet_within_budget_and_can_be_switched_off(self):
+        with self.assertNoLogs("crm.performance"):
+            self.middleware(lambda request: HttpResponse(str(Client.objects.count())))
+        with override_settings(REQUEST_INSTRUMENTATION=False), self.assertRaises(MiddlewareNotUsed):
+            QueryInstrumentationMiddleware(lambda request: HttpResponse())
+
+
+class SeedingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.stats = seeding.seed(400, seed=7)
+
+    def test_tables_are_filled_in_proportion(self):
+        self.assertEqual(self.stats['leads'], Lead.objects.count())
+        self.assertEqual(self.stats['clients'], 400 // seeding.LEADS_PER_CLIENT)
+        self.assertGreater(Estimation.objects.count(), 200)
+        self.assertGreaterEqual(EstimationItem.objects.count(), Estimation.objects.count())
+        self.assertEqual(Invoice.objects.count(), Estimation.objects.filter(status='Invoiced').count())
+        self.assertEqual(self.stats['payments'], PaymentLog.objects.count())
+        self.assertEqual(
+            SearchDocument.objects.count(),
+            Client.objects.count() + Lead.objects.count() + Estimation.objects.count() + Invoice.objects.count(),
+        )
+        self.assertGreater(Lead.objects.filter(date__lt=date.today().replace(day=1)).count(), 0)
+
+    def test_seeded_data_is_consistent_with_the_maintenance_commands(self):
+        self.assertEqual(dashboard.reconcile(dry_run=True), {})
+        self.assertEqual(sum(len(chunk.changes) for chunk in invoices.recompute_totals(dry_run=True)), 0)
+        self.assertEqual(leads.refresh_computed_status(), 0)
+        self.assertEqual(sum(orphans.count(check) for check in orphans.checks()), 0)
+
+    def test_payments_follow_the_ledger(self):
+        for invoice in Invoice.objects.annotate(logged=Sum('logs__amount_paid')):
+            self.assertEqual(invoice.paid_amount, invoice.logged or Decimal("0.00"))
+            self.assertEqual(invoice.balance_due, invoice.total_value - invoice.paid_amount)
+            expected = 'Paid' if not invoice.balance_due else ('Partial Paid' if invoice.paid_amount else 'Unpaid')
+            self.assertEqual(invoice.status, expected)
+        self.assertEqual(PaymentLog.objects.filter(status='Paid').count(), Invoice.objects.filter(status='Paid').count())
+
+    def test_scale_names(self):
+        self.assertEqual(seeding.leads_for('1M'), 1_000_000)
+        self.assertEqual(seeding.leads_for('2500'), 2500)
+        with self.assertRaises(ValueError):
+            seeding.leads_for('huge')
+
+    def test_seed_command_refuses_without_debug_unless_forced(self):
+        with self.assertRaises(CommandError):
+            call_command('seed_crm', '--scale', '20', stdout=io.StringIO())
+        leads_before = Lead.objects.count()
+        call_command('seed_crm', '--scale', '20', '--skip-search', '--force', stdout=io.StringIO())
+        self.assertEqual(Lead.objects.count(), leads_before + 20)
+
+    def test_benchmark_survives_a_database_error_in_one_view(self):
+        real_measure = bench_views.measure
+
+        def measure(client, url, repeat):
+            if url == '/dashboard/':
+                transaction.set_rollback(True)  # what an aborted statement leaves behind on PostgreSQL
+                raise DatabaseError("boom")
+            return real_measure(client, url, repeat)
+
+        output = os.path.join(tempfile.mkdtemp(), "bench.json")
+        err = io.StringIO()
+        with mock.patch.object(bench_views, 'measure', measure):
+            call_command('bench_views', '--repeat', '1', '--only', 'json', 'dashboard',
+                         '--output', output, stdout=io.StringIO(), stderr=err)
+        with open(output) as fh:
+            views = json.load(fh)['views']
+        self.assertEqual(views['dashboard']['error'], "DatabaseError: boom")
+        self.assertEqual(views['pending leads json']['status'], 200)
+        self.assertIn("[FAILED] dashboard", err.getvalue())
+
+    def test_benchmark_writes_json_and_rolls_back(self):
+        output = os.path.join(tempfile.mkdtemp(), "bench.json")
+        users = get_user_model().objects.count()
+        call_command('bench_views', '--repeat', '2', '--only', 'json', 'dashboard',
+                     '--output', output, stdout=io.StringIO())
+        with open(output) as fh:
+            results = json.load(fh)
+
+        self.assertEqual(results['meta']['rows']['crm.Lead'], Lead.objects.count())
+        self.assertEqual(set(results['views']), {'dashboard', 'pending leads json', 'invoice logs json'})
+        for row in results['views'].values():
+            self.assertEqual(row['status'], 200)
+            self.assertGreater(row['queries'], 0)
+            self.assertLessEqual(row['p50_ms'], row['max_ms'])
+        self.assertEqual(get_user_model().objects.count(), users)
@@ -1,40 +1,12 @@
-﻿from .models import EstimationSettings
-from datetime import datetime
+﻿from . import sequences
 
-def generate_estimation_number():
-    settings = EstimationSettings.objects.first()
-    if not settings:
-        return "EST-001"
-
-    prefix = settings.prefix
-    current_year = datetime.now().year
-    current_month = datetime.now().month
-
-    number = settings.next_number
 
-    # Build number format
-    if settings.frequency == "yearly":
-        est_no = f"{prefix}/{current_year}/{number:04d}"
-    elif settings.frequency == "monthly":
-        est_no = f"{prefix}/{current_year}/{current_month:02d}/{number:04d}"
-    else:
-        est_no = f"{prefix}/{number:04d}"
-
-    # Update next number
-    settings.next_number += 1
-    settings.save()
-
-    return est_no
+def generate_estimation_number():
+    return sequences.next_number('quotation')
 
 
 def generate_invoice_no():
-    prefix = "INV"
-    last = Invoice.objects.order_by('-id').first()
-    if last:
-        last_number = int(last.invoice_no.split('-')[-1])
-    else:
-        last_number = 0
-    return f"{prefix}-{last_number + 1:04d}"
+    return sequences.next_number('invoice')
 
 
 from num2words import num2words
@@ -52,29 +24,12 @@ def inr_currency_words(amount):
     except Exception:
         return "Amount Not Available"
 
-import datetime
-from django.utils.timezone import now
-from crm.models import Invoice
-
 def generate_invoice_number():
-    today = now().strftime("%Y%m%d")
-    count = Invoice.objects.filter(created_at__date=now().date()).count() + 1
-    return f"INV-{today}-{count:03}"
+    return sequences.next_number('invoice')
 
-from crm.models import Estimation
-from django.db.models import Max
 
 def generate_and_reserve_quote_no():
-    # Get the highest existing quote number
-    last_estimation = Estimation.objects.aggregate(Max('quote_no'))['quote_no__max']
-    
-    try:
-        last_number = int(str(last_estimation).replace('Q', '')) if last_estimation else 0
-    except ValueError:
-        last_number = 0
-
-    next_number = last_number + 1
-    return f"Q{next_number:04d}"  # e.g., Q0001, Q0002
+    return sequences.next_number('quotation')
 
 from decimal import Decimal, InvalidOperation
 
@@ -83,3 +38,33 @@ def safe_decimal(value):
         return Decimal(value)
     except (TypeError, InvalidOperation):
         return Decimal('0.00')
+
+
+from django.db import connection
+
+def update_rows(model, fields, rows):
+    """
+    Write `rows` of (*values for fields, pk) with one prepared UPDATE run
+    per row (executemany). Much cheaper than bulk_update's CASE chains for
+    batches of a few hundred rows or more. Bypasses save() and signals.
+    """
+    quote = connection.ops.quote_name
+    assignments = ", ".join(f"{quote(model._meta.get_field(name).column)} = %s" for name in fields)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {quote(model._meta.db_table)} SET {assignments} WHERE {quote(model._meta.pk.column)} = %s",
+            rows,
+        )
+
+
+def insert_rows(model, fields, rows):
+    """
+    Insert `rows` of values for `fields` with one prepared INSERT run per
+    row (executemany), for leaf tables whose new pks are not needed.
+    Values go to the driver as-is: no defaults, auto_now or signals.
+    """
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(model._meta.get_field(name).column) for name in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    with connection.cursor() as cursor:
+        cursor.executemany(f"INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})", rows)
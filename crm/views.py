@@ -10,6 +10,7 @@ from django.views.generic import UpdateView
 
 from .models import UserProfile
 from .forms import UserForm
+from . import permissions as perm_service
 
 User = get_user_model()
 
@@ -71,7 +72,7 @@ def create_user(request):
             user.save()
 
             # --- Create Profile ---
-            user_profile = UserProfile.objects.create(
+            UserProfile.objects.create(
                 user=user,
                 name=username,
                 email=email,
@@ -81,20 +82,10 @@ def create_user(request):
 
             # --- Assign Permissions ---
             if role != 'Admin' and selected_permissions:
-                perms_to_add = []
-                for perm_str in selected_permissions:
-                    try:
-                        app_label, codename = perm_str.split('.')
-                        perm = Permission.objects.get(
-                            content_type__app_label=app_label,
-                            codename=codename
-                        )
-                        perms_to_add.append(perm)
-                    except Permission.DoesNotExist:
-                        messages.warning(request, f"Permission '{perm_str}' not found.")
-
+                perms_to_add, unknown = perm_service.resolve(selected_permissions)
+                for perm_str in unknown:
+                    messages.warning(request, f"Permission '{perm_str}' not found.")
                 user.user_permissions.set(perms_to_add)
-                user_profile.permissions.set(perms_to_add)
 
             messages.success(request, f"{role} '{username}' created successfully.")
             return redirect('user_list')
@@ -130,23 +121,11 @@ def edit_user(request, user_id):
 
     if request.method == 'POST':
         selected_permissions = request.POST.getlist('permissions')  # ['app_label.codename', ...]
-        perms_to_set = []
-        for perm_str in selected_permissions:
-            try:
-                app_label, codename = perm_str.split('.')
-                perm = Permission.objects.get(
-                    content_type__app_label=app_label,
-                    codename=codename
-                )
-                perms_to_set.append(perm)
-            except Permission.DoesNotExist:
-                messages.warning(request, f"Permission '{perm_str}' not found.")
+        perms_to_set, unknown = perm_service.resolve(selected_permissions)
+        for perm_str in unknown:
+            messages.warning(request, f"Permission '{perm_str}' not found.")
 
         user.user_permissions.set(perms_to_set)
-        # Update profile permissions too
-        if hasattr(user, 'userprofile'):
-            user.userprofile.permissions.set(perms_to_set)
-
         user.save()
         messages.success(request, 'User updated successfully.')
         return redirect('user_list')
@@ -170,24 +149,22 @@ def delete_user(request, user_id):
 @login_required
 def get_permissions_by_role(request):
     role = request.GET.get('role')
+    entries = perm_service.catalog().values()  # cached; no per-row content_type lookups
 
     if role == 'Admin':
-        permissions = Permission.objects.all()
+        permissions = list(entries)
     elif role == 'User':
-        permissions = Permission.objects.filter(
-            codename__in=[
-                'view_client', 'view_lead', 'view_estimation', 'view_invoice', 'view_report'
-            ]
-        )
+        codenames = {'view_client', 'view_lead', 'view_estimation', 'view_invoice', 'view_report'}
+        permissions = [p for p in entries if p.codename in codenames]
     else:
-        permissions = Permission.objects.none()
+        permissions = []
 
     permission_list = [
         {
             'id': p.id,
-            'name': f"{p.content_type.app_label} | {p.name}",
-            'code': f"{p.content_type.app_label}.{p.codename}"
-        } for p in permissions
+            'name': f"{p.app_label} | {p.name}",
+            'code': p.code
+        } for p in sorted(permissions, key=lambda p: p.id)
     ]
 
     return JsonResponse({'permissions': permission_list})
@@ -212,15 +189,17 @@ from django.db.models import Sum, Q
 from .models import Invoice, PaymentLog
 from django.shortcuts import render
 from crm.models import Client, Invoice, Lead, Estimation, UserPermission, PaymentLog
+from .dashboard import figures as dashboard_figures, period_range, top_clients as dashboard_top_clients
+from . import search
+from .pagination import KeysetPaginator
 
 
 @login_required
 def dashboard(request):
     user = request.user
 
-    # --- Permissions (supports multiple) ---
-    user_perms = UserPermission.objects.filter(userprofile__user=user)
-    user_perm_names = set(user_perms.values_list("name", flat=True))
+    # --- Permissions (supports multiple; cached per user) ---
+    user_perm_names = perm_service.get_permissions(user)
 
     context = {
         "can_view_client": "can_view_client" in user_perm_names,
@@ -245,44 +224,6 @@ def dashboard(request):
         ],
     }
 
-    # --- Financials ---
-    total_invoiced = Invoice.objects.aggregate(total=Sum('total_value'))['total'] or 0
-
-    # ✅ Paid = Paid + Partial Paid together
-    total_paid = PaymentLog.objects.filter(
-        Q(status="Paid") | Q(status="Partial Paid")
-    ).aggregate(total=Sum("amount_paid"))["total"] or 0
-
-    total_balance_due = Invoice.objects.aggregate(total=Sum("balance_due"))["total"] or 0
-
-    # --- Stats ---
-    total_leads = Lead.objects.count()
-    total_quotations = Estimation.objects.count()
-    total_invoices = Invoice.objects.count()
-    conversion_rate = (
-        round((total_invoices / total_leads) * 100, 2) if total_leads > 0 else 0
-    )
-
-    # --- Quotation Status Chart ---
-    quotation_status = (
-        Estimation.objects.values("status")
-        .annotate(count=Count("id"))
-        .order_by("status")
-    )
-
-    # Invoice status counts
-    invoice_status = (
-        Invoice.objects.values("status")
-        .annotate(count=Count("id"))
-        .order_by("status")
-    )
-
-    # --- Top Clients ---
-    top_clients = (
-        Client.objects.annotate(total_leads=Count("lead"))
-        .order_by("-total_leads")[:4]
-    )
-
     # --- Filters ---
     filter_options = [
         ("This Month", "this_month"),
@@ -294,23 +235,27 @@ def dashboard(request):
         ("Custom", "custom"),
     ]
     selected_filter = request.GET.get("date_filter", "this_month")
+    start_date = request.GET.get("start_date", "")
+    end_date = request.GET.get("end_date", "")
+
+    # --- Figures (daily rollups in DashboardSnapshot, see crm/dashboard.py) ---
+    stats = dashboard_figures(period_range(selected_filter, start=start_date, end=end_date))
+    total_leads = stats["total_leads"]
+    conversion_rate = (
+        round((stats["total_invoices"] / total_leads) * 100, 2) if total_leads > 0 else 0
+    )
 
     # --- Add to context ---
+    context.update(stats)
     context.update(
         {
             "filter_options": filter_options,
             "selected_filter": selected_filter,
+            "start_date": start_date,
+            "end_date": end_date,
             "user_name": user.first_name or user.username,
-            "total_invoiced": total_invoiced,
-            "paid": total_paid,  # ✅ Paid + Partial Paid combined
-            "balance_due": total_balance_due,
-            "total_leads": total_leads,
-            "total_quotations": total_quotations,
-            "total_invoices": total_invoices,
             "conversion_rate": conversion_rate,
-            "quotation_status": quotation_status,
-            "invoice_status": invoice_status,
-            "top_clients": top_clients,
+            "top_clients": dashboard_top_clients(),
         }
     )
 
@@ -318,41 +263,6 @@ def dashboard(request):
 
 
 
-@login_required
-def confirm_payment(request, payment_id):
-    payment = get_object_or_404(PaymentLog, id=payment_id)
-    invoice = payment.invoice
-
-    # ✅ Always include Paid + Partial Paid when calculating invoice totals
-    total_paid = (
-        PaymentLog.objects.filter(
-            invoice=invoice, status__in=["Paid", "Partial Paid"]
-        ).aggregate(total=Sum("amount_paid"))["total"]
-        or 0
-    )
-
-    # --- Update invoice status ---
-    if total_paid >= invoice.total_value:
-        invoice.status = "Paid"
-    elif total_paid > 0:
-        invoice.status = "Partial Paid"
-    else:
-        invoice.status = "Unpaid"
-
-    invoice.paid_amount = total_paid
-    invoice.balance_due = invoice.total_value - total_paid
-    invoice.save()
-
-    # --- Sync payment log with invoice status ---
-    payment.status = invoice.status
-    payment.save()
-
-    return redirect("payment_list")
-
-
-
-
-
 # --- CLIENT VIEWS ---
 @login_required
 def client_list(request):
@@ -368,13 +278,10 @@ def client_list(request):
     clients = Client.objects.all()
 
     if query:
-        clients = clients.filter(
-            company_name__icontains=query
-        )
+        clients = search.filter_queryset(clients, 'client', query)
 
-    paginator = Paginator(clients, 10)  # Show 8 clients per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = KeysetPaginator(clients, ordering=('-id',), per_page=10, count='estimate')
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     return render(request, 'client.html', {
         'clients': page_obj,
@@ -464,13 +371,6 @@ from . import models
 from django.db.models import Sum
 
 
-def generate_lead_no():
-    last_lead = Lead.objects.order_by('id').last()
-    if last_lead and last_lead.lead_no:
-        number = int(last_lead.lead_no.split('-')[-1]) + 1
-    else:
-        number = 1
-    return f"LEAD-{number:04d}"
 
 
 
@@ -507,7 +407,6 @@ def lead_create(request):
 
 from django.shortcuts import render
 
-<<<<<<< HEAD
 from django.shortcuts import render, redirect
 from .forms import ClientForm   # assuming you already have a form for Client
 from .models import Client
@@ -523,8 +422,6 @@ def add_client(request):
     return render(request, "crm/client_form.html", {"form": form})
 
 
-=======
->>>>>>> 9a85476b80137d17312bc3d00a29ba847fb293b4
 def lead_view(request):
     return render(request, 'leads/lead_view.html')
 
@@ -557,33 +454,19 @@ from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from .models import Lead, Estimation, Client
+from .leads import with_status as with_lead_status
 
 def lead_list(request):
     search_query = request.GET.get('q', '')
-    leads = Lead.objects.all().order_by('-id')
+    # Status comes from a correlated subquery, evaluated only for the rows
+    # on the current page; the COUNT drops the annotation.
+    leads = with_lead_status(Lead.objects.select_related('company_name'))
 
     if search_query:
-        leads = leads.filter(company_name__company_name__icontains=search_query)
-
-    # Recalculate computed_status for all leads
-    for lead in leads:
-        latest_estimation = Estimation.objects.filter(lead_no=lead).order_by('-id').first()
-        if latest_estimation:
-            if latest_estimation.status in ['Invoiced', 'Approved']:
-                lead.computed_status = 'Won'
-            elif latest_estimation.status == 'Pending':
-                lead.computed_status = 'Quoted'
-            elif latest_estimation.status == 'Lost':
-                lead.computed_status = 'Lost'
-            else:
-                lead.computed_status = 'Pending'
-        else:
-            lead.computed_status = 'Pending'
-        lead.save(update_fields=['computed_status'])
+        leads = search.filter_queryset(leads, 'lead', search_query)
 
-    paginator = Paginator(leads, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = KeysetPaginator(leads, ordering=('-id',), per_page=10, count='estimate')
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     context = {
         'leads': page_obj,
@@ -715,21 +598,6 @@ from .forms import (
 from .utils import inr_currency_words, generate_invoice_number
 
 
-# 🔢 Generate Unique Quote No
-def generate_and_reserve_quote_no():
-    setting = EstimationSettings.objects.first()
-    if not setting:
-        setting = EstimationSettings.objects.create(prefix="EST", next_number=1)
-
-    while True:
-        quote_no = f"{setting.prefix}-{setting.next_number:04d}"
-        if not Estimation.objects.filter(quote_no=quote_no).exists():
-            setting.next_number += 1
-            setting.save()
-            return quote_no
-        setting.next_number += 1
-        setting.save()
-
 # 🔒 Safe Decimal Conversion
 def safe_decimal(value):
     try:
@@ -739,6 +607,9 @@ def safe_decimal(value):
 
 
 # 📝 Create Quotation View
+from django.db import transaction
+from .estimation_items import parse_items, create_items as create_estimation_items
+
 def create_quotation(request):
     clients = Client.objects.all()
     gst_setting = GSTSettings.objects.first()
@@ -754,59 +625,38 @@ def create_quotation(request):
         lead_id = request.POST.get('lead_no')
 
         try:
-            quote_no = generate_and_reserve_quote_no()
-            quote_date = now().date()
+            # Parse every line before touching the database
+            item_rows = parse_items(request.POST)
             client = Client.objects.get(id=company_id)
             lead_instance = Lead.objects.get(id=lead_id) if lead_id else None
+            # Allocated outside the transaction so the sequence lock is held
+            # only briefly; a failed save leaves a gap, never a duplicate.
+            quote_no = generate_and_reserve_quote_no()
+            quote_date = now().date()
 
-            # 🧾 Create Estimation
-            estimation = Estimation.objects.create(
-                quote_no=quote_no,
-                quote_date=quote_date,
-                company_name=client,
-                lead_no=lead_instance,
-                validity_days=request.POST.get('validity_days'),
-                gst_no=request.POST.get('gst_no'),
-                billing_address=request.POST.get('billing_address'),
-                shipping_address=request.POST.get('shipping_address'),
-                terms_conditions=request.POST.get('terms_conditions'),
-                bank_details=request.POST.get('bank_details'),
-                sub_total=safe_decimal(request.POST.get('sub_total')),
-                discount=safe_decimal(request.POST.get('discount')),
-                gst_amount=safe_decimal(request.POST.get('gst_amount')),
-                total=safe_decimal(request.POST.get('total')),
-            )
-
-            # 🧾 Add Quotation Items
-            items = zip(
-                request.POST.getlist('item_details[]'),
-                request.POST.getlist('quantity[]'),
-                request.POST.getlist('rate[]'),
-                request.POST.getlist('tax[]'),
-                request.POST.getlist('amount[]')
-            )
-
-            for detail, qty, rate, tax, amt in items:
-                EstimationItem.objects.create(
-                    estimation=estimation,
-                    item_details=detail,
-                    quantity=int(qty or 0),
-                    rate=safe_decimal(rate),
-                    tax=safe_decimal(tax),
-                    amount=safe_decimal(amt)
+            with transaction.atomic():
+                # 🧾 Create Estimation
+                estimation = Estimation.objects.create(
+                    quote_no=quote_no,
+                    quote_date=quote_date,
+                    company_name=client,
+                    lead_no=lead_instance,
+                    validity_days=request.POST.get('validity_days'),
+                    gst_no=request.POST.get('gst_no'),
+                    billing_address=request.POST.get('billing_address'),
+                    shipping_address=request.POST.get('shipping_address'),
+                    terms_conditions=request.POST.get('terms_conditions'),
+                    bank_details=request.POST.get('bank_details'),
+                    sub_total=safe_decimal(request.POST.get('sub_total')),
+                    discount=safe_decimal(request.POST.get('discount')),
+                    gst_amount=safe_decimal(request.POST.get('gst_amount')),
+                    total=safe_decimal(request.POST.get('total')),
                 )
 
-            # ✅ Update Lead Status Immediately
-            if lead_instance:
-                if estimation.status in ['Approved', 'Invoiced']:
-                    lead_instance.computed_status = 'Won'
-                elif estimation.status == 'Pending':
-                    lead_instance.computed_status = 'Quoted'
-                elif estimation.status == 'Lost':
-                    lead_instance.computed_status = 'Lost'
-                else:
-                    lead_instance.computed_status = 'Pending'
-                lead_instance.save()
+                # 🧾 Add Quotation Items (batched INSERTs, all or nothing)
+                create_estimation_items(estimation, item_rows)
+
+            # Lead.computed_status is refreshed by the Estimation post_save signal
 
             return redirect('estimation')
 
@@ -815,6 +665,7 @@ def create_quotation(request):
                 'clients': clients,
                 'pending_leads': pending_leads,
                 'gst_percentage': gst_setting.percentage if gst_setting else 18.0,
+                'terms': default_terms,
                 'error': f"Something went wrong: {e}"
             })
 
@@ -875,71 +726,21 @@ from datetime import timedelta
 from .models import Estimation
 from .utils import inr_currency_words  # optional
 from crm.models import DefaultTerms
+from .pdf import render_quotation_pdf, quotation_filename, latest_terms
+from . import pdf_cache
 
 class QuotationPDFView(View):
     def get(self, request, pk):
-        estimation = get_object_or_404(Estimation, pk=pk)
-        items = estimation.items.all()
-        total = 0 
-
-        for item in items:
-            total += item.amount
-
-        # GST State Code Logic
-        company_gst = (estimation.gst_no or "").strip()
-        company_gst_state = company_gst[:2]
-        our_gst_state = "29"  # Your company GST state code
-
-        same_state = company_gst_state == our_gst_state
-        gst_rate = 18  # or fetch from your GSTSettings if needed
-
-        if same_state:
-            cgst = sgst = estimation.gst_amount / 2
-            igst = 0
-            cgst_rate = sgst_rate = gst_rate / 2
-            igst_rate = 0
-        else:
-            cgst = sgst = 0
-            igst = estimation.gst_amount
-            igst_rate = gst_rate
-            cgst_rate = sgst_rate = 0
-
-        # Terms & Conditions
-        default_terms = DefaultTerms.objects.order_by('-id').first()
-        if not default_terms:
-            default_terms = DefaultTerms(content="")  # Fallback empty terms
-
-        # Expiry Date Calculation
-        expiry_date = estimation.quote_date + timedelta(days=estimation.validity_days)
-
-        # Convert total to INR words
-        amount_in_words = inr_currency_words(estimation.total)
-
-        # Logo path
-        logo_path = os.path.join(settings.STATIC_ROOT, 'images', 'logo.png')
-
-        html_string = render_to_string('quotation_pdf_template.html', {
-            'estimation': estimation,
-            'items': items,
-            'amount_in_words': amount_in_words,
-            'logo_path': logo_path,
-            'expiry_date': expiry_date,
-            'same_state': same_state,
-            'cgst': cgst,
-            'sgst': sgst,
-            'igst': igst,
-            'cgst_rate': cgst_rate,
-            'sgst_rate': sgst_rate,
-            'igst_rate': igst_rate,
-            'terms': default_terms,
-        })
-
-        html = HTML(string=html_string, base_url=request.build_absolute_uri('/'))
-        pdf = html.write_pdf()
-
-        response = HttpResponse(pdf, content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename=Quotation_{estimation.quote_no}.pdf'
-        return response
+        estimation = get_object_or_404(Estimation.objects.select_related('company_name'), pk=pk)
+        items = list(estimation.items.all())
+        terms = latest_terms()
+
+        return pdf_cache.pdf_response(
+            request,
+            pdf_cache.quotation_cache_key(estimation, items, terms),
+            lambda: render_quotation_pdf(estimation, items=items, terms=terms),
+            disposition=f'inline; filename={quotation_filename(estimation)}',
+        )
 
 
 # 📋 Estimation List View
@@ -948,7 +749,7 @@ def estimation_view(request):
     estimations = Estimation.objects.all().order_by('company_name' if sort == 'company' else '-quote_date')
     query = request.GET.get('q')
     if query:
-        estimations = estimations.filter(quote_no__icontains=query)
+        estimations = search.filter_queryset(estimations, 'estimation', query)
 
     return render(request, 'estimation.html', {
         'estimations': estimations,
@@ -958,56 +759,65 @@ def estimation_view(request):
 
 from django.shortcuts import render, get_object_or_404, redirect
 from .models import Estimation, EstimationItem, DefaultTerms
-from .forms import EstimationForm
+from .forms import EstimationForm, EstimationEditForm
+from django.db.models import F
+from .estimation_items import sync_items as sync_estimation_items
+
+
+class StaleEstimation(Exception):
+    """The estimation was saved by someone else after this form was loaded."""
+
 
 def edit_estimation(request, pk):
     estimation = get_object_or_404(Estimation, pk=pk)
-    items = EstimationItem.objects.filter(estimation=estimation)
 
     try:
         default_terms = DefaultTerms.objects.first()
     except DefaultTerms.DoesNotExist:
         default_terms = None
 
+    error = None
+    status = 200
     if request.method == 'POST':
-        form = EstimationForm(request.POST, instance=estimation)
+        form = EstimationEditForm(request.POST, instance=estimation)
 
         if form.is_valid():
-            updated_estimation = form.save()
-
-            # Clear old items
-            EstimationItem.objects.filter(estimation=estimation).delete()
-
-            # Save new items
-            item_details = request.POST.getlist('item_details[]')
-            quantities = request.POST.getlist('quantity[]')
-            rates = request.POST.getlist('rate[]')
-            taxes = request.POST.getlist('tax[]')
-            amounts = request.POST.getlist('amount[]')
-
-            for detail, qty, rate, tax, amount in zip(item_details, quantities, rates, taxes, amounts):
-                EstimationItem.objects.create(
-                    estimation=updated_estimation,
-                    item_details=detail,
-                    quantity=int(qty),
-                    rate=rate,
-                    tax=tax,
-                    amount=amount
-                )
-
-
-            # Redirect after saving
-            return redirect('estimation_list')  # 🔁 Use the correct name of your view
+            try:
+                item_rows = parse_items(request.POST)
+                posted_version = int(request.POST.get('version') or 0)
+                with transaction.atomic():
+                    # 🔒 Optimistic lock: only the edit made from the current version wins
+                    claimed = Estimation.objects.filter(pk=pk, version=posted_version).update(
+                        version=F('version') + 1
+                    )
+                    if not claimed:
+                        raise StaleEstimation
+                    estimation.version = posted_version + 1
+                    form.save()
+                    sync_estimation_items(estimation, item_rows)
+            except StaleEstimation:
+                # Show what is stored now; the rep re-applies their change on top.
+                error = "This quotation was changed by someone else while you were editing. Your changes were not saved; please review the latest version and try again."
+                status = 409
+                estimation = get_object_or_404(Estimation, pk=pk)
+                form = EstimationEditForm(instance=estimation)
+            except ValueError as e:
+                error = str(e)
+                status = 400
+            else:
+                # Redirect after saving
+                return redirect('estimation_list')  # 🔁 Use the correct name of your view
 
     else:
-        form = EstimationForm(instance=estimation)
+        form = EstimationEditForm(instance=estimation)
 
     return render(request, 'edit_estimation.html', {
         'form': form,
         'estimation': estimation,
-        'items': items,
+        'items': estimation.items.order_by('id'),
         'terms': default_terms,
-    })
+        'error': error,
+    }, status=status)
 
 
 
@@ -1024,14 +834,13 @@ def estimation_list(request):
     today = localdate()
     follow_up_filter = request.GET.get("follow_up", "")
 
+    estimations = Estimation.objects.select_related('company_name', 'lead_no')
     if follow_up_filter == "today":
-        estimations = Estimation.objects.filter(follow_up_date=today).order_by('-id')
-    else:
-        estimations = Estimation.objects.all().order_by('-id')
+        estimations = estimations.filter(follow_up_date=today)
 
-    paginator = Paginator(estimations, 15)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    # (-quote_date, -id) walks crm_est_quote_date_idx backwards, one range per page.
+    paginator = KeysetPaginator(estimations, ordering=('-quote_date', '-id'), per_page=15, count='estimate')
+    page_obj = paginator.get_page(request.GET.get("cursor"))
 
     context = {
         "page_obj": page_obj,
@@ -1093,8 +902,8 @@ def reject_estimation(request, pk):
 
 # 📊 Invoice Approval Table View
 def invoice_approval_table(request):
-    estimations = Estimation.objects.filter(status='Approved', invoice__isnull=True)
-    invoices = Invoice.objects.all().order_by('-created_at')
+    estimations = Estimation.objects.filter(status='Approved', invoice__isnull=True).select_related('company_name')
+    invoices = Invoice.objects.select_related('estimation__company_name').order_by('-created_at')
     return render(request, 'invoice_approval_list.html', {
         'estimations': estimations,
         'invoices': invoices,
@@ -1153,8 +962,8 @@ def mark_lost(request, pk):
 
 
 # 🧾 Placeholder Create Invoice View
-def create_invoice(request):
-    return render(request, 'create_invoice.html')
+def create_invoice(request, estimation_id=None):
+    return render(request, 'crm/create_invoice.html')
 
 def update_estimation_status(request, pk, new_status):
     estimation = get_object_or_404(Estimation, pk=pk)
@@ -1166,11 +975,6 @@ def update_estimation_status(request, pk, new_status):
     estimation.save()
     return redirect("invoice_approval_list")
 
-def generate_invoice_number():
-    last = Invoice.objects.order_by('-id').first()
-    number = int(last.invoice_no.split('-')[-1]) + 1 if last else 1
-    return f"INV-{number:04d}"
-
 from django.shortcuts import get_object_or_404, render
 from .models import Estimation, QuotationItem
 
@@ -1215,7 +1019,7 @@ def approve_invoice(request, est_id):
         balance_due=estimation.total,
         due_date=due_date,
         credit_days=credit_days,
-        remarks=estimation.remarks,
+        remarks=estimation.remarks or '',
         is_approved=True,
         status='Pending'
     )
@@ -1240,6 +1044,8 @@ def generate_invoice_from_estimation(request, pk):
         Invoice.objects.create(
             estimation=estimation,
             invoice_no=generate_invoice_number(),
+            total_value=estimation.total,
+            balance_due=estimation.total,
             is_approved=False
         )
     return redirect('invoice_approval_list')
@@ -1250,7 +1056,9 @@ from django.shortcuts import render, get_object_or_404
 from .models import Estimation, EstimationItem
 
 def estimation_detail_view(request, pk):
-    estimation = get_object_or_404(Estimation, pk=pk)
+    estimation = get_object_or_404(
+        Estimation.objects.select_related('company_name', 'lead_no__company_name'), pk=pk
+    )
     items = estimation.items.all()
 
     total = 0  # ✅ initialize total to avoid UnboundLocalError
@@ -1300,55 +1108,20 @@ from weasyprint import HTML
 from datetime import timedelta
 from .models import Invoice, EstimationItem
 from num2words import num2words
+from .pdf import render_invoice_pdf, invoice_filename
 
 def invoice_pdf_view(request, invoice_id):
-    invoice = get_object_or_404(Invoice, pk=invoice_id)
-    estimation = invoice.estimation
-    items = EstimationItem.objects.filter(estimation=estimation)
-
-    # Calculate due date
-    due_date = invoice.created_at + timedelta(days=invoice.credit_days or 0)
-
-    # Amount in words
-    total = estimation.total
-    rupees = int(total)
-    paise = int(round((total - rupees) * 100))
-
-    amount_in_words = f"Rupees {num2words(rupees, lang='en_IN').title()}"
-    if paise > 0:
-        amount_in_words += f" and {num2words(paise, lang='en_IN').title()} Paise"
-    amount_in_words += " Only"
-
-    # Tax Type Detection (change this logic as per your actual data)
-    company_gst_state_code = estimation.gst_no[:2] if estimation.gst_no else ''
-    our_gst_state_code = "29"  # Karnataka
-    same_state = (company_gst_state_code == our_gst_state_code)
-
-    # Calculate SGST/CGST if same state; IGST if different
-    if same_state:
-        sgst = cgst = estimation.gst_amount / 2
-        igst = 0
-    else:
-        sgst = cgst = 0
-        igst = estimation.gst_amount
-
-    html_string = render_to_string("invoice_pdf_weasy.html", {
-        'invoice': invoice,
-        'estimation': estimation,
-        'items': items,
-        'due_date': due_date,
-        'amount_in_words': amount_in_words,
-        'same_state': same_state,
-        'sgst': sgst,
-        'cgst': cgst,
-        'igst': igst,
-    })
-
-    pdf_file = HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
+    invoice = get_object_or_404(
+        Invoice.objects.select_related('estimation', 'estimation__company_name'), pk=invoice_id
+    )
+    items = list(EstimationItem.objects.filter(estimation=invoice.estimation))
 
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'filename="{invoice.invoice_no}.pdf"'
-    return response
+    return pdf_cache.pdf_response(
+        request,
+        pdf_cache.invoice_cache_key(invoice, items),
+        lambda: render_invoice_pdf(invoice, items=items),
+        disposition=f'filename="{invoice_filename(invoice)}"',
+    )
 
 
 
@@ -1375,38 +1148,23 @@ from decimal import Decimal
 from .models import Invoice, PaymentLog  # Adjust to your model names
 from decimal import Decimal, InvalidOperation
 from django.shortcuts import render
+from . import payments
 
+@login_required
 @require_POST
-def confirm_payment(request, invoice_id):
-    from decimal import Decimal
-    from .models import Invoice, PaymentLog
-
-    invoice = get_object_or_404(Invoice, pk=invoice_id)
+def confirm_payment(request, invoice_id=None):
+    # The payment modal also posts the id as a form field (confirm-payment/).
+    invoice = get_object_or_404(Invoice, pk=invoice_id or request.POST.get('invoice_id') or 0)
 
     try:
-        amount_paid = Decimal(request.POST.get('amount_paid', 0))
-        utr_number = request.POST.get('utr_number')
-        payment_date = request.POST.get('payment_date')
-
-        PaymentLog.objects.create(
-            invoice=invoice,
-            amount_paid=amount_paid,
-            utr_number=utr_number,
-            payment_date=payment_date
+        payments.record_payment(
+            invoice.pk,
+            request.POST.get('amount_paid'),
+            request.POST.get('utr_number'),
+            request.POST.get('payment_date'),
         )
-
-        invoice.balance_due -= amount_paid
-
-        if invoice.balance_due <= 0:
-            invoice.status = "Paid"
-            invoice.balance_due = Decimal('0.00')
-        else:
-            invoice.status = "Partial Paid"
-
-        invoice.save()
-
-    except Exception as e:
-        return HttpResponse(f"Something went wrong: {e}")
+    except payments.PaymentError as e:
+        return HttpResponse(f"Something went wrong: {e}", status=400)
 
     return redirect('invoice_list')  # update to your correct name
 
@@ -1444,8 +1202,8 @@ from crm.models import Invoice
 from crm.models import Estimation
 
 def invoice_list_view(request):
-    estimations = Estimation.objects.filter(status='Approved')  # This must match
-    invoices = Invoice.objects.all().order_by('-created_at')
+    estimations = Estimation.objects.filter(status='Approved').select_related('company_name')  # This must match
+    invoices = Invoice.objects.select_related('estimation__company_name').order_by('-created_at')
 
     return render(request, 'invoice_approval_list.html', {
         'estimations': estimations,
@@ -1473,47 +1231,15 @@ def invoice_logs_api(request, invoice_id):
 
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from crm.models import Lead, Estimation, Invoice, PaymentLog
-from django.core.paginator import Paginator
+from .reports import report_page, report_queryset, iter_report_rows
 
 @login_required
 def report_list(request):
-    from_date = request.GET.get('from_date')
-    to_date = request.GET.get('to_date')
-
-    leads = Lead.objects.all()
-
-    if from_date and to_date:
-        leads = leads.filter(date__range=[from_date, to_date])
-    else:
-        leads = leads.order_by('-date')
-
-    report_data = []
-
-    for lead in leads:
-        estimation = Estimation.objects.filter(lead_no=lead).first()
-        invoice = Invoice.objects.filter(estimation__lead_no=lead).first()
-        payment = PaymentLog.objects.filter(invoice=invoice).first() if invoice else None
-
-        report_data.append({
-            'lead_no': lead.lead_no,
-            'lead_date': lead.date.strftime('%d-%m-%Y') if lead.date else '',
-            'client': lead.company_name.company_name if lead.company_name else '',
-            'requirement': lead.requirement,
-            'estimation_no': estimation.quote_no if estimation else '',
-            'estimation_status': estimation.status if estimation else '',
-            'lost_reason': estimation.lost_reason if estimation else '',
-            'po_number': estimation.po_number if estimation else '',
-            'po_date': estimation.po_date.strftime('%d-%m-%Y') if estimation and estimation.po_date else '',
-            'po_attachment': estimation.po_attachment.url if estimation and estimation.po_attachment else '',
-            'invoice_no': invoice.invoice_no if invoice else '',
-            'invoice_amount': invoice.total_value if invoice else '',
-            'payment_status': invoice.status if invoice else '',
-        })
-
-    paginator = Paginator(report_data, 20)  # 20 rows per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = report_page(
+        from_date=request.GET.get('from_date'),
+        to_date=request.GET.get('to_date'),
+        page_number=request.GET.get('page'),
+    )
 
     return render(request, 'crm/report_list.html', {
         'report_data': page_obj,
@@ -1523,95 +1249,169 @@ def report_list(request):
 
 
 
-import pandas as pd
-from django.http import HttpResponse
-from crm.models import Invoice
+from django.http import FileResponse, StreamingHttpResponse
+from .reports import stream_report_csv, write_report_xlsx
 
 
+@login_required
 def export_report_excel(request):
-    from_date = request.GET.get('from_date')
-    to_date = request.GET.get('to_date')
-
-    leads = Lead.objects.all()
-
-    if from_date and to_date:
-        leads = leads.filter(date__range=[from_date, to_date])
-
-    data = []
-
-    for lead in leads:
-        estimation = Estimation.objects.filter(lead_no=lead.lead_no).first()
-        invoice = Invoice.objects.filter(estimation__lead_no=lead.lead_no).first()
-        payment = PaymentLog.objects.filter(invoice=invoice).first() if invoice else None
-
-        data.append({
-            "Lead No": lead.lead_no,
-            "Lead Date": lead.date.strftime('%d-%m-%Y') if lead.date else '',
-            "Client": lead.company_name.company_name,
-            "Requirement": lead.requirement,
-            "Estimation No": estimation.quote_no if estimation else '',
-            "Estimation Status": estimation.status if estimation else 'Pending',
-            "Lost Reason": estimation.lost_reason if estimation else '',
-            "Client PO Number": estimation.po_number if estimation else '',
-            "PO Date": estimation.po_date.strftime("%d-%m-%Y") if estimation and estimation.po_date else '',
-            "Invoice No": invoice.invoice_no if invoice else '',
-            "Amount": float(invoice.total_value) if invoice else '',
-            "Paid": float(invoice.total_value) - float(invoice.balance_due) if invoice else '',
-            "Balance": float(invoice.balance_due) if invoice else '',
-            "Payment Status": invoice.status if invoice else '',
-        })
+    rows = report_queryset(
+        from_date=request.GET.get('from_date'),
+        to_date=request.GET.get('to_date'),
+    )
+
+    return FileResponse(
+        write_report_xlsx(rows),
+        as_attachment=True,
+        filename='CRM_Complete_Report.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
 
-    import pandas as pd
-    df = pd.DataFrame(data)
 
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=CRM_Complete_Report.xlsx'
-    df.to_excel(response, index=False)
+@login_required
+def export_report_csv(request):
+    rows = report_queryset(
+        from_date=request.GET.get('from_date'),
+        to_date=request.GET.get('to_date'),
+    )
 
+    response = StreamingHttpResponse(stream_report_csv(rows), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename=CRM_Complete_Report.csv'
     return response
 
 
 
-from django.template.loader import render_to_string
-from weasyprint import HTML
 from django.http import HttpResponse
+from .pdf import render_report_pdf, REPORT_PDF_FILENAME
+from .reports import filter_invoices
 
 
 def export_report_pdf(request):
     invoices = get_filtered_invoices(request)
-
-    html_string = render_to_string('report_pdf_template.html', {
-        'invoices': invoices,
-    })
-
-    pdf_file = HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
+    pdf_file = render_report_pdf(invoices)
 
     response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="Filtered_CRM_Report.pdf"'
+    response['Content-Disposition'] = f'attachment; filename="{REPORT_PDF_FILENAME}"'
     return response
 
-from .models import Invoice
 
 def get_filtered_invoices(request):
-    invoices = Invoice.objects.select_related('estimation', 'estimation__company_name').all()
+    return filter_invoices(request.GET)
 
-    from_date = request.GET.get('from_date')
-    to_date = request.GET.get('to_date')
-    company = request.GET.get('company')
-    lead_no = request.GET.get('lead_no')
 
-    if from_date and to_date:
-        invoices = invoices.filter(created_at__date__range=[from_date, to_date])
-    elif from_date:
-        invoices = invoices.filter(created_at__date__gte=from_date)
-    elif to_date:
-        invoices = invoices.filter(created_at__date__lte=to_date)
 
-    if company:
-        invoices = invoices.filter(estimation__company_name__id=company)
-    if lead_no:
-        invoices = invoices.filter(estimation__lead_no=lead_no)
+# ---------- Background Report Jobs ----------
+from django.http import Http404
+from django.urls import reverse
+from .models import ReportJob
+from . import jobs
 
-    return invoices
 
+def _job_payload(job):
+    data = {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'status_url': reverse('report_job_status', args=[job.id]),
+    }
+    if job.status == 'Done':
+        data['download_url'] = reverse('report_job_download', args=[job.id])
+    if job.status == 'Failed':
+        data['error'] = job.error.strip().splitlines()[-1] if job.error else ''
+    return data
+
+
+def _get_user_job(request, job_id):
+    job = get_object_or_404(ReportJob, pk=job_id)
+    if job.created_by_id != request.user.id and not request.user.is_superuser:
+        raise Http404("Report job not found")
+    return job
+
+
+@login_required
+@require_POST
+def enqueue_report_job(request):
+    try:
+        job = jobs.enqueue(request.POST.get('kind'), request.POST, user=request.user)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(_job_payload(job), status=202)
+
+
+@login_required
+def report_job_status(request, job_id):
+    return JsonResponse(_job_payload(_get_user_job(request, job_id)))
+
+
+@login_required
+def report_job_download(request, job_id):
+    job = _get_user_job(request, job_id)
+    if job.status != 'Done' or not job.result:
+        return JsonResponse(_job_payload(job), status=409)
+    return FileResponse(job.result.open('rb'), as_attachment=True, filename=job.filename)
+
+
+# ---------- Bulk PDF Export ----------
+from . import batch
+
+
+@login_required
+def export_pdfs_zip(request):
+    kind = request.GET.get('kind', 'invoice')
+    if kind not in batch.DOCUMENT_KINDS:
+        return HttpResponse("Unknown document type.", status=400)
 
+    ids = batch.document_ids(kind, request.GET)
+    documents = batch.iter_rendered_for_request(kind, ids)
+
+    response = StreamingHttpResponse(batch.stream_zip(documents), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{kind}_pdfs.zip"'
+    return response
+
+
+# ---------- Global Search ----------
+@login_required
+def global_search(request):
+    """JSON results for the search box: clients, leads, quotations and invoices."""
+    query = request.GET.get('q', '')
+    kinds = [kind for kind in request.GET.getlist('kind') if kind in search.INDEXED]
+    try:
+        limit = min(max(int(request.GET.get('limit', search.SEARCH_RESULT_LIMIT)), 1), 50)
+    except ValueError:
+        limit = search.SEARCH_RESULT_LIMIT
+
+    results = search.search(query, kinds=kinds or None, limit=limit)
+    return JsonResponse({
+        'query': query,
+        'results': [
+            {
+                'kind': document.kind,
+                'id': document.object_id,
+                'title': document.title,
+                'snippet': document.body[:160],
+                'url': document.url,
+            }
+            for document in results
+        ],
+    })
+
+
+# ---------- Client / Lead Import ----------
+from . import crm_import
+
+@perm_service.permission_required('crm.add_client', 'crm.add_lead')
+def import_crm_upload(request):
+    """Upload a CSV/XLSX client list; matching clients are reused, rows with a requirement become leads."""
+    context = {'columns': crm_import.CRM_COLUMNS}
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if upload is None:
+            messages.error(request, "Choose a .csv or .xlsx file to import.")
+        else:
+            try:
+                result = crm_import.import_crm(upload, upload.name)
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                context.update(stats=result.stats, errors=result.errors, filename=upload.name)
+    return render(request, 'import_crm.html', context)
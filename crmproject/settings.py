@@ -46,6 +46,41 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Base URL WeasyPrint resolves relative asset URLs against. /static/ and
+# /media/ URLs on this host are read from disk by crm.pdf.local_url_fetcher.
+PDF_BASE_URL = env("PDF_BASE_URL", default="http://127.0.0.1:8000/")
+
+# Rendered quotation/invoice PDFs are cached under MEDIA_ROOT/pdf_cache (LRU)
+PDF_CACHE_MAX_BYTES = env.int("PDF_CACHE_MAX_BYTES", default=256 * 1024 * 1024)
+
+# Background report jobs (manage.py run_report_worker)
+REPORT_WORKER_PROCESSES = env.int("REPORT_WORKER_PROCESSES", default=os.cpu_count() or 1)
+REPORT_JOB_POLL_SECONDS = env.float("REPORT_JOB_POLL_SECONDS", default=2.0)
+# A Running job with no worker heartbeat for this long is requeued, or
+# failed once it has been claimed REPORT_JOB_MAX_ATTEMPTS times.
+REPORT_JOB_STALE_MINUTES = env.int("REPORT_JOB_STALE_MINUTES", default=5)
+REPORT_JOB_MAX_ATTEMPTS = env.int("REPORT_JOB_MAX_ATTEMPTS", default=3)
+
+# Bulk PDF zip exports. manage.py export_pdfs uses PDF_EXPORT_PROCESSES; the
+# reports/export/pdfs/ view renders inside the web worker, so it gets a
+# small pool of its own (1 = no pool), and only one export per worker
+# process uses it at a time.
+PDF_EXPORT_PROCESSES = env.int("PDF_EXPORT_PROCESSES", default=os.cpu_count() or 1)
+PDF_EXPORT_REQUEST_PROCESSES = env.int("PDF_EXPORT_REQUEST_PROCESSES", default=1)
+
+# Quotation forms post five fields per line item; Django's default of 1000
+# would reject anything over ~200 lines.
+DATA_UPLOAD_MAX_NUMBER_FIELDS = env.int("DATA_UPLOAD_MAX_NUMBER_FIELDS", default=10000)
+
+# Per-request query/timing instrumentation (crm.instrumentation). Requests
+# over either budget, and any statement run more than the repeat threshold
+# times in one request (a probable N+1), are logged to "crm.performance".
+# Staff users (and everyone when DEBUG is on) also get a Server-Timing header.
+REQUEST_INSTRUMENTATION = env.bool("REQUEST_INSTRUMENTATION", default=True)
+REQUEST_TIME_BUDGET_MS = env.int("REQUEST_TIME_BUDGET_MS", default=1000)
+REQUEST_QUERY_BUDGET = env.int("REQUEST_QUERY_BUDGET", default=50)
+REQUEST_REPEATED_QUERY_THRESHOLD = env.int("REQUEST_REPEATED_QUERY_THRESHOLD", default=10)
+
 # Auth redirects
 LOGIN_URL = "/login/"
 LOGIN_REDIRECT_URL = "/dashboard/"
@@ -64,6 +99,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "crm.instrumentation.QueryInstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -78,7 +114,7 @@ ROOT_URLCONF = "crmproject.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "crm.instrumentation.InstrumentedDjangoTemplates",
         "DIRS": [
             BASE_DIR / "crm" / "templates",
             BASE_DIR / "templates",
@@ -105,6 +141,10 @@ DATABASES = {
         default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}"
     )
 }
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    # A file-backed test database: the concurrency tests need real lock waits
+    # between threads, which Django's default in-memory one cannot give.
+    DATABASES["default"].setdefault("TEST", {}).setdefault("NAME", BASE_DIR / "test_db.sqlite3")
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
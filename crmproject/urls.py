@@ -5,7 +5,7 @@ from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
 from django.views.generic import RedirectView
 from crm import views
-from crm.views import QuotationPDFView, report_list, export_report_excel, export_report_pdf
+from crm.views import QuotationPDFView, report_list, export_report_excel, export_report_csv, export_report_pdf
 from crm.views import UserUpdateView
 
 urlpatterns = [
@@ -23,6 +23,9 @@ urlpatterns = [
     # Dashboard
     path('dashboard/', views.dashboard, name='dashboard'),
 
+    # Search
+    path('search/', views.global_search, name='global_search'),
+
     # Authentication
     path('', views.user_login, name='login_redirect'),
     path('login/', auth_views.LoginView.as_view(template_name='login.html'), name='login'),
@@ -33,6 +36,7 @@ urlpatterns = [
     path('client/', views.client_list, name='client'),
     path('client/add/', views.client_entry, name='client_entry'),
     path('client/add/ajax/', views.client_entry_ajax, name='client_entry_ajax'),
+    path('client/import/', views.import_crm_upload, name='import_crm'),
     path('client/edit/<int:client_id>/', views.edit_client, name='edit_client'),
 
     # Lead
@@ -52,7 +56,7 @@ urlpatterns = [
     path("estimation/", views.estimation_list, name="estimation_list"),
     path('estimation/<int:pk>/edit/', views.edit_estimation, name='estimation_edit'),
     path('estimation/<int:pk>/approve/', views.approve_estimation, name='approve_estimation'),
-    path('estimation/<int:id>/approve/', views.approve_estimation, name='approve_estimation_by_id'),
+    path('estimation/<int:pk>/approve/', views.approve_estimation, name='approve_estimation_by_id'),
     path('estimation/<int:pk>/reject/', views.reject_estimation, name='reject_invoice'),
     path('estimation/<int:pk>/status/<str:new_status>/', views.update_estimation_status, name='estimation_status'),
     path('estimation/<int:pk>/lost/', views.mark_lost, name='mark_lost'),
@@ -81,7 +85,14 @@ urlpatterns = [
     # Reports
     path('reports/', report_list, name='report_list'),
     path('reports/export/excel/', export_report_excel, name='export_report_excel'),
+    path('reports/export/csv/', export_report_csv, name='export_report_csv'),
     path('reports/export/pdf/', export_report_pdf, name='export_report_pdf'),
+    path('reports/export/pdfs/', views.export_pdfs_zip, name='export_pdfs_zip'),
+
+    # Background report jobs
+    path('reports/jobs/', views.enqueue_report_job, name='report_job_enqueue'),
+    path('reports/jobs/<int:job_id>/', views.report_job_status, name='report_job_status'),
+    path('reports/jobs/<int:job_id>/download/', views.report_job_download, name='report_job_download'),
 
     # Other Views
     path('purchase-order/', views.purchase_order_view, name='purchase_order'),